@@ -0,0 +1,141 @@
+"""
+Estatísticas agregadas das respostas (por UF, cidade, categoria, sindicato,
+movimento e dia), mantidas por triggers em uma tabela de resumo.
+O painel e o /admin/stats leem só essa tabela, nunca fazem GROUP BY em respostas.
+"""
+
+# Dimensão -> expressão SQL sobre a linha ({row} = NEW ou OLD)
+DIMENSIONS = {
+    'uf': "UPPER(TRIM(COALESCE({row}.uf, '')))",
+    'cidade': "TRIM(COALESCE({row}.cidade, ''))",
+    'categoria': "TRIM(COALESCE({row}.categoria, ''))",
+    'sindicato': "TRIM(COALESCE({row}.sindicato, ''))",
+    'movimento': "TRIM(COALESCE({row}.movimento, ''))",
+    'dia': "COALESCE(date({row}.created_at), '')",
+}
+
+
+def _increment_sql(row):
+    return '\n'.join(
+        f"INSERT INTO agregados (dimensao, valor, total) VALUES ('{name}', {expr.format(row=row)}, 1) "
+        f"ON CONFLICT (dimensao, valor) DO UPDATE SET total = total + 1;"
+        for name, expr in DIMENSIONS.items()
+    )
+
+
+def _decrement_sql(row):
+    return '\n'.join(
+        f"UPDATE agregados SET total = total - 1 "
+        f"WHERE dimensao = '{name}' AND valor = {expr.format(row=row)};\n"
+        f"DELETE FROM agregados "
+        f"WHERE dimensao = '{name}' AND valor = {expr.format(row=row)} AND total <= 0;"
+        for name, expr in DIMENSIONS.items()
+    )
+
+
+def init_aggregates(conn):
+    """
+    Cria a tabela de agregados e os triggers. Na primeira vez, preenche a
+    tabela a partir das respostas existentes. Retorna True se criou agora.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agregados'"
+    ).fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agregados (
+            dimensao TEXT NOT NULL,
+            valor TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (dimensao, valor)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS agregados_respostas_ai AFTER INSERT ON respostas BEGIN
+            {_increment_sql('NEW')}
+        END;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS agregados_respostas_ad AFTER DELETE ON respostas BEGIN
+            {_decrement_sql('OLD')}
+        END;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS agregados_respostas_au
+        AFTER UPDATE OF {', '.join(('uf', 'cidade', 'categoria', 'sindicato', 'movimento', 'created_at'))}
+        ON respostas BEGIN
+            {_decrement_sql('OLD')}
+            {_increment_sql('NEW')}
+        END;
+    """)
+    if exists:
+        return False
+    _fill_aggregates(conn)
+    return True
+
+
+def add_aggregates(conn, source, params=()):
+    """
+    Soma às estatísticas as linhas de `source` (tabela ou subconsulta entre
+    parênteses com as colunas de respostas). Sem commit. Usado no
+    arquivamento, para que as respostas arquivadas continuem contadas.
+    """
+    for name, expr in DIMENSIONS.items():
+        value = expr.format(row='r')
+        conn.execute(f"""
+            INSERT INTO agregados (dimensao, valor, total)
+            SELECT '{name}', {value}, COUNT(*) FROM {source} AS r WHERE true
+            GROUP BY 2
+            ON CONFLICT (dimensao, valor) DO UPDATE SET total = total + excluded.total
+        """, params)
+
+
+def _fill_aggregates(conn, extra_sources=()):
+    # Sem commit: roda dentro da transação de quem chamou
+    conn.execute("DELETE FROM agregados")
+    for source in ('respostas',) + tuple(extra_sources):
+        add_aggregates(conn, source)
+
+
+def rebuild_aggregates(conn, extra_sources=()):
+    """
+    Recalcula a tabela inteira (correção manual; os triggers mantêm no dia a dia).
+    extra_sources: outras tabelas a contar junto, como as respostas arquivadas.
+    """
+    with conn:
+        _fill_aggregates(conn, extra_sources)
+    return conn.execute("SELECT COUNT(*) FROM agregados").fetchone()[0]
+
+
+def read_breakdown(conn, dimension, limit=20):
+    """[(valor, total)] de uma dimensão, do maior para o menor (sem valores vazios)"""
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Dimensão desconhecida: {dimension}")
+    return conn.execute("""
+        SELECT valor, total FROM agregados
+        WHERE dimensao = ? AND valor != ''
+        ORDER BY total DESC, valor
+        LIMIT ?
+    """, (dimension, limit)).fetchall()
+
+
+def read_daily(conn, days=30):
+    """[(dia, total)] dos últimos `days` dias com respostas, em ordem cronológica"""
+    return conn.execute("""
+        SELECT valor, total FROM agregados
+        WHERE dimensao = 'dia' AND valor >= date('now', ?)
+        ORDER BY valor
+    """, (f'-{int(days) - 1} days',)).fetchall()
+
+
+def read_summary(conn):
+    """Totais dos cards do dashboard: hoje, semana atual (desde segunda) e com área informada"""
+    hoje, semana = conn.execute("""
+        SELECT
+            COALESCE(SUM(CASE WHEN valor = date('now') THEN total END), 0),
+            COALESCE(SUM(CASE WHEN valor >= date('now', 'weekday 0', '-6 days') THEN total END), 0)
+        FROM agregados WHERE dimensao = 'dia'
+    """).fetchone()
+    com_area = conn.execute(
+        "SELECT COALESCE(SUM(total), 0) FROM agregados WHERE dimensao = 'categoria' AND valor != ''"
+    ).fetchone()[0]
+    return {'hoje': hoje, 'semana': semana, 'com_area': com_area}
@@ -0,0 +1,63 @@
+"""
+API JSON somente leitura das respostas (/admin/api/respostas)
+Projeção de campos (?fields=id,nome,email): só as colunas pedidas são lidas do
+banco. Requisições condicionais: o ETag vem da geração dos contadores (muda a
+cada escrita em respostas) e do id mais recente; o Last-Modified, da data da
+resposta mais recente. Um cliente que consulta periodicamente recebe 304 sem
+que nenhuma linha seja lida.
+"""
+
+from datetime import datetime, timezone
+
+from export import EXPORT_COLUMNS
+from pagination import read_counters
+
+API_FIELDS = EXPORT_COLUMNS + ('duplicata_de',)
+
+# Campos da listagem quando ?fields não é informado
+DEFAULT_LIST_FIELDS = ('id', 'nome', 'sobrenome', 'email', 'telefone', 'cidade', 'uf', 'created_at')
+
+MAX_PER_PAGE = 100
+
+
+class FieldError(ValueError):
+    """Campo pedido em ?fields que não existe na API"""
+
+
+def parse_fields(value, default=DEFAULT_LIST_FIELDS):
+    """Converte 'id,nome' em tupla de campos válidos (sem repetição, na ordem pedida)"""
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown:
+        raise FieldError(f"Campos inválidos: {', '.join(unknown)}")
+    if not fields:
+        raise FieldError("Nenhum campo informado")
+    return fields
+
+
+def validators(conn):
+    """
+    (etag, last_modified) do estado atual de respostas: uma leitura dos
+    contadores e uma do fim do índice (created_at, id).
+    A geração e o instante da última escrita cobrem também alterações e
+    remoções, que não mudam a resposta mais recente.
+    """
+    _, generation = read_counters(conn)
+    changed = conn.execute(
+        "SELECT valor FROM contadores WHERE nome = 'respostas_alterada_em'"
+    ).fetchone()
+    last_modified = datetime.fromtimestamp(changed[0], timezone.utc) if changed else None
+    latest = conn.execute(
+        "SELECT id FROM respostas ORDER BY created_at DESC, id DESC LIMIT 1"
+    ).fetchone()
+    return f"{generation}-{latest[0] if latest else 0}", last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """Se o cliente já tem a versão atual (If-None-Match tem precedência sobre If-Modified-Since)"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
@@ -1,16 +1,61 @@
-from flask import Flask, request, redirect, render_template, jsonify, session, flash, url_for
-import sqlite3, os
-from werkzeug.utils import secure_filename
+from flask import (Flask, Response, request, redirect, render_template, jsonify, session, flash,
+                   url_for, abort, send_from_directory)
+import sqlite3, os, mimetypes, tempfile, time
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 # from flask_wtf.csrf import CSRFProtect
-import re
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
-import bcrypt
+import click
 from functools import wraps
+from werkzeug.utils import secure_filename
+from database import Database, DEFAULT_DATABASE_URL
+from search import fts5_available, search_index_exists, rebuild_search_index, search_filter
+from pagination import read_counters, decode_cursor, list_respostas, CountCache
+from aggregates import (DIMENSIONS, rebuild_aggregates, read_breakdown,
+                        read_daily, read_summary)
+from respostas import INSERT_COLUMNS, insert_resposta, merge_resposta
+from duplicates import (POLICIES as DUPLICATE_POLICIES, find_duplicate, normalize_email,
+                        count_duplicates, backfill_duplicates, duplicate_groups, count_groups)
+from validation import RESPOSTA_SCHEMA, ValidationError
+from auth import PasswordHasher, HasherOverloaded
+from ingest import IngestQueue
+from backup import BackupManager, BackupScheduler, BackupError
+from archive import ArchiveStore
+from migrations import apply_schema, describe as describe_migrations, run_backfills, status as migration_status
+from importer import (EXTENSIONS as IMPORT_EXTENSIONS, Importer, ImportFileError, import_errors,
+                      recent_imports)
+from export import EXPORT_COLUMNS, FORMATS, build_export_query, stream_export, gzip_chunks
+from api import (API_FIELDS, MAX_PER_PAGE, FieldError, parse_fields, validators as api_validators,
+                 not_modified)
+from uploads import UploadStore, UploadError
+from assets import AssetManifest, build_assets, load_manifest
+from cache import ResponseCache, create_backend, deploy_version
+from shared_state import DEFAULT_SHARED_STATE_URL, create_state, limiter_options
+from sessions import AdminState, AdminStateCache, ServerSessionInterface, credential
+from metrics import DEFAULT_DIRECTORY as METRICS_DIRECTORY, MetricsRegistry, SIZE_BUCKETS, sql_operation
+from app_logging import configure_logging
+
+# Cache de um ano para arquivos com hash no nome (o conteúdo nunca muda)
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Headers de segurança aplicados a todas as respostas (montados uma vez)
+SECURITY_HEADERS = (
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'SAMEORIGIN'),
+    ('X-XSS-Protection', '1; mode=block'),
+    ('Strict-Transport-Security', 'max-age=31536000; includeSubDomains'),
+    ('Content-Security-Policy', "default-src 'self'"),
+)
+
+# Colunas exibidas na tabela do dashboard (o template acessa pelo nome)
+DASHBOARD_COLUMNS = (
+    'id', 'nome', 'sobrenome', 'email', 'telefone', 'cidade', 'uf',
+    'movimento', 'categoria', 'created_at',
+)
 
-FILE = "db/database.db"
+# Colunas da página de detalhes de uma resposta
+DETAIL_COLUMNS = EXPORT_COLUMNS
 
 def create_app():
     app = Flask(__name__)
@@ -20,33 +65,150 @@ def create_app():
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    upload_store = UploadStore(UPLOAD_FOLDER)
+    app.extensions['upload_store'] = upload_store
+
+    # Configuração do banco de dados (DATABASE_URL permite trocar o backend)
+    app.config['DATABASE_URL'] = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_CACHED_STATEMENTS'] = int(os.environ.get('SQLITE_CACHED_STATEMENTS', 256))
+    db = Database(
+        app.config['DATABASE_URL'],
+        busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+        synchronous=app.config['SQLITE_SYNCHRONOUS'],
+        cached_statements=app.config['SQLITE_CACHED_STATEMENTS'],
+    )
+    app.extensions['database'] = db
+    # 0 deixa as migrações de esquema para um passo explícito do deploy (python migrations.py)
+    app.config['DB_MIGRATE_ON_STARTUP'] = os.environ.get('DB_MIGRATE_ON_STARTUP', '1') == '1'
+
+    # Modo de ingestão do /enviar: 'sync' grava direto, 'queue' usa spool + gravação em lote
+    app.config['INGEST_MODE'] = os.environ.get('INGEST_MODE', 'sync')
+    app.config['INGEST_SPOOL_PATH'] = os.environ.get('INGEST_SPOOL_PATH', 'db/fila.db')
+    app.config['INGEST_BATCH_SIZE'] = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+    app.config['INGEST_FLUSH_INTERVAL'] = float(os.environ.get('INGEST_FLUSH_INTERVAL', 0.5))  # segundos
+    ingest_queue = None
+    if app.config['INGEST_MODE'] == 'queue':
+        ingest_queue = IngestQueue(
+            db,
+            app.config['INGEST_SPOOL_PATH'],
+            batch_size=app.config['INGEST_BATCH_SIZE'],
+            flush_interval=app.config['INGEST_FLUSH_INTERVAL'],
+        )
+    elif app.config['INGEST_MODE'] != 'sync':
+        raise ValueError(f"INGEST_MODE inválido: {app.config['INGEST_MODE']}")
+    app.extensions['ingest_queue'] = ingest_queue
+
+    # Pipeline de estáticos: nomes com hash, variantes gzip/brotli e WebP/AVIF
+    app.config['ASSETS_BUILD_ON_STARTUP'] = os.environ.get('ASSETS_BUILD_ON_STARTUP', '1') == '1'
+    if app.config['ASSETS_BUILD_ON_STARTUP']:
+        asset_manifest = AssetManifest(app.static_folder, build_assets(app.static_folder))
+    else:
+        asset_manifest = AssetManifest(app.static_folder, load_manifest(app.static_folder))
+    app.extensions['assets'] = asset_manifest
+
+    @app.template_global()
+    def asset_url(filename):
+        """Como url_for('static', filename=...), mas com o nome versionado quando existir"""
+        hashed = asset_manifest.hashed_path(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('serve_asset', filename=hashed)
+
+    # Estado compartilhado entre os workers (rate limiter, caches, sessões): Redis com
+    # REDIS_URL, senão um arquivo SQLite local seguro entre processos; memory:// é por worker
+    app.config['SHARED_STATE_URL'] = os.environ.get(
+        'SHARED_STATE_URL', os.environ.get('REDIS_URL') or DEFAULT_SHARED_STATE_URL
+    )
+    shared_state = create_state(app.config['SHARED_STATE_URL'])
+    app.extensions['shared_state'] = shared_state
+
+    # Sessões no estado compartilhado (o cookie só leva o identificador)
+    app.config['SESSION_LIFETIME'] = int(os.environ.get('SESSION_LIFETIME', 12 * 3600))
+    app.config['SESSION_REFRESH'] = int(os.environ.get('SESSION_REFRESH', 300))
+    app.config['ADMIN_CACHE_TTL'] = int(os.environ.get('ADMIN_CACHE_TTL', 30))
+    app.session_interface = ServerSessionInterface(
+        shared_state, lifetime=app.config['SESSION_LIFETIME'], refresh=app.config['SESSION_REFRESH']
+    )
+
+    # Cache da página pública: 'shared' (estado compartilhado), 'memory' (por worker), 'file' ou 'redis'
+    app.config['PAGE_CACHE_BACKEND'] = os.environ.get('PAGE_CACHE_BACKEND', 'shared')
+    app.config['PAGE_CACHE_DIR'] = os.environ.get('PAGE_CACHE_DIR', 'db/cache')
+    page_cache = ResponseCache(
+        create_backend(app.config['PAGE_CACHE_BACKEND'], redis_url=os.environ.get('REDIS_URL'),
+                       directory=app.config['PAGE_CACHE_DIR'], state=shared_state),
+        deploy_version(os.path.join(app.root_path, app.template_folder), extra=asset_manifest.version or ''),
+    )
+
+    # Métricas do Prometheus, somadas entre os workers (um arquivo mmap por processo)
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', METRICS_DIRECTORY)
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    metrics = MetricsRegistry(app.config['METRICS_DIR'])
+    app.extensions['metrics'] = metrics
+    request_latency = metrics.histogram('http_request_duration_seconds', 'Duração das requisições HTTP')
+    request_total = metrics.counter('http_requests', 'Requisições HTTP atendidas')
+    query_latency = metrics.histogram('db_query_duration_seconds', 'Duração das consultas ao banco')
+    rate_limit_hits = metrics.counter('rate_limit_hits', 'Requisições recusadas pelo rate limiter')
+    validation_failures = metrics.counter('validation_failures', 'Envios recusados na validação')
+    upload_bytes = metrics.histogram('upload_size_bytes', 'Tamanho das imagens enviadas', SIZE_BUCKETS)
+    submissions = metrics.counter('submissions', 'Respostas aceitas pelo /enviar')
+    db.query_observers.append(
+        lambda sql, seconds: query_latency.observe(seconds, operation=sql_operation(sql))
+    )
 
-    # Configuração de logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('app.log'),
-            logging.StreamHandler()
-        ]
+    # Configuração de logging: fila em memória + thread gravadora (JSON, rotação compartilhada)
+    app.config['LOG_FILE'] = os.environ.get('LOG_FILE', 'app.log')
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+    app.config['LOG_MAX_BYTES'] = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 ** 2))
+    app.config['LOG_BACKUP_COUNT'] = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+    app.config['LOG_ROTATE_INTERVAL'] = int(os.environ.get('LOG_ROTATE_INTERVAL', 86400))  # segundos, 0 desativa
+    app.config['LOG_SAMPLE_RATE'] = int(os.environ.get('LOG_SAMPLE_RATE', 10))  # 1 de N avisos de validação
+    configure_logging(
+        app.config['LOG_FILE'],
+        level=app.config['LOG_LEVEL'],
+        max_bytes=app.config['LOG_MAX_BYTES'],
+        backup_count=app.config['LOG_BACKUP_COUNT'],
+        interval=app.config['LOG_ROTATE_INTERVAL'],
+        sample_rate=app.config['LOG_SAMPLE_RATE'],
     )
     logger = logging.getLogger(__name__)
 
     # Configuração de segurança
     # csrf = CSRFProtect(app)
     
-    # Configuração do Rate Limiter com suporte a Redis
-    limiter_storage_uri = os.environ.get('REDIS_URL', 'memory://')
+    # Configuração do Rate Limiter no estado compartilhado: os limites valem para todos os workers
+    limiter_storage_uri = app.config['SHARED_STATE_URL']
+    # RATELIMIT_ENABLED=0 desliga os limites (benchmarks locais)
+    app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+    # moving-window: sem a rajada dupla na virada da janela fixa
+    app.config['RATELIMIT_STRATEGY'] = os.environ.get('RATELIMIT_STRATEGY', 'moving-window')
+    # Limite próprio da API JSON, por admin (um painel consultando a API não bloqueia o admin)
+    app.config['API_RATELIMIT'] = os.environ.get('API_RATELIMIT', '120 per minute')
+
+    def admin_or_ip():
+        user_id = session.get('admin_user_id')
+        return f"admin:{user_id}" if user_id else get_remote_address()
+
     limiter = Limiter(
         app=app,
         key_func=get_remote_address,
         default_limits=["200 per day", "50 per hour"],
-        storage_uri=limiter_storage_uri
+        # Os limites padrão são por IP, para o público; admins logados ficam fora deles
+        default_limits_exempt_when=lambda: 'admin_logged_in' in session,
+        storage_uri=limiter_storage_uri,
+        storage_options=limiter_options(shared_state),
+        strategy=app.config['RATELIMIT_STRATEGY'],
+        on_breach=lambda limit: rate_limit_hits.inc(endpoint=request.endpoint or 'desconhecido')
     )
+    # Desativado, o Limiter não se registra no app e os decorators só guardam weakref
+    app.extensions.setdefault('limiter', set()).add(limiter)
     
     # Log da configuração do rate limiter
     if limiter_storage_uri.startswith('redis://'):
         logger.info(f"Rate limiter configurado com Redis: {limiter_storage_uri}")
+    elif limiter_storage_uri.startswith('sqlite:'):
+        logger.info(f"Rate limiter configurado com SQLite compartilhado entre os workers: {limiter_storage_uri}")
     else:
         logger.info("Rate limiter configurado com storage em memória (desenvolvimento)")
         if os.environ.get('FLASK_ENV') == 'production':
@@ -55,20 +217,76 @@ def create_app():
     def allowed_file(filename):
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-    def sanitize_input(text):
-        if not text:
-            return ""
-        # Remove caracteres especiais e limita o tamanho
-        text = re.sub(r'[<>]', '', text)
-        return text[:500]  # Limita a 500 caracteres
+    # Verificação de senha em pool limitado, com custo do bcrypt configurável
+    app.config['BCRYPT_ROUNDS'] = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    app.config['AUTH_WORKERS'] = int(os.environ.get('AUTH_WORKERS', 2))
+    app.config['AUTH_MAX_PENDING'] = int(os.environ.get('AUTH_MAX_PENDING', 8))
+    password_hasher = PasswordHasher(
+        rounds=app.config['BCRYPT_ROUNDS'],
+        max_workers=app.config['AUTH_WORKERS'],
+        max_pending=app.config['AUTH_MAX_PENDING'],
+    )
+
+    # Reenvio com email ou telefone já cadastrado: 'flag' grava marcando, 'merge' atualiza, 'reject' recusa
+    app.config['DUPLICATE_POLICY'] = os.environ.get('DUPLICATE_POLICY', 'flag')
+    if app.config['DUPLICATE_POLICY'] not in DUPLICATE_POLICIES:
+        raise ValueError(f"DUPLICATE_POLICY inválido: {app.config['DUPLICATE_POLICY']}")
+    duplicate_submissions = metrics.counter('duplicate_submissions', 'Envios com email ou telefone já cadastrado')
+
+    # Importação em lote de planilhas (CLI e /admin/importar)
+    app.config['IMPORT_FOLDER'] = os.environ.get('IMPORT_FOLDER', 'db/importacoes')
+    app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+    importer = Importer(db, batch_size=app.config['IMPORT_BATCH_SIZE'], policy=app.config['DUPLICATE_POLICY'])
+
+    # Backups online (API de backup do SQLite): snapshots gzip + sha256 com retenção
+    app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR', 'db/backups')
+    app.config['BACKUP_KEEP'] = int(os.environ.get('BACKUP_KEEP', 7))
+    app.config['BACKUP_INTERVAL'] = int(os.environ.get('BACKUP_INTERVAL', 0))  # segundos, 0 desativa
+    app.config['BACKUP_PAGES'] = int(os.environ.get('BACKUP_PAGES', 256))  # páginas por passo da cópia
+    app.config['BACKUP_SLEEP'] = float(os.environ.get('BACKUP_SLEEP', 0.05))  # pausa entre passos
+    backups = BackupManager(
+        db.path,
+        app.config['BACKUP_DIR'],
+        keep=app.config['BACKUP_KEEP'],
+        pages=app.config['BACKUP_PAGES'],
+        sleep=app.config['BACKUP_SLEEP'],
+    ) if db.path else None
+    backup_scheduler = None
+    if backups is not None and app.config['BACKUP_INTERVAL'] > 0:
+        backup_scheduler = BackupScheduler(backups, app.config['BACKUP_INTERVAL'])
+
+    # Arquivamento: respostas antigas vão para um banco separado e comprimido (flask archive-run)
+    app.config['ARCHIVE_PATH'] = os.environ.get('ARCHIVE_PATH', 'db/arquivo.db')
+    app.config['ARCHIVE_UPLOAD_FOLDER'] = os.environ.get('ARCHIVE_UPLOAD_FOLDER', 'db/arquivo_uploads')
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 0))  # 0 desativa
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    archive = ArchiveStore(app.config['ARCHIVE_PATH'], app.config['ARCHIVE_UPLOAD_FOLDER'],
+                           thumbnail_path=upload_store.thumbnail_path)
+    # O arquivo só muda no archive-run, que gera o snapshot dele logo depois
+    archive_backups = BackupManager(
+        app.config['ARCHIVE_PATH'],
+        app.config['BACKUP_DIR'],
+        keep=app.config['BACKUP_KEEP'],
+        prefix='arquivo',
+        table='respostas_arquivadas',
+    )
+
+    # Contagens de buscas, invalidadas a cada escrita em respostas
+    search_counts = CountCache()
+
+    def load_admin_state(user_id):
+        row = db.get_connection().execute(
+            "SELECT is_active, password_hash FROM admin_users WHERE id = ?", (user_id,)
+        ).fetchone()
+        return AdminState(bool(row[0]), credential(row[1])) if row else None
 
-    def hash_password(password):
-        """Hash da senha usando bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    # Alterações feitas direto no banco valem em até ADMIN_CACHE_TTL segundos;
+    # as dos comandos admin-* apagam as sessões na hora
+    admin_states = AdminStateCache(load_admin_state, ttl=app.config['ADMIN_CACHE_TTL'])
 
-    def check_password(password, hashed):
-        """Verifica a senha contra o hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+    def revoke_admin(user_id):
+        admin_states.invalidate(user_id)
+        return app.session_interface.revoke_user(user_id)
 
     def admin_required(f):
         """Decorator para proteger rotas admin"""
@@ -76,48 +294,35 @@ def create_app():
         def decorated_function(*args, **kwargs):
             if 'admin_logged_in' not in session:
                 return redirect(url_for('admin_login'))
+            state = admin_states.get(session.get('admin_user_id'))
+            if state is None or not state.active or state.credential != session.get('admin_credencial'):
+                logger.warning(f"Sessão admin revogada: {session.get('admin_username')}")
+                session.clear()
+                session.regenerate()
+                flash('Sessão encerrada. Faça login novamente.', 'info')
+                return redirect(url_for('admin_login'))
             return f(*args, **kwargs)
         return decorated_function
 
     def init_db():
-        with sqlite3.connect(FILE) as conn:
-            # Tabela de respostas do formulário
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS respostas (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome TEXT NOT NULL,
-                    sobrenome TEXT NOT NULL,
-                    email TEXT NOT NULL,
-                    telefone TEXT,
-                    cidade TEXT,
-                    uf TEXT,
-                    movimento TEXT,
-                    sindicato TEXT,
-                    categoria TEXT,
-                    empresa TEXT,
-                    estuda BOOLEAN,
-                    curso TEXT,
-                    instituicao TEXT,
-                    mensagem TEXT,
-                    imagem TEXT,
-                    ip_address TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    CONSTRAINT email_format CHECK (email LIKE '%_@__%.__%')
-                );
-            """)
-            
-            # Tabela de usuários admin
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS admin_users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                );
-            """)
-            
+        with db.get_connection() as conn:
+            # Tabelas, índices e triggers vêm das migrações versionadas (migrations.py);
+            # aqui só as etapas de esquema, os backfills ficam para o 'flask db-migrate'
+            if app.config['DB_MIGRATE_ON_STARTUP']:
+                apply_schema(conn)
+            app.config['FTS_ENABLED'] = fts5_available(conn) and search_index_exists(conn)
+            if not app.config['FTS_ENABLED']:
+                logger.warning("Busca textual (FTS5) indisponível. A busca do dashboard usará LIKE.")
+            states = migration_status(conn)
+            pending = [str(m.version) for m in states if m.status == 'pendente']
+            if pending:
+                logger.error(f"Migrações não aplicadas: {', '.join(pending)}. Execute 'python migrations.py'.")
+                return
+            backfills = [str(m.version) for m in states if m.status == 'backfill']
+            if backfills:
+                logger.warning(f"Backfill pendente nas migrações {', '.join(backfills)}. "
+                               "Execute 'flask --app app db-migrate'.")
+
             # Verifica se já existe um usuário admin, se não cria um padrão
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM admin_users WHERE username = 'admin'")
@@ -127,7 +332,7 @@ def create_app():
                 # Cria usuário admin padrão: admin / admin123
                 # IMPORTANTE: Altere essa senha em produção!
                 default_password = "admin123"
-                password_hash = hash_password(default_password)
+                password_hash = password_hasher.hash(default_password)
                 cursor.execute(
                     "INSERT INTO admin_users (username, password_hash) VALUES (?, ?)",
                     ("admin", password_hash)
@@ -138,18 +343,55 @@ def create_app():
             else:
                 logger.info("Usuário admin já existe no banco de dados")
 
+    @app.before_request
+    def start_timer():
+        request.environ['app.start_time'] = time.perf_counter()
+        if backup_scheduler is not None:
+            # Idempotente; recria a thread no primeiro request de cada worker
+            backup_scheduler.start()
+
     @app.after_request
     def add_security_headers(response):
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-        response.headers['Content-Security-Policy'] = "default-src 'self'"
+        response.headers.update(SECURITY_HEADERS)
+        return response
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = request.environ.get('app.start_time')
+        if start is not None:
+            # Rota com parâmetros (/admin/resposta/<int:resposta_id>) mantém poucas séries
+            route = request.url_rule.rule if request.url_rule else 'nao_encontrada'
+            labels = {'route': route, 'method': request.method, 'status': str(response.status_code)}
+            request_latency.observe(time.perf_counter() - start, **labels)
+            request_total.inc(**labels)
+        return response
+
+    @app.route('/assets/<path:filename>')
+    @limiter.exempt
+    def serve_asset(filename):
+        if filename not in asset_manifest.by_path:
+            abort(404)
+        path, encoding, mimetype = asset_manifest.select_variant(
+            filename, request.accept_encodings, request.accept_mimetypes
+        )
+        response = send_from_directory(
+            asset_manifest.dist_folder, path,
+            mimetype=mimetype or mimetypes.guess_type(filename)[0]
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept' if filename.lower().endswith(('.png', '.jpg', '.jpeg')) else 'Accept-Encoding'
         return response
 
     @app.route('/')
     def index():
-        return render_template('index.html')
+        # Página estática por deploy: renderiza uma vez e responde 304 a quem já tem
+        page = page_cache.get_or_render('index.html', lambda: render_template('index.html'))
+        response = Response(page.body, content_type=page.mimetype)
+        response.set_etag(page.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
 
     @app.route('/enviar', methods=['POST'])
     @limiter.limit("5 per minute")
@@ -160,36 +402,28 @@ def create_app():
             #     logger.warning(f"CSRF validation failed from IP: {request.remote_addr}")
             #     return jsonify({"error": "Erro de validação CSRF"}), 403
 
-            # Sanitização e validação dos inputs
-            nome = sanitize_input(request.form.get('nome', ''))
-            sobrenome = sanitize_input(request.form.get('sobrenome', ''))
-            email = sanitize_input(request.form.get('email', ''))
-            telefone = sanitize_input(request.form.get('telefone', ''))
-            telefone = sanitize_input(request.form.get('telefone', ''))
-            cidade = sanitize_input(request.form.get('cidade', ''))
-            uf = sanitize_input(request.form.get('uf', ''))
-            movimento = sanitize_input(request.form.get('movimento', ''))
-            sindicato = sanitize_input(request.form.get('sindicato', ''))
-            categoria = sanitize_input(request.form.get('categoria', ''))
-            empresa = sanitize_input(request.form.get('empresa', ''))
-            estuda = request.form.get('estuda') == 'sim'
-            curso = sanitize_input(request.form.get('curso', ''))
-            instituicao = sanitize_input(request.form.get('instituicao', ''))
-            mensagem = sanitize_input(request.form.get('mensagem', ''))
-
-            if not nome or not sobrenome or not email or not telefone:
-                logger.warning(f"Campos obrigatórios ausentes: nome, sobrenome, email, telefone. IP: {request.remote_addr}")
-                return jsonify({"error": "Preencha todos os campos obrigatórios: nome, sobrenome, email e telefone."}), 400
-
-            if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-                logger.warning(f"Email inválido: {email} IP: {request.remote_addr}")
-                return jsonify({"error": "Email inválido"}), 400
-
-            # Validação do telefone (formato brasileiro)
-            telefone_limpo = re.sub(r'[^\d]', '', telefone)
-            if len(telefone_limpo) < 10 or len(telefone_limpo) > 11:
-                logger.warning(f"Telefone inválido: {telefone} IP: {request.remote_addr}")
-                return jsonify({"error": "Telefone deve conter DDD + número (10 ou 11 dígitos)"}), 400
+            # Sanitização e validação dos inputs (esquema compilado, uma passada)
+            try:
+                dados = RESPOSTA_SCHEMA.validate(request.form)
+            except ValidationError as e:
+                validation_failures.inc(field=e.field or 'desconhecido')
+                # Alto volume: amostrado (a contagem exata fica em validation_failures_total)
+                logger.warning(f"{e.log_message} IP: {request.remote_addr}",
+                               extra={'sample': 'validation', 'ip': request.remote_addr})
+                return jsonify({"error": e.message}), 400
+
+            # Busca por índice nas chaves normalizadas (vê só o que já está no banco)
+            dados['email_norm'] = normalize_email(dados['email'])
+            dados['telefone_norm'] = dados.get('telefone_limpo') or None
+            policy = app.config['DUPLICATE_POLICY']
+            with db.get_connection() as conn:
+                original = find_duplicate(conn, dados['email_norm'], dados['telefone_norm'])
+            dados['duplicata_de'] = original
+            if original is not None:
+                duplicate_submissions.inc(policy=policy)
+                logger.info(f"Envio duplicado da resposta {original} ({policy}) IP: {request.remote_addr}")
+                if policy == 'reject':
+                    return jsonify({"error": "Já recebemos uma resposta com este email ou telefone."}), 409
 
             imagem = request.files.get('imagem')
             imagem_path = ''
@@ -197,26 +431,34 @@ def create_app():
                 if not allowed_file(imagem.filename):
                     return jsonify({"error": "Tipo de arquivo não permitido"}), 400
                 
-                filename = secure_filename(imagem.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                imagem_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                imagem.save(imagem_path)
+                # Grava em streaming pelo hash do conteúdo (reenvios não duplicam o arquivo)
+                try:
+                    stored = upload_store.save(imagem)
+                except UploadError as e:
+                    logger.warning(f"Upload recusado: {str(e)} IP: {request.remote_addr}")
+                    return jsonify({"error": "Arquivo de imagem inválido"}), 400
+                imagem_path = stored.path
+                upload_bytes.observe(stored.size)
 
-            with sqlite3.connect(FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO respostas (
-                        nome, sobrenome, email, telefone, cidade, uf,
-                        movimento, sindicato, categoria, empresa,
-                        estuda, curso, instituicao, mensagem, imagem, ip_address
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-                """, (
-                    nome, sobrenome, email, telefone, cidade, uf,
-                    movimento, sindicato, categoria, empresa,
-                    estuda, curso, instituicao, mensagem, imagem_path, request.remote_addr
-                ))
-                conn.commit()
+            dados['imagem'] = imagem_path
+            dados['ip_address'] = request.remote_addr
+            values = RESPOSTA_SCHEMA.values(dados, INSERT_COLUMNS)
+
+            if original is not None and policy == 'merge':
+                with db.get_connection() as conn:
+                    merge_resposta(conn, original, values)
+                submissions.inc(mode='merge')
+                return jsonify({"message": "Resposta atualizada com sucesso!"}), 200
+
+            if ingest_queue is not None:
+                # Modo fila: grava no spool e responde sem esperar o banco principal
+                ingest_queue.enqueue(values)
+                submissions.inc(mode='queue')
+                return jsonify({"message": "Resposta recebida com sucesso!"}), 202
+
+            with db.get_connection() as conn:
+                insert_resposta(conn, values)
+            submissions.inc(mode='sync')
 
             return jsonify({"message": "Resposta enviada com sucesso!"}), 200
 
@@ -224,6 +466,15 @@ def create_app():
             logger.error(f"Erro ao processar requisição: {str(e)}")
             return jsonify({"error": "Erro ao processar a requisição"}), 500
 
+    @app.route('/metrics')
+    @limiter.exempt
+    def metrics_endpoint():
+        # Com METRICS_TOKEN definido, exige 'Authorization: Bearer <token>'
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
     # ROTAS DE ADMINISTRAÇÃO
     @app.route('/admin/login', methods=['GET', 'POST'])
     @limiter.limit("10 per minute")
@@ -237,7 +488,7 @@ def create_app():
                 return render_template('admin/login.html')
             
             try:
-                with sqlite3.connect(FILE) as conn:
+                with db.get_connection() as conn:
                     cursor = conn.cursor()
                     cursor.execute(
                         "SELECT id, password_hash, is_active FROM admin_users WHERE username = ?",
@@ -245,17 +496,46 @@ def create_app():
                     )
                     user = cursor.fetchone()
                     
-                    if user and user[2] and check_password(password, user[1]):  # user[2] = is_active
-                        session['admin_logged_in'] = True
-                        session['admin_user_id'] = user[0]
-                        session['admin_username'] = username
-                        
-                        # Atualiza último login
+                    # Usuário inexistente ou inativo faz o mesmo trabalho que um login real
+                    if user and user[2]:  # user[2] = is_active
+                        valid = password_hasher.verify(password, user[1])
+                    else:
+                        valid = password_hasher.verify_dummy(password)
+
+                    if valid:
+                        # Se o custo do bcrypt mudou, o novo hash é gerado antes de qualquer
+                        # escrita: o lock do banco não fica preso durante o bcrypt
+                        password_hash = user[1]
+                        rehash = password_hasher.needs_rehash(password_hash)
+                        if rehash:
+                            try:
+                                password_hash = password_hasher.hash_async(password)
+                            except HasherOverloaded:
+                                # A senha já foi aceita: mantém o hash antigo e tenta no próximo login
+                                rehash = False
+                                logger.warning(f"Rehash de senha adiado por sobrecarga: {username}")
                         cursor.execute(
                             "UPDATE admin_users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
                             (user[0],)
                         )
+                        if rehash:
+                            cursor.execute(
+                                "UPDATE admin_users SET password_hash = ? WHERE id = ?",
+                                (password_hash, user[0])
+                            )
                         conn.commit()
+                        if rehash:
+                            logger.info(f"Hash de senha atualizado para custo {password_hasher.rounds}: {username}")
+                        admin_states.invalidate(user[0])
+                        admin_credential = credential(password_hash)
+
+                        # Novo identificador de sessão, sob o id do admin (revogável)
+                        session.clear()
+                        session.regenerate(user[0])
+                        session['admin_logged_in'] = True
+                        session['admin_user_id'] = user[0]
+                        session['admin_username'] = username
+                        session['admin_credencial'] = admin_credential
                         
                         logger.info(f"Admin login successful: {username} from IP: {request.remote_addr}")
                         flash('Login realizado com sucesso!', 'success')
@@ -264,6 +544,10 @@ def create_app():
                         logger.warning(f"Failed admin login attempt: {username} from IP: {request.remote_addr}")
                         flash('Username ou senha inválidos', 'error')
                         
+            except HasherOverloaded:
+                logger.warning(f"Login admin recusado por sobrecarga: {username} from IP: {request.remote_addr}")
+                flash('Muitas tentativas simultâneas. Tente novamente em instantes.', 'error')
+                return render_template('admin/login.html'), 503
             except Exception as e:
                 logger.error(f"Erro no login admin: {str(e)}")
                 flash('Erro interno do servidor', 'error')
@@ -275,6 +559,7 @@ def create_app():
         if 'admin_username' in session:
             logger.info(f"Admin logout: {session['admin_username']}")
         session.clear()
+        session.regenerate()
         flash('Logout realizado com sucesso!', 'info')
         return redirect(url_for('admin_login'))
 
@@ -282,64 +567,55 @@ def create_app():
     @admin_required
     def admin_dashboard():
         try:
-            page = request.args.get('page', 1, type=int)
+            page = max(request.args.get('page', 1, type=int), 1)
             per_page = 20  # 20 registros por página
-            offset = (page - 1) * per_page
             
             search = request.args.get('search', '').strip()
+            incluir_arquivo = request.args.get('arquivo') == '1'
+            after = decode_cursor(request.args.get('after'))
+            before = decode_cursor(request.args.get('before'))
             
-            with sqlite3.connect(FILE) as conn:
-                cursor = conn.cursor()
-                
-                # Query base
-                base_query = """
-                    SELECT id, nome, sobrenome, email, telefone, cidade, uf, 
-                           movimento, sindicato, categoria, empresa, 
-                           estuda, curso, instituicao, mensagem, ip_address, created_at
-                    FROM respostas
-                """
-                
-                # Adiciona filtro de pesquisa se necessário
-                if search:
-                    search_query = base_query + """
-                        WHERE nome LIKE ? OR sobrenome LIKE ? OR email LIKE ? 
-                           OR cidade LIKE ? OR empresa LIKE ?
-                        ORDER BY created_at DESC
-                        LIMIT ? OFFSET ?
-                    """
-                    search_param = f"%{search}%"
-                    cursor.execute(search_query, (search_param, search_param, search_param, 
-                                                search_param, search_param, per_page, offset))
-                    
-                    # Conta total para paginação
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM respostas 
-                        WHERE nome LIKE ? OR sobrenome LIKE ? OR email LIKE ? 
-                           OR cidade LIKE ? OR empresa LIKE ?
-                    """, (search_param, search_param, search_param, search_param, search_param))
-                else:
-                    cursor.execute(base_query + " ORDER BY created_at DESC LIMIT ? OFFSET ?", 
-                                 (per_page, offset))
-                    
-                    # Conta total para paginação
-                    cursor.execute("SELECT COUNT(*) FROM respostas")
-                
-                respostas = cursor.fetchall()
-                total_records = cursor.fetchone()[0]
+            with db.get_connection() as conn:
+                _, generation = read_counters(conn)
+                result = list_respostas(conn, DASHBOARD_COLUMNS, per_page, page=page, search=search,
+                                        fts_enabled=app.config.get('FTS_ENABLED'),
+                                        after=after, before=before, counts=search_counts)
+                respostas = result.rows
+                total_records = result.total
+                prev_cursor, next_cursor = result.prev_cursor, result.next_cursor
                 
                 # Calcula informações de paginação
                 total_pages = (total_records + per_page - 1) // per_page
                 has_prev = page > 1
                 has_next = page < total_pages
+
+                # Cards de estatísticas (lidos da tabela de agregados)
+                resumo = read_summary(conn)
+                total_duplicatas = search_counts.get_or_compute(
+                    ('duplicatas',), generation, lambda: count_duplicates(conn)
+                )
+
+                # Respostas arquivadas só entram na busca quando pedido explicitamente
+                arquivadas, total_arquivadas_busca = [], 0
+                if incluir_arquivo and search:
+                    arquivadas, total_arquivadas_busca = archive.search(search, DASHBOARD_COLUMNS, limit=50)
                 
                 return render_template('admin/dashboard.html', 
                                      respostas=respostas,
+                                     resumo=resumo,
                                      current_page=page,
                                      total_pages=total_pages,
                                      has_prev=has_prev,
                                      has_next=has_next,
+                                     prev_cursor=prev_cursor,
+                                     next_cursor=next_cursor,
                                      total_records=total_records,
-                                     search=search)
+                                     total_duplicatas=total_duplicatas,
+                                     search=search,
+                                     incluir_arquivo=incluir_arquivo,
+                                     arquivadas=arquivadas,
+                                     total_arquivadas_busca=total_arquivadas_busca,
+                                     total_arquivadas=archive.count())
                 
         except Exception as e:
             logger.error(f"Erro no dashboard admin: {str(e)}")
@@ -348,30 +624,487 @@ def create_app():
                                  current_page=1, total_pages=1, has_prev=False, 
                                  has_next=False, total_records=0, search='')
 
+    def load_stats(conn, limit, days):
+        total, _ = read_counters(conn)
+        stats = dict(read_summary(conn), total=total)
+        stats['dimensoes'] = {
+            name: [{'valor': valor, 'total': count} for valor, count in read_breakdown(conn, name, limit)]
+            for name in DIMENSIONS if name != 'dia'
+        }
+        stats['por_dia'] = [{'dia': dia, 'total': count} for dia, count in read_daily(conn, days)]
+        return stats
+
+    @app.route('/admin/stats')
+    @admin_required
+    def admin_stats():
+        limit = min(max(request.args.get('limite', 20, type=int), 1), 100)
+        days = min(max(request.args.get('dias', 30, type=int), 1), 366)
+        try:
+            with db.get_connection() as conn:
+                # A geração muda a cada escrita em respostas: serve como ETag
+                _, generation = read_counters(conn)
+                etag = f"{generation}-{limit}-{days}-{datetime.utcnow():%Y%m%d}"
+                if request.if_none_match.contains(etag):
+                    response = Response(status=304)
+                else:
+                    response = jsonify(load_stats(conn, limit, days))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        except Exception as e:
+            logger.error(f"Erro ao carregar estatísticas: {str(e)}")
+            return jsonify({"error": "Erro ao carregar estatísticas"}), 500
+
+    @app.route('/admin/estatisticas')
+    @admin_required
+    def admin_estatisticas():
+        try:
+            with db.get_connection() as conn:
+                stats = load_stats(conn, 10, 30)
+            return render_template('admin/stats.html', stats=stats)
+        except Exception as e:
+            logger.error(f"Erro ao carregar estatísticas: {str(e)}")
+            flash('Erro ao carregar estatísticas', 'error')
+            return redirect(url_for('admin_dashboard'))
+
+    @app.route('/admin/duplicados')
+    @admin_required
+    def admin_duplicados():
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = 20
+        try:
+            with db.get_connection() as conn:
+                _, generation = read_counters(conn)
+                total_groups = search_counts.get_or_compute(
+                    ('grupos_duplicados',), generation, lambda: count_groups(conn)
+                )
+                grupos = duplicate_groups(conn, per_page, (page - 1) * per_page)
+            total_pages = max((total_groups + per_page - 1) // per_page, 1)
+            return render_template('admin/duplicados.html', grupos=grupos, current_page=page,
+                                   total_pages=total_pages, total_groups=total_groups,
+                                   policy=app.config['DUPLICATE_POLICY'])
+        except Exception as e:
+            logger.error(f"Erro ao carregar duplicados: {str(e)}")
+            flash('Erro ao carregar duplicados', 'error')
+            return redirect(url_for('admin_dashboard'))
+
+    @app.route('/admin/importar', methods=['GET', 'POST'])
+    @admin_required
+    def admin_importar():
+        resultado = erros = None
+        if request.method == 'POST':
+            arquivo = request.files.get('arquivo')
+            extension = arquivo.filename.rsplit('.', 1)[-1].lower() if arquivo and '.' in arquivo.filename else ''
+            if extension not in IMPORT_EXTENSIONS:
+                flash('Envie um arquivo CSV ou XLSX', 'error')
+                return redirect(url_for('admin_importar'))
+
+            # O mesmo arquivo enviado de novo retoma a importação (identificado pelo SHA-256)
+            os.makedirs(app.config['IMPORT_FOLDER'], exist_ok=True)
+            fd, path = tempfile.mkstemp(suffix='.' + extension, dir=app.config['IMPORT_FOLDER'])
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    arquivo.save(f)
+                resultado = importer.run(path, arquivo=secure_filename(arquivo.filename) or 'planilha',
+                                         usuario=session.get('admin_username'), kind=extension,
+                                         restart=request.form.get('reimportar') == '1')
+                logger.info(f"Importação {resultado.id} ({resultado.status}) por {session.get('admin_username')}: "
+                            f"{resultado.importadas} importadas, {resultado.erros} erros")
+            except ImportFileError as e:
+                flash(f'Arquivo inválido: {e}', 'error')
+                return redirect(url_for('admin_importar'))
+            except Exception as e:
+                logger.error(f"Erro na importação: {str(e)}")
+                flash('Erro ao importar o arquivo. Envie o mesmo arquivo novamente para continuar.', 'error')
+                return redirect(url_for('admin_importar'))
+            finally:
+                os.remove(path)
+
+        with db.get_connection() as conn:
+            if resultado is not None:
+                erros = import_errors(conn, resultado.id)
+            importacoes = recent_imports(conn)
+        return render_template('admin/importar.html', resultado=resultado, erros=erros,
+                               importacoes=importacoes)
+
     @app.route('/admin/resposta/<int:resposta_id>')
     @admin_required
     def admin_resposta_detail(resposta_id):
         try:
-            with sqlite3.connect(FILE) as conn:
+            with db.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT * FROM respostas WHERE id = ?
+                cursor.row_factory = sqlite3.Row
+                cursor.execute(f"""
+                    SELECT {', '.join(DETAIL_COLUMNS)} FROM respostas WHERE id = ?
                 """, (resposta_id,))
                 resposta = cursor.fetchone()
                 
+                if not resposta and archive.get(resposta_id, ('id',)):
+                    return redirect(url_for('admin_resposta_arquivada', resposta_id=resposta_id))
                 if not resposta:
                     flash('Resposta não encontrada', 'error')
                     return redirect(url_for('admin_dashboard'))
                 
-                return render_template('admin/resposta_detail.html', resposta=resposta)
+                # Miniatura gerada em segundo plano; até existir, mostra o original
+                imagem_url = thumbnail_url = None
+                if resposta['imagem']:
+                    filename = os.path.basename(resposta['imagem'])
+                    imagem_url = url_for('static', filename='uploads/' + filename)
+                    thumb = upload_store.thumbnail_path(resposta['imagem'])
+                    if os.path.exists(thumb):
+                        thumbnail_url = url_for('static', filename='uploads/thumbs/' + os.path.basename(thumb))
+                    elif os.path.exists(resposta['imagem']):
+                        upload_store.schedule_thumbnail(resposta['imagem'])
+
+                return render_template('admin/resposta_detail.html', resposta=resposta,
+                                       imagem_url=imagem_url, thumbnail_url=thumbnail_url)
                 
         except Exception as e:
             logger.error(f"Erro ao buscar resposta {resposta_id}: {str(e)}")
             flash('Erro ao carregar resposta', 'error')
             return redirect(url_for('admin_dashboard'))
 
+    @app.route('/admin/arquivo/<int:resposta_id>')
+    @admin_required
+    def admin_resposta_arquivada(resposta_id):
+        try:
+            resposta = archive.get(resposta_id, DETAIL_COLUMNS)
+            if not resposta:
+                flash('Resposta não encontrada no arquivo', 'error')
+                return redirect(url_for('admin_dashboard'))
+
+            imagem_url = None
+            if resposta['imagem']:
+                imagem_url = url_for('admin_imagem_arquivada', filename=os.path.basename(resposta['imagem']))
+            return render_template('admin/resposta_detail.html', resposta=resposta, arquivada=True,
+                                   imagem_url=imagem_url, thumbnail_url=None)
+
+        except Exception as e:
+            logger.error(f"Erro ao buscar resposta arquivada {resposta_id}: {str(e)}")
+            flash('Erro ao carregar resposta', 'error')
+            return redirect(url_for('admin_dashboard'))
+
+    @app.route('/admin/arquivo/imagem/<path:filename>')
+    @admin_required
+    def admin_imagem_arquivada(filename):
+        # A imagem pode ter ficado em uploads se outra resposta ativa ainda a usa
+        path = archive.image_path(os.path.join(UPLOAD_FOLDER, secure_filename(filename)))
+        if not os.path.exists(path):
+            abort(404)
+        return send_from_directory(os.path.abspath(os.path.dirname(path)), os.path.basename(path))
+
+    def conditional_json(conn, build):
+        """JSON da API com ETag/Last-Modified; 304 sem chamar `build` se o cliente já tem a versão atual"""
+        etag, last_modified = api_validators(conn)
+        if not_modified(request, etag, last_modified):
+            response = Response(status=304)
+        else:
+            response = build()
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @app.route('/admin/api/respostas')
+    @limiter.limit(lambda: app.config['API_RATELIMIT'], key_func=admin_or_ip)
+    @admin_required
+    def api_respostas():
+        # Mesma busca e paginação do dashboard (search, page, after/before)
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except FieldError as e:
+            return jsonify({"error": str(e)}), 400
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+        search = request.args.get('search', '').strip()
+
+        def build():
+            result = list_respostas(conn, fields, per_page, page=page, search=search,
+                                    fts_enabled=app.config.get('FTS_ENABLED'),
+                                    after=decode_cursor(request.args.get('after')),
+                                    before=decode_cursor(request.args.get('before')),
+                                    counts=search_counts)
+            return jsonify({
+                'respostas': result.rows,
+                'total': result.total,
+                'pagina': page,
+                'por_pagina': per_page,
+                'total_paginas': max(1, (result.total + per_page - 1) // per_page),
+                'anterior': result.prev_cursor,
+                'proximo': result.next_cursor,
+            })
+
+        try:
+            with db.get_connection() as conn:
+                return conditional_json(conn, build)
+        except Exception as e:
+            logger.error(f"Erro na API de respostas: {str(e)}")
+            return jsonify({"error": "Erro ao listar respostas"}), 500
+
+    @app.route('/admin/api/respostas/<int:resposta_id>')
+    @limiter.limit(lambda: app.config['API_RATELIMIT'], key_func=admin_or_ip)
+    @admin_required
+    def api_resposta(resposta_id):
+        try:
+            fields = parse_fields(request.args.get('fields'), default=API_FIELDS)
+        except FieldError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            with db.get_connection() as conn:
+                # A existência vem antes do ETag, que é da coleção: um id inexistente é 404, não 304
+                row = conn.execute(
+                    f"SELECT {', '.join(fields)} FROM respostas WHERE id = ?", (resposta_id,)
+                ).fetchone()
+                if row is None:
+                    return jsonify({"error": "Resposta não encontrada"}), 404
+                return conditional_json(conn, lambda: jsonify(dict(zip(fields, row))))
+        except Exception as e:
+            logger.error(f"Erro na API ao buscar resposta {resposta_id}: {str(e)}")
+            return jsonify({"error": "Erro ao buscar resposta"}), 500
+
+    @app.route('/admin/export')
+    @admin_required
+    def admin_export():
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            flash('Formato de exportação inválido', 'error')
+            return redirect(url_for('admin_dashboard'))
+
+        # Mesmo filtro de busca do dashboard, mais intervalo de datas (AAAA-MM-DD)
+        search = request.args.get('search', '').strip()
+        condition, params = search_filter(search, app.config.get('FTS_ENABLED'))
+        conditions = [condition] if condition else []
+        try:
+            desde = request.args.get('desde', '').strip()
+            if desde:
+                conditions.append("created_at >= ?")
+                params.append(datetime.strptime(desde, '%Y-%m-%d').strftime('%Y-%m-%d'))
+            ate = request.args.get('ate', '').strip()
+            if ate:
+                conditions.append("created_at < ?")
+                params.append((datetime.strptime(ate, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        except ValueError:
+            flash('Data inválida. Use o formato AAAA-MM-DD', 'error')
+            return redirect(url_for('admin_dashboard'))
+
+        sql, params = build_export_query(conditions, params)
+        content_type, extension = FORMATS[fmt]
+        filename = f"respostas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+        # Conexão dedicada: o gerador continua lendo depois que a view retorna
+        chunks = stream_export(db.connect(), fmt, sql, params)
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        if fmt != 'xlsx' and 'gzip' in request.accept_encodings:
+            chunks = gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+
+        logger.info(f"Exportação {fmt} iniciada por {session.get('admin_username')} (busca: '{search}')")
+        return Response(chunks, content_type=content_type, headers=headers)
+
+    # COMANDOS DE LINHA DE COMANDO
+    @app.cli.command('search-reindex')
+    def search_reindex_command():
+        """Reconstrói o índice de busca FTS5 a partir das respostas existentes"""
+        if not app.config.get('FTS_ENABLED'):
+            click.echo("SQLite sem suporte a FTS5; nada a fazer.")
+            return
+        total = rebuild_search_index(db.get_connection())
+        click.echo(f"Índice de busca reconstruído: {total} respostas indexadas.")
+
+    @app.cli.command('stats-rebuild')
+    def stats_rebuild_command():
+        """Recalcula a tabela de estatísticas agregadas a partir das respostas (e do arquivo)"""
+        conn = db.get_connection()
+        archived = archive.load_dimensions(conn)
+        total = rebuild_aggregates(conn, extra_sources=(archived,) if archived else ())
+        click.echo(f"Estatísticas recalculadas: {total} linhas agregadas.")
+
+    @app.cli.command('duplicates-backfill')
+    @click.option('--batch-size', default=5000, show_default=True, help='Respostas por transação')
+    def duplicates_backfill_command(batch_size):
+        """Preenche email/telefone normalizados e marca duplicatas nas respostas antigas"""
+        processed, flagged = backfill_duplicates(
+            db.get_connection(), batch_size,
+            progress=lambda done, dups: click.echo(f"  {done} respostas processadas, {dups} duplicatas")
+        )
+        click.echo(f"Backfill concluído: {processed} respostas processadas, {flagged} marcadas como duplicatas.")
+
+    @app.cli.command('import-respostas')
+    @click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--reimportar', is_flag=True, help='Importa de novo um arquivo já concluído')
+    @click.option('--erros', 'max_errors', default=20, show_default=True, help='Erros exibidos ao final')
+    def import_respostas_command(arquivo, reimportar, max_errors):
+        """Importa respostas de uma planilha CSV ou XLSX (retoma se interrompida)"""
+        try:
+            resultado = importer.run(
+                arquivo, restart=reimportar,
+                progress=lambda r: click.echo(f"  linha {r.linhas}: {r.importadas} importadas, {r.erros} erros")
+            )
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+        if resultado.anterior:
+            click.echo("Arquivo já importado anteriormente (use --reimportar para importar de novo).")
+        click.echo(f"Importação {resultado.id} {resultado.status}: {resultado.linhas} linhas, "
+                   f"{resultado.importadas} importadas, {resultado.erros} erros"
+                   f"{' (retomada)' if resultado.retomada else ''}.")
+        for linha, campo, erro in import_errors(db.get_connection(), resultado.id, max_errors):
+            click.echo(f"  linha {linha}{f' [{campo}]' if campo else ''}: {erro}")
+
+    @app.cli.command('db-migrate')
+    @click.option('--dry-run', is_flag=True, help='Só mostra o estado das migrações, sem alterar o banco')
+    @click.option('--ate', 'target', type=int, help='Versão máxima a aplicar')
+    @click.option('--sem-backfill', is_flag=True, help='Aplica só as etapas de esquema')
+    @click.option('--batch-size', default=2000, show_default=True, help='Linhas por lote do backfill')
+    @click.option('--pausa', default=0.05, show_default=True, help='Segundos entre os lotes')
+    def db_migrate_command(dry_run, target, sem_backfill, batch_size, pausa):
+        """Aplica as migrações pendentes e executa os backfills (retoma se interrompido)"""
+        conn = db.get_connection()
+        if dry_run:
+            for line in describe_migrations(conn, target):
+                click.echo(line)
+            return
+        applied = apply_schema(conn, target)
+        click.echo(f"Esquema: {len(applied)} migrações aplicadas"
+                   f"{' (' + ', '.join(map(str, applied)) + ')' if applied else ''}.")
+        if sem_backfill:
+            return
+        done = run_backfills(
+            conn, batch_size=batch_size, pause=pausa, target=target,
+            progress=lambda m, processed: click.echo(f"  {m.version} {m.name}: {processed} linhas")
+        )
+        for version, count in done.items():
+            click.echo(f"Backfill da migração {version} concluído ({count} linhas nesta execução).")
+        if not done:
+            click.echo("Nenhum backfill pendente.")
+
+    @app.cli.command('backup-create')
+    @click.option('--label', help='Sufixo do nome do arquivo')
+    def backup_create_command(label):
+        """Gera um snapshot do banco sem parar a aplicação"""
+        if backups is None:
+            raise click.ClickException("Backup disponível apenas para SQLite")
+        snapshot = backups.create(label=label)
+        click.echo(f"Backup criado: {snapshot.path} ({snapshot.size} bytes)")
+
+    @app.cli.command('backup-list')
+    def backup_list_command():
+        """Lista os snapshots do diretório de backup"""
+        if backups is None:
+            raise click.ClickException("Backup disponível apenas para SQLite")
+        for snapshot in backups.list():
+            click.echo(f"{snapshot.created_at:%Y-%m-%d %H:%M:%S} UTC  {snapshot.size:>12}  "
+                       f"{os.path.basename(snapshot.path)}")
+
+    @app.cli.command('backup-restore')
+    @click.argument('snapshot', default='latest')
+    @click.option('--sem-copia', is_flag=True, help='Não guarda uma cópia do banco atual antes')
+    @click.confirmation_option(prompt='Substituir o conteúdo do banco pelo backup?')
+    def backup_restore_command(snapshot, sem_copia):
+        """Confere e restaura um snapshot (o mais recente por padrão)"""
+        if backups is None:
+            raise click.ClickException("Backup disponível apenas para SQLite")
+        try:
+            rows = backups.restore(snapshot, safety_copy=not sem_copia)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Backup restaurado: {rows} respostas.")
+
+    @app.cli.command('archive-run')
+    @click.option('--dias', type=int, help='Idade mínima em dias (padrão: ARCHIVE_AFTER_DAYS)')
+    @click.option('--batch-size', type=int, help='Respostas por lote (padrão: ARCHIVE_BATCH_SIZE)')
+    @click.option('--dry-run', is_flag=True, help='Só conta as respostas que seriam arquivadas')
+    @click.option('--vacuum', is_flag=True, help='Compacta o banco principal ao final')
+    def archive_run_command(dias, batch_size, dry_run, vacuum):
+        """Move as respostas antigas para o banco de arquivo (retoma se interrompido)"""
+        dias = dias if dias is not None else app.config['ARCHIVE_AFTER_DAYS']
+        if dias <= 0:
+            raise click.ClickException("Arquivamento desativado: defina ARCHIVE_AFTER_DAYS ou use --dias")
+        conn = db.get_connection()
+        if dry_run:
+            click.echo(f"{archive.eligible(conn, dias)} respostas com mais de {dias} dias seriam arquivadas.")
+            return
+        total = archive.run(
+            conn, dias, batch_size or app.config['ARCHIVE_BATCH_SIZE'],
+            progress=lambda moved: click.echo(f"  {moved} respostas arquivadas")
+        )
+        click.echo(f"Arquivamento concluído: {total} respostas movidas para {app.config['ARCHIVE_PATH']} "
+                   f"({archive.count()} no arquivo).")
+        if total:
+            snapshot = archive_backups.create(label='arquivamento')
+            click.echo(f"Backup do arquivo: {snapshot.path}")
+        if vacuum:
+            # O SQLite não devolve ao disco as páginas liberadas sem VACUUM (bloqueia as escritas)
+            conn.execute("VACUUM")
+            click.echo("Banco principal compactado.")
+
+    def find_admin(conn, username):
+        row = conn.execute("SELECT id FROM admin_users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            raise click.ClickException(f"Admin não encontrado: {username}")
+        return row[0]
+
+    @app.cli.command('admin-password')
+    @click.argument('username')
+    @click.password_option('--senha', prompt='Nova senha', help='Nova senha (pedida se omitida)')
+    def admin_password_command(username, senha):
+        """Troca a senha de um admin e encerra as sessões dele"""
+        conn = db.get_connection()
+        user_id = find_admin(conn, username)
+        with conn:
+            conn.execute("UPDATE admin_users SET password_hash = ? WHERE id = ?",
+                         (password_hasher.hash(senha), user_id))
+        revoked = revoke_admin(user_id)
+        logger.info(f"Senha do admin {username} alterada; {revoked} sessões encerradas")
+        click.echo(f"Senha de {username} alterada; {revoked} sessões encerradas.")
+
+    @app.cli.command('admin-deactivate')
+    @click.argument('username')
+    def admin_deactivate_command(username):
+        """Desativa um admin e encerra as sessões dele"""
+        conn = db.get_connection()
+        user_id = find_admin(conn, username)
+        with conn:
+            conn.execute("UPDATE admin_users SET is_active = 0 WHERE id = ?", (user_id,))
+        revoked = revoke_admin(user_id)
+        logger.info(f"Admin {username} desativado; {revoked} sessões encerradas")
+        click.echo(f"Admin {username} desativado; {revoked} sessões encerradas.")
+
+    @app.cli.command('admin-activate')
+    @click.argument('username')
+    def admin_activate_command(username):
+        """Reativa um admin desativado"""
+        conn = db.get_connection()
+        user_id = find_admin(conn, username)
+        with conn:
+            conn.execute("UPDATE admin_users SET is_active = 1 WHERE id = ?", (user_id,))
+        admin_states.invalidate(user_id)
+        click.echo(f"Admin {username} ativado.")
+
+    @app.cli.command('assets-build')
+    def assets_build_command():
+        """Gera os arquivos estáticos versionados e pré-comprimidos em static/dist"""
+        manifest = build_assets(app.static_folder)
+        click.echo(f"{len(manifest['assets'])} arquivos processados (versão {manifest['version']}).")
+
+    @app.cli.command('ingest-flush')
+    def ingest_flush_command():
+        """Grava no banco todas as respostas pendentes na fila de ingestão"""
+        if ingest_queue is None:
+            click.echo("INGEST_MODE não é 'queue'; nada a fazer.")
+            return
+        total = ingest_queue.flush_all()
+        click.echo(f"Fila de ingestão esvaziada: {total} respostas gravadas.")
+
     # Inicializa o banco de dados quando a aplicação é criada
     init_db()
+    if ingest_queue is not None and ingest_queue.pending():
+        # Grava respostas deixadas no spool por um worker que caiu
+        ingest_queue.start()
     return app
 
 app = create_app()
@@ -0,0 +1,235 @@
+"""
+Logging assíncrono e estruturado
+As requisições só colocam o registro em uma fila em memória; uma thread por
+processo (QueueListener) formata em JSON e grava no arquivo e no terminal.
+Todos os workers escrevem no mesmo arquivo em modo append, e a rotação
+(por tamanho ou por tempo) é feita por um único processo de cada vez, sob flock.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem coordenação entre processos
+    fcntl = None
+
+# Atributos padrão de um LogRecord; o que não estiver aqui veio de extra={...}
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos passados em extra={...}"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        elif record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deixa passar 1 de cada `rate` registros marcados com extra={'sample': <chave>}
+    (contagem separada por chave). Os registros que passam levam 'sampled': rate.
+    Registros sem a marca passam sempre.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.rate == 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.rate:
+            return False
+        record.sampled = self.rate
+        return True
+
+
+class SharedRotatingFileHandler(logging.handlers.WatchedFileHandler):
+    """
+    Arquivo compartilhado entre processos. Cada linha é gravada com um único
+    write em modo append; quem passar do limite tenta o flock do arquivo .lock
+    e, se conseguir, rotaciona. Os demais percebem a troca de inode
+    (WatchedFileHandler) e reabrem o arquivo novo.
+    O .lock guarda o horário da última rotação, usado na rotação por tempo.
+    """
+
+    CHECK_INTERVAL = 1.0  # segundos entre verificações de tamanho/idade
+
+    def __init__(self, filename, max_bytes=10 * 1024 ** 2, backup_count=5, interval=86400):
+        super().__init__(filename, encoding='utf-8')
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.interval = interval
+        self.lock_path = self.baseFilename + '.lock'
+        self._next_check = 0.0
+
+    def emit(self, record):
+        super().emit(record)
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.CHECK_INTERVAL
+            try:
+                self._maybe_rotate()
+            except OSError:
+                self.handleError(record)
+
+    def _due(self, last_rotation):
+        try:
+            size = os.stat(self.baseFilename).st_size
+        except FileNotFoundError:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.interval and size and time.time() - last_rotation >= self.interval)
+
+    def _maybe_rotate(self):
+        with open(self.lock_path, 'a+') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # outro processo está rotacionando
+            lock.seek(0)
+            try:
+                last_rotation = float(lock.read() or 0)
+            except ValueError:
+                last_rotation = 0.0
+            if not last_rotation:
+                # Primeira execução: o período começa agora
+                last_rotation = time.time()
+                lock.seek(0)
+                lock.truncate()
+                lock.write(str(last_rotation))
+                lock.flush()
+            # Confere de novo sob o lock: outro processo pode ter acabado de rotacionar
+            if not self._due(last_rotation):
+                return
+            self._rotate()
+            lock.seek(0)
+            lock.truncate()
+            lock.write(str(time.time()))
+            lock.flush()
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.baseFilename}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.baseFilename}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.baseFilename, self.baseFilename + '.1')
+        else:
+            os.remove(self.baseFilename)
+        self.reopenIfNeeded()
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler com fila limitada e listener por processo. Fila cheia descarta
+    o registro (e conta) em vez de bloquear a requisição. A thread do listener
+    não sobrevive a um fork: é recriada no primeiro log do novo processo.
+    """
+
+    def __init__(self, handlers, max_queue=10000):
+        super().__init__(queue.Queue(max_queue))
+        self.handlers = handlers
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener_pid != os.getpid():
+                # A fila herdada do processo pai pode ter um lock em estado inválido
+                self.queue = queue.Queue(self.queue.maxsize)
+                self._listener = logging.handlers.QueueListener(
+                    self.queue, *self.handlers, respect_handler_level=True
+                )
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # Resolve a mensagem e o traceback antes de cruzar a thread (args podem mudar)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Grava o que ainda estiver na fila (chamado no atexit)"""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+        for handler in self.handlers:
+            handler.flush()
+
+
+def configure_logging(path='app.log', level='INFO', max_bytes=10 * 1024 ** 2, backup_count=5,
+                      interval=86400, sample_rate=10, max_queue=10000):
+    """
+    Substitui os handlers do logger raiz por um AsyncQueueHandler que grava
+    JSON em `path` (rotação compartilhada) e no stderr. Idempotente.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            return handler
+
+    formatter = JsonFormatter()
+    handlers = []
+    for handler in (
+        SharedRotatingFileHandler(path, max_bytes=max_bytes, backup_count=backup_count, interval=interval),
+        logging.StreamHandler(),
+    ):
+        handler.setFormatter(formatter)
+        handlers.append(handler)
+
+    queue_handler = AsyncQueueHandler(handlers, max_queue=max_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    return queue_handler
@@ -0,0 +1,287 @@
+"""
+Arquivamento das respostas antigas
+Respostas com mais de ARCHIVE_AFTER_DAYS dias saem da tabela respostas em lotes
+e vão para um banco separado (db/arquivo.db): cada linha é guardada como JSON
+comprimido (zlib), com um índice FTS5 sem conteúdo para a busca. As imagens
+usadas só por elas vão para uma pasta de arquivo. O banco principal fica
+pequeno; o admin só consulta o arquivo quando marca "Incluir arquivo".
+As estatísticas agregadas continuam contando as respostas arquivadas.
+"""
+
+import json
+import logging
+import os
+import shutil
+import zlib
+from datetime import datetime, timedelta
+
+from aggregates import add_aggregates
+from database import Database
+from search import FTS_COLUMNS, FTS_TOKENIZER, build_match_query, fts5_available
+
+logger = logging.getLogger(__name__)
+
+# Originais de grupos de duplicatas com alguma duplicata ativa não são arquivadas
+NOT_CANONICAL = "NOT EXISTS (SELECT 1 FROM respostas d WHERE d.duplicata_de = respostas.id)"
+
+# Colunas usadas pelas dimensões das estatísticas (tabela temporária do stats-rebuild)
+DIMENSION_COLUMNS = ('uf', 'cidade', 'categoria', 'sindicato', 'movimento', 'created_at')
+
+
+class ArchivedRow(tuple):
+    """Linha arquivada com acesso por posição e por nome, como sqlite3.Row"""
+
+    def __new__(cls, columns, data):
+        row = super().__new__(cls, (data.get(c) for c in columns))
+        row._index = {c: i for i, c in enumerate(columns)}
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return super().__getitem__(self._index[key])
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self._index)
+
+
+def _encode(data):
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class ArchiveStore:
+    """
+    Banco de arquivo e pasta das imagens arquivadas. A conexão segue a
+    mesma regra do banco principal: uma por thread, reaberta após fork.
+    """
+
+    def __init__(self, path, upload_folder, thumbnail_path=None):
+        self.path = path
+        self.upload_folder = upload_folder
+        self.thumbnail_path = thumbnail_path
+        self.db = Database(f"sqlite:///{path}")
+        self.fts_enabled = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get_connection(self):
+        conn = self.db.get_connection()
+        if self.fts_enabled is None:
+            self._init(conn)
+        return conn
+
+    def _init(self, conn):
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respostas_arquivadas (
+                    -- Chave na ordem do arquivamento: os lotes saem por data, com ids
+                    -- fora de ordem, e inserir pelo id deixaria as páginas pela metade
+                    seq INTEGER PRIMARY KEY,
+                    id INTEGER NOT NULL UNIQUE,
+                    created_at TIMESTAMP,
+                    arquivada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    dados BLOB NOT NULL
+                );
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_respostas_arquivadas_created_at
+                ON respostas_arquivadas (created_at);
+            """)
+            fts_enabled = fts5_available(conn)
+            if fts_enabled:
+                # Sem conteúdo: guarda só o índice, o texto fica no JSON comprimido
+                conn.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS arquivo_fts USING fts5(
+                        {', '.join(FTS_COLUMNS)},
+                        content='',
+                        tokenize='{FTS_TOKENIZER}'
+                    );
+                """)
+        self.fts_enabled = fts_enabled
+
+    # --- Arquivamento -----------------------------------------------------
+
+    def eligible(self, conn, days):
+        """Quantas respostas do banco principal têm mais de `days` dias"""
+        return conn.execute(
+            f"SELECT COUNT(*) FROM respostas WHERE created_at < ? AND {NOT_CANONICAL}", (_cutoff(days),)
+        ).fetchone()[0]
+
+    def archive_batch(self, conn, days, batch_size=1000):
+        """
+        Move um lote de respostas mais antigas que `days` dias. O lock de
+        escrita do banco principal é tomado antes da leitura, então nenhuma
+        alteração no lote se perde entre a cópia e a remoção. Linhas que uma
+        execução interrompida já copiou não são copiadas de novo.
+        A original de um grupo de duplicatas fica enquanto alguma duplicata
+        ativa apontar para ela (o grupo sumiria do painel de duplicatas).
+        Retorna o número de respostas movidas.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(f"""
+                SELECT * FROM respostas WHERE created_at < ? AND {NOT_CANONICAL}
+                ORDER BY created_at, id LIMIT ?
+            """, (_cutoff(days), batch_size))
+            columns = [d[0] for d in cursor.description]
+            rows = [dict(zip(columns, values)) for values in cursor.fetchall()]
+            if not rows:
+                conn.rollback()
+                return 0
+            ids = [row['id'] for row in rows]
+            placeholders = ', '.join('?' for _ in ids)
+
+            self._store(rows, ids, placeholders)
+
+            # Mantém as respostas arquivadas nas estatísticas: os triggers de
+            # DELETE vão descontar exatamente o que é somado aqui
+            add_aggregates(conn, f"(SELECT * FROM respostas WHERE id IN ({placeholders}))", ids)
+            conn.execute(f"DELETE FROM respostas WHERE id IN ({placeholders})", ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        images = {row['imagem'] for row in rows if row.get('imagem')}
+        for image in images - _referenced_images(conn, images):
+            self._archive_image(conn, image)
+        return len(rows)
+
+    def _store(self, rows, ids, placeholders):
+        aconn = self.get_connection()
+        with aconn:
+            present = {r[0] for r in aconn.execute(
+                f"SELECT id FROM respostas_arquivadas WHERE id IN ({placeholders})", ids
+            )}
+            new_rows = [row for row in rows if row['id'] not in present]
+            aconn.executemany(
+                "INSERT INTO respostas_arquivadas (id, created_at, dados) VALUES (?, ?, ?)",
+                [(row['id'], row['created_at'], _encode(row)) for row in new_rows]
+            )
+            if self.fts_enabled:
+                aconn.executemany(
+                    f"INSERT INTO arquivo_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' for _ in FTS_COLUMNS)})",
+                    [(row['id'], *(row.get(c) for c in FTS_COLUMNS)) for row in new_rows]
+                )
+
+    def _archive_image(self, conn, image):
+        """Move para o arquivo uma imagem que nenhuma resposta ativa usava no fim do lote"""
+        if not os.path.exists(image):
+            return
+        os.makedirs(self.upload_folder, exist_ok=True)
+        target = os.path.join(self.upload_folder, os.path.basename(image))
+        shutil.move(image, target)
+        # Uploads são endereçados pelo conteúdo: um envio igual pode ter chegado agora
+        if _referenced(conn, image):
+            shutil.copy2(target, image)
+        elif self.thumbnail_path and os.path.exists(self.thumbnail_path(image)):
+            # A miniatura é derivada; o detalhe arquivado mostra a imagem original
+            os.remove(self.thumbnail_path(image))
+
+    def run(self, conn, days, batch_size=1000, progress=None):
+        """Arquiva em lotes até não restar resposta elegível; retorna o total movido"""
+        total = 0
+        while True:
+            moved = self.archive_batch(conn, days, batch_size)
+            total += moved
+            if moved and progress:
+                progress(total)
+            if moved < batch_size:
+                if total:
+                    logger.info(f"Arquivamento: {total} respostas com mais de {days} dias movidas")
+                return total
+
+    # --- Consulta ---------------------------------------------------------
+
+    def count(self):
+        if not self.exists():
+            return 0
+        return self.get_connection().execute("SELECT COUNT(*) FROM respostas_arquivadas").fetchone()[0]
+
+    def get(self, resposta_id, columns):
+        """ArchivedRow com as colunas pedidas (ordem de SELECT * em respostas) ou None"""
+        if not self.exists():
+            return None
+        row = self.get_connection().execute(
+            "SELECT dados FROM respostas_arquivadas WHERE id = ?", (resposta_id,)
+        ).fetchone()
+        return ArchivedRow(columns, _decode(row[0])) if row else None
+
+    def search(self, term, columns, limit=50, offset=0):
+        """(linhas, total) das respostas arquivadas que casam com a busca do dashboard"""
+        if not self.exists() or not term:
+            return [], 0
+        conn = self.get_connection()
+        match_query = build_match_query(term)
+        if self.fts_enabled and match_query:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM arquivo_fts WHERE arquivo_fts MATCH ?", (match_query,)
+            ).fetchone()[0]
+            ids = [r[0] for r in conn.execute("""
+                SELECT rowid FROM arquivo_fts WHERE arquivo_fts MATCH ?
+                ORDER BY rank LIMIT ? OFFSET ?
+            """, (match_query, limit, offset))]
+            found = {}
+            if ids:
+                found = dict(conn.execute(
+                    f"SELECT id, dados FROM respostas_arquivadas WHERE id IN ({', '.join('?' for _ in ids)})", ids
+                ).fetchall())
+            return [ArchivedRow(columns, _decode(found[i])) for i in ids if i in found], total
+
+        # Sem FTS5: percorre o arquivo descomprimindo (consulta explícita e rara)
+        needle = term.lower()
+        matches = []
+        for (blob,) in conn.execute("SELECT dados FROM respostas_arquivadas ORDER BY created_at DESC, id DESC"):
+            data = _decode(blob)
+            if any(needle in str(data.get(c) or '').lower() for c in FTS_COLUMNS):
+                matches.append(data)
+        return [ArchivedRow(columns, data) for data in matches[offset:offset + limit]], len(matches)
+
+    def image_path(self, image):
+        """Onde está a imagem de uma resposta arquivada (pasta do arquivo ou uploads)"""
+        archived = os.path.join(self.upload_folder, os.path.basename(image))
+        return archived if os.path.exists(archived) else image
+
+    def load_dimensions(self, conn):
+        """
+        Copia as colunas das estatísticas das respostas arquivadas para uma
+        tabela temporária da conexão `conn` (para o rebuild_aggregates).
+        Retorna o nome da tabela, ou None se não houver arquivo.
+        """
+        if not self.exists():
+            return None
+        conn.execute("DROP TABLE IF EXISTS temp.arquivo_dimensoes")
+        conn.execute(f"CREATE TEMP TABLE arquivo_dimensoes ({', '.join(DIMENSION_COLUMNS)})")
+        rows = (
+            tuple(data.get(c) for c in DIMENSION_COLUMNS)
+            for data in (_decode(blob) for (blob,) in
+                         self.get_connection().execute("SELECT dados FROM respostas_arquivadas"))
+        )
+        conn.executemany(
+            f"INSERT INTO temp.arquivo_dimensoes VALUES ({', '.join('?' for _ in DIMENSION_COLUMNS)})", rows
+        )
+        return 'temp.arquivo_dimensoes'
+
+
+def _cutoff(days):
+    return (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _referenced(conn, image):
+    return conn.execute("SELECT 1 FROM respostas WHERE imagem = ? LIMIT 1", (image,)).fetchone() is not None
+
+
+def _referenced_images(conn, images):
+    """Quais das imagens ainda são usadas por respostas ativas (uma consulta pelo índice)"""
+    if not images:
+        return set()
+    images = list(images)
+    return {row[0] for row in conn.execute(
+        f"SELECT DISTINCT imagem FROM respostas WHERE imagem IN ({', '.join('?' for _ in images)})", images
+    )}
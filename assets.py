@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Pipeline de arquivos estáticos
+Gera cópias com hash do conteúdo no nome (static/dist), variantes pré-comprimidas
+(gzip/brotli) e versões WebP/AVIF das imagens, descritas em um manifest.json.
+Pode ser executado no build (python assets.py) ou na inicialização da aplicação.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from io import BytesIO
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só há variantes gzip
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow é opcional: sem ele não há WebP/AVIF
+    Image = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Pastas de static/ que não fazem parte do pipeline
+SKIP_DIRS = {DIST_DIR, 'uploads'}
+
+TEXT_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.ico'}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+# Variantes de imagem na ordem de preferência, com o formato do Pillow
+IMAGE_VARIANTS = (('avif', 'AVIF'), ('webp', 'WEBP'))
+
+# Ordem de preferência das codificações de texto
+ENCODINGS = (('br', 'br'), ('gzip', 'gz'))
+
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _write_atomic(path, data):
+    fd, temp_path = tempfile.mkstemp(prefix='.asset-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def hashed_name(filename, data):
+    """'Pixel ComunaTec.png' -> 'Pixel-ComunaTec.<hash>.png' (sem espaços)"""
+    stem, ext = os.path.splitext(filename)
+    stem = re.sub(r'\s+', '-', stem)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def _source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def _image_variants(data, max_size):
+    """Gera (extensão, bytes) das versões modernas menores que o original"""
+    if Image is None:
+        return
+    for extension, pil_format in IMAGE_VARIANTS:
+        try:
+            with Image.open(BytesIO(data)) as img:
+                out = BytesIO()
+                img.save(out, pil_format, quality=80)
+        except (KeyError, OSError, ValueError):
+            continue  # formato não suportado por esta instalação do Pillow
+        if out.tell() < max_size:
+            yield extension, out.getvalue()
+
+
+def _rewrite_css(data, logical_name, entries):
+    """Troca url(...) relativas do CSS pelos nomes com hash"""
+    base = os.path.dirname(logical_name)
+
+    def replace(match):
+        target = match.group(2).strip()
+        if re.match(r'^(data:|https?:|/|#)', target):
+            return match.group(0)
+        key = os.path.normpath(os.path.join(base, target)).replace(os.sep, '/')
+        if key not in entries:
+            return match.group(0)
+        relative = os.path.relpath(entries[key]['path'], base or '.').replace(os.sep, '/')
+        return f"url('{relative}')"
+
+    return CSS_URL_RE.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def build_assets(static_folder='static'):
+    """Gera static/dist e retorna o manifesto. Arquivos já gerados são reaproveitados."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    sources = dict(_source_files(static_folder))
+    entries = {}
+
+    # Imagens e demais arquivos primeiro: o CSS precisa dos nomes finais deles
+    ordered = sorted(sources, key=lambda name: name.endswith('.css'))
+    for logical_name in ordered:
+        with open(sources[logical_name], 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(logical_name)[1].lower()
+        if ext == '.css':
+            data = _rewrite_css(data, logical_name, entries)
+
+        output = os.path.join(os.path.dirname(logical_name), hashed_name(os.path.basename(logical_name), data))
+        output = output.replace(os.sep, '/')
+        target = os.path.join(dist, output)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        entry = {'path': output, 'variants': {}}
+
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+
+        if ext in TEXT_EXTENSIONS:
+            if not os.path.exists(target + '.gz'):
+                _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            entry['variants']['gz'] = output + '.gz'
+            if brotli is not None:
+                if not os.path.exists(target + '.br'):
+                    _write_atomic(target + '.br', brotli.compress(data, quality=11))
+                entry['variants']['br'] = output + '.br'
+        elif ext in IMAGE_EXTENSIONS:
+            for variant_ext in [e for e, _ in IMAGE_VARIANTS]:
+                variant_path = f"{target}.{variant_ext}"
+                if os.path.exists(variant_path):
+                    entry['variants'][variant_ext] = f"{output}.{variant_ext}"
+            if not entry['variants']:
+                for variant_ext, variant_data in _image_variants(data, len(data)):
+                    _write_atomic(f"{target}.{variant_ext}", variant_data)
+                    entry['variants'][variant_ext] = f"{output}.{variant_ext}"
+
+        entries[logical_name] = entry
+
+    manifest = {'version': hashlib.sha256(
+        json.dumps(entries, sort_keys=True).encode('utf-8')).hexdigest()[:12], 'assets': entries}
+    _write_atomic(os.path.join(dist, MANIFEST_NAME),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(static_folder='static'):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class AssetManifest:
+    """Resolve nomes lógicos para URLs com hash e escolhe a melhor variante"""
+
+    def __init__(self, static_folder, manifest=None):
+        self.static_folder = static_folder
+        self.dist_folder = os.path.join(static_folder, DIST_DIR)
+        manifest = manifest or {'version': None, 'assets': {}}
+        self.version = manifest['version']
+        self.assets = manifest['assets']
+        # Caminho com hash -> variantes, para o handler de /assets
+        self.by_path = {entry['path']: entry['variants'] for entry in self.assets.values()}
+
+    def hashed_path(self, filename):
+        entry = self.assets.get(filename)
+        return entry['path'] if entry else None
+
+    def select_variant(self, path, accept_encodings, accept_mimetypes):
+        """Retorna (arquivo a enviar, Content-Encoding, mimetype) para o pedido"""
+        variants = self.by_path.get(path, {})
+        for encoding, extension in ENCODINGS:
+            if extension in variants and encoding in accept_encodings:
+                return variants[extension], encoding, None
+        for extension, _ in IMAGE_VARIANTS:
+            mimetype = f'image/{extension}'
+            # Aceita só quando o navegador anuncia o tipo explicitamente (não via */*)
+            if extension in variants and mimetype in [m for m, _ in accept_mimetypes]:
+                return variants[extension], None, mimetype
+        return path, None, None
+
+
+def main():
+    static_folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = build_assets(static_folder)
+    for name, entry in sorted(manifest['assets'].items()):
+        variants = ', '.join(sorted(entry['variants'])) or '-'
+        print(f"{name} -> {DIST_DIR}/{entry['path']} [{variants}]")
+    print(f"Versão dos assets: {manifest['version']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Verificação de senhas dos admins
+O bcrypt roda em um pool limitado de threads (o bcrypt libera o GIL), com
+limite de fila: em rajadas de login o excedente é recusado na hora. A thread
+da requisição ainda espera o resultado (a thread do gthread fica ocupada
+durante o hash); o pool limita quantos hashes rodam juntos e descarta o
+excesso, não libera o worker. Usuários inexistentes ou inativos fazem o mesmo trabalho
+de um login real, para que o tempo de resposta não revele quais existem.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+class HasherOverloaded(RuntimeError):
+    """Fila de verificação cheia ou tempo esgotado"""
+
+
+def hash_cost(hashed):
+    """Extrai o custo de um hash bcrypt ($2b$12$...); None se não reconhecido"""
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode('ascii', 'replace')
+    parts = hashed.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Hash e verificação bcrypt em um pool limitado, com custo configurável"""
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, max_workers=2, max_pending=8, timeout=10):
+        if not 4 <= rounds <= 31:
+            raise ValueError(f"Custo bcrypt inválido: {rounds}")
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        # Calculado já aqui: gerá-lo no primeiro login de um usuário inexistente
+        # deixaria essa resposta mais lenta que as outras
+        self._dummy_hash = self.hash(os.urandom(16).hex())
+
+    def _get_executor(self):
+        # Threads não sobrevivem a um fork: recria o pool por processo
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='bcrypt')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        """
+        Executa no pool e espera o resultado (bloqueia a thread que chamou).
+        A vaga só é devolvida quando o bcrypt termina de fato: um hash que
+        estourou o timeout continua rodando e ocupando a vaga.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise HasherOverloaded("Fila de verificação de senha cheia")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HasherOverloaded("Tempo esgotado na verificação de senha")
+
+    def hash(self, password):
+        """Gera o hash com o custo configurado (executa na thread atual)"""
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds))
+
+    def hash_async(self, password):
+        return self._run(self.hash, password)
+
+    def verify(self, password, hashed):
+        """Verifica a senha no pool. Levanta HasherOverloaded se não houver vaga."""
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def verify_dummy(self, password):
+        """Mesmo custo de uma verificação real, sempre falso (usuário inexistente/inativo)"""
+        self._run(bcrypt.checkpw, password.encode('utf-8'), self._dummy_hash)
+        return False
+
+    def needs_rehash(self, hashed):
+        """True se o hash foi gerado com um custo diferente do configurado"""
+        return hash_cost(hashed) != self.rounds
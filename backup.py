@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Backup online do banco SQLite
+Usa a API de backup do SQLite, copiando poucas páginas por passo com uma pausa
+entre eles, para que a aplicação continue gravando durante a cópia. Cada
+snapshot é comprimido com gzip e acompanhado de um arquivo .sha256 (formato do
+sha256sum). A restauração confere o checksum e a integridade antes de gravar.
+Pode rodar agendado dentro da aplicação (BACKUP_INTERVAL) ou pela linha de
+comando (python backup.py --help).
+"""
+
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem coordenação entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_RE = re.compile(r'^(?P<prefix>.+)-(?P<stamp>\d{8}T\d{6}Z)(?:-(?P<label>[\w-]+))?\.db\.gz$')
+LOCK_NAME = '.backup.lock'
+PARTIAL_PREFIX = '.parcial-'  # arquivos temporários; sobras de um processo morto são removidas
+
+# Cópias reiniciadas por gravações concorrentes antes de desistir do modo incremental
+MAX_RESTARTS = 3
+
+Snapshot = namedtuple('Snapshot', 'path created_at size label')
+
+
+class BackupError(RuntimeError):
+    """Snapshot corrompido, checksum divergente ou banco inválido"""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _HashingWriter:
+    """Arquivo que calcula o SHA-256 do que é gravado (o .gz final)"""
+
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _check_integrity(path, table='respostas'):
+    """Roda o integrity_check e retorna o total de linhas de `table` no banco em `path`"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            raise BackupError(f"Banco corrompido: {result}")
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        except sqlite3.OperationalError:
+            raise BackupError(f"Banco sem a tabela {table}")
+    finally:
+        conn.close()
+
+
+class BackupManager:
+    """
+    Snapshots comprimidos de um banco SQLite em `directory`, mantendo os
+    `keep` mais recentes. pages/sleep controlam o tamanho de cada passo da
+    cópia e a pausa entre eles. `table` é a tabela contada na verificação.
+    """
+
+    def __init__(self, db_path, directory, keep=7, pages=256, sleep=0.05, prefix='database',
+                 table='respostas'):
+        self.db_path = db_path
+        self.directory = directory
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self.prefix = prefix
+        self.table = table
+
+    def _copy(self, target):
+        """Copia o banco para `target`; retorna o número de reinícios da cópia"""
+        source = sqlite3.connect(self.db_path)
+        dest = sqlite3.connect(target)
+        restarts = 0
+        last_remaining = None
+
+        def progress(status, remaining, total):
+            nonlocal restarts, last_remaining
+            # Uma gravação de outra conexão reinicia a cópia: `remaining` volta a subir
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts >= MAX_RESTARTS:
+                    raise _Restarted()
+            last_remaining = remaining
+
+        try:
+            try:
+                source.backup(dest, pages=self.pages, progress=progress, sleep=self.sleep)
+            except _Restarted:
+                # Escrita contínua: copia em um passo só. Em WAL a leitura não bloqueia
+                # quem grava, só adia o checkpoint até o fim da cópia.
+                logger.warning(f"Backup incremental reiniciado {restarts} vezes; copiando em um passo")
+                source.backup(dest, pages=-1)
+            # O snapshot é um arquivo único, sem -wal/-shm
+            dest.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dest.close()
+            source.close()
+        return restarts
+
+    @contextmanager
+    def lock(self, blocking=True):
+        """
+        flock do diretório de backup, compartilhado entre processos (workers,
+        CLI). Produz False se blocking=False e outro processo tiver o lock.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_NAME), 'a') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+
+    def _remove_partials(self):
+        for name in os.listdir(self.directory):
+            if name.startswith(PARTIAL_PREFIX):
+                os.remove(os.path.join(self.directory, name))
+
+    def create(self, label=None):
+        """Gera um snapshot verificado e aplica a retenção. Retorna o Snapshot."""
+        with self.lock():
+            return self._create(label)
+
+    def _create(self, label=None, prune=True):
+        # Chamado com o lock: nenhum outro backup está em andamento, então os
+        # temporários que existirem são sobras de um processo morto
+        self._remove_partials()
+        now = datetime.now(timezone.utc)
+        name = f"{self.prefix}-{now.strftime('%Y%m%dT%H%M%SZ')}{f'-{label}' if label else ''}.db.gz"
+        path = os.path.join(self.directory, name)
+        start = time.monotonic()
+
+        fd, raw = tempfile.mkstemp(prefix=PARTIAL_PREFIX, suffix='.db', dir=self.directory)
+        os.close(fd)
+        partial = os.path.join(self.directory, PARTIAL_PREFIX + name)
+        try:
+            restarts = self._copy(raw)
+            rows = _check_integrity(raw, self.table)
+            digest = hashlib.sha256()
+            with open(raw, 'rb') as src, open(partial, 'wb') as out:
+                with gzip.GzipFile(filename=name[:-3], mode='wb', fileobj=_HashingWriter(out, digest)) as gz:
+                    shutil.copyfileobj(src, gz, 1024 * 1024)
+                out.flush()
+                os.fsync(out.fileno())
+            with open(path + '.sha256', 'w') as f:
+                f.write(f"{digest.hexdigest()}  {name}\n")
+            os.replace(partial, path)
+        finally:
+            for leftover in (raw, partial):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        size = os.path.getsize(path)
+        logger.info(f"Backup criado: {name} ({size} bytes, {rows} respostas, "
+                    f"{time.monotonic() - start:.1f}s, {restarts} reinícios)")
+        if prune:
+            self.prune()
+        return Snapshot(path, now, size, label)
+
+    def list(self):
+        """Snapshots do diretório, do mais recente para o mais antigo"""
+        snapshots = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return snapshots
+        for name in names:
+            match = SNAPSHOT_RE.match(name)
+            if not match or match['prefix'] != self.prefix:
+                continue
+            path = os.path.join(self.directory, name)
+            created_at = datetime.strptime(match['stamp'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            snapshots.append(Snapshot(path, created_at, os.path.getsize(path), match['label']))
+        snapshots.sort(key=lambda s: (s.created_at, s.path), reverse=True)
+        return snapshots
+
+    def prune(self):
+        """Remove os snapshots além dos `keep` mais recentes; retorna os removidos"""
+        removed = []
+        if not self.keep:
+            return removed
+        for snapshot in self.list()[self.keep:]:
+            for path in (snapshot.path, snapshot.path + '.sha256'):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(snapshot)
+            logger.info(f"Backup removido pela retenção: {os.path.basename(snapshot.path)}")
+        return removed
+
+    def resolve(self, name):
+        """Caminho de um snapshot pelo nome/caminho, ou o mais recente com 'latest'"""
+        if name == 'latest':
+            # A cópia de segurança de uma restauração não conta como a mais recente
+            snapshots = [s for s in self.list() if s.label != 'pre-restore']
+            if not snapshots:
+                raise BackupError(f"Nenhum backup em {self.directory}")
+            return snapshots[0].path
+        if os.path.exists(name):
+            return name
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            raise BackupError(f"Backup não encontrado: {name}")
+        return path
+
+    def verify(self, path):
+        """
+        Confere o checksum, descomprime para um arquivo temporário e roda o
+        integrity_check. Retorna (arquivo temporário, total de respostas);
+        o chamador remove o arquivo.
+        """
+        try:
+            with open(path + '.sha256') as f:
+                expected = f.read().split()[0]
+        except (FileNotFoundError, IndexError):
+            raise BackupError(f"Checksum ausente: {os.path.basename(path)}.sha256")
+        if file_sha256(path) != expected:
+            raise BackupError(f"Checksum divergente: {os.path.basename(path)}")
+
+        fd, raw = tempfile.mkstemp(prefix=PARTIAL_PREFIX, suffix='.db', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as out, gzip.open(path, 'rb') as gz:
+                shutil.copyfileobj(gz, out, 1024 * 1024)
+            return raw, _check_integrity(raw, self.table)
+        except (OSError, EOFError) as e:
+            os.remove(raw)
+            raise BackupError(f"Snapshot ilegível: {e}")
+        except BackupError:
+            os.remove(raw)
+            raise
+
+    def check(self, name):
+        """Verifica um snapshot sem restaurar; retorna o total de respostas"""
+        path = self.resolve(name)
+        with self.lock():
+            raw, rows = self.verify(path)
+            os.remove(raw)
+        return rows
+
+    def restore(self, name, safety_copy=True):
+        """
+        Restaura um snapshot verificado sobre o banco atual. A gravação usa a
+        própria API de backup (no sentido inverso), então as conexões abertas
+        pela aplicação passam a ver o conteúdo restaurado sem corromper o WAL.
+        Antes, guarda uma cópia do estado atual (label pre-restore), sem
+        aplicar a retenção, que poderia remover o próprio snapshot restaurado.
+        Retorna o total de respostas restauradas.
+        """
+        path = self.resolve(name)
+        with self.lock():
+            # A cópia vem antes da descompressão: o _create limpa os temporários
+            if safety_copy and os.path.exists(self.db_path):
+                self._create(label='pre-restore', prune=False)
+            raw, rows = self.verify(path)
+            try:
+                source = sqlite3.connect(raw)
+                dest = sqlite3.connect(self.db_path)
+                try:
+                    # O destino fica com lock de escrita até o fim de qualquer forma: um passo só
+                    source.backup(dest, pages=-1)
+                finally:
+                    dest.close()
+                    source.close()
+            finally:
+                os.remove(raw)
+
+        restored = _check_integrity(self.db_path, self.table)
+        if restored != rows:
+            raise BackupError(f"Restauração divergente: {restored} respostas, esperado {rows}")
+        logger.info(f"Backup restaurado: {os.path.basename(path)} ({rows} respostas)")
+        return rows
+
+
+class BackupScheduler:
+    """
+    Thread que gera um snapshot a cada `interval` segundos. Pode rodar em todos
+    os workers: a cada verificação, só quem conseguir o flock do diretório
+    confere a idade do snapshot mais recente e, se venceu, faz o backup.
+    A thread não sobrevive a um fork: start() a recria no novo processo.
+    """
+
+    def __init__(self, manager, interval, check_interval=60):
+        self.manager = manager
+        self.interval = interval
+        self.check_interval = min(check_interval, interval)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        """Inicia a thread deste processo (idempotente, seguro após fork)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def due(self):
+        snapshots = self.manager.list()
+        if not snapshots:
+            return True
+        age = time.time() - os.path.getmtime(snapshots[0].path)
+        return age >= self.interval
+
+    def run_once(self):
+        """Faz o backup se estiver vencido e o lock estiver livre; retorna o Snapshot ou None"""
+        with self.manager.lock(blocking=False) as acquired:
+            # Confere sob o lock: outro processo pode ter acabado de gerar um
+            if not acquired or not self.due():
+                return None
+            return self.manager._create()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erro no backup agendado: {str(e)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backup online do banco SQLite")
+    parser.add_argument('--db', default=os.environ.get('BACKUP_DATABASE', 'db/database.db'),
+                        help="arquivo do banco")
+    parser.add_argument('--dir', default=os.environ.get('BACKUP_DIR', 'db/backups'),
+                        help="diretório dos snapshots")
+    parser.add_argument('--prefix', default='database',
+                        help="prefixo dos snapshots (ex.: 'arquivo' para db/arquivo.db)")
+    parser.add_argument('--tabela', default='respostas',
+                        help="tabela contada na verificação (respostas_arquivadas no arquivo)")
+    parser.add_argument('--keep', type=int, default=int(os.environ.get('BACKUP_KEEP', 7)),
+                        help="snapshots mantidos (0 mantém todos)")
+    parser.add_argument('--pages', type=int, default=int(os.environ.get('BACKUP_PAGES', 256)),
+                        help="páginas copiadas por passo")
+    parser.add_argument('--sleep', type=float, default=float(os.environ.get('BACKUP_SLEEP', 0.05)),
+                        help="pausa entre os passos, em segundos")
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help="gera um snapshot")
+    create.add_argument('--label', help="sufixo do nome do arquivo")
+    commands.add_parser('list', help="lista os snapshots")
+    verify = commands.add_parser('verify', help="confere checksum e integridade de um snapshot")
+    verify.add_argument('snapshot', nargs='?', default='latest')
+    restore = commands.add_parser('restore', help="restaura um snapshot sobre o banco")
+    restore.add_argument('snapshot', nargs='?', default='latest')
+    restore.add_argument('--sem-copia', action='store_true',
+                         help="não guarda uma cópia do banco atual antes de restaurar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    manager = BackupManager(args.db, args.dir, keep=args.keep, pages=args.pages, sleep=args.sleep,
+                            prefix=args.prefix, table=args.tabela)
+    try:
+        if args.command == 'create':
+            snapshot = manager.create(label=args.label)
+            print(snapshot.path)
+        elif args.command == 'list':
+            for snapshot in manager.list():
+                print(f"{snapshot.created_at:%Y-%m-%d %H:%M:%S} UTC  {snapshot.size:>12}  "
+                      f"{os.path.basename(snapshot.path)}")
+        elif args.command == 'verify':
+            rows = manager.check(args.snapshot)
+            print(f"OK: {rows} respostas")
+        elif args.command == 'restore':
+            rows = manager.restore(args.snapshot, safety_copy=not args.sem_copia)
+            print(f"Restaurado: {rows} respostas")
+    except BackupError as e:
+        sys.exit(f"Erro: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+Benchmark do formulário e do admin, sem acesso à rede
+Gera um banco de respostas sintéticas em um diretório de trabalho e mede
+/enviar (com e sem imagem), /admin/dashboard (paginado e com busca) e
+/admin/resposta/<id>, pelo test client do Flask ou contra um gunicorn local.
+O resultado é um JSON com vazão e latências p50/p95/p99 por cenário.
+
+    python benchmark.py --rows 100000 --requests 500 --output atual.json
+    python benchmark.py --mode gunicorn --workers 4 --concurrency 16 --env SQLITE_SYNCHRONOUS=FULL
+    python benchmark.py --rows 100000 --compare base.json --output atual.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from validation import RESPOSTA_SCHEMA
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = ('enviar', 'enviar_imagem', 'dashboard', 'dashboard_busca', 'resposta')
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Iara', 'João',
+         'Karina', 'Lucas', 'Marina', 'Nicolas', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vitória')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+              'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Araújo', 'Melo')
+CIDADES = (('Porto Alegre', 'RS'), ('Caxias do Sul', 'RS'), ('Pelotas', 'RS'), ('Florianópolis', 'SC'),
+           ('Joinville', 'SC'), ('Blumenau', 'SC'), ('Curitiba', 'PR'), ('Londrina', 'PR'),
+           ('Maringá', 'PR'), ('São Paulo', 'SP'))
+MOVIMENTOS = ('Sindical', 'Estudantil', 'Comunitário', 'Cooperativista', '')
+SINDICATOS = ('Metalúrgicos', 'Bancários', 'Professores', 'Comerciários', 'Trabalhadores em TI', '')
+CATEGORIAS = ('Desenvolvimento', 'Infraestrutura', 'Dados', 'Suporte', 'Design', 'Gestão')
+EMPRESAS = ('Cooperativa Sul', 'Tecnosinos', 'Prefeitura', 'Startup X', 'Banco Regional', 'Autônomo')
+CURSOS = ('Ciência da Computação', 'Sistemas de Informação', 'Engenharia', 'Análise de Sistemas', '')
+
+
+def synthetic_row(rng, index, start):
+    nome, sobrenome = rng.choice(NOMES), rng.choice(SOBRENOMES)
+    cidade, uf = rng.choice(CIDADES)
+    estuda = rng.random() < 0.3
+    created_at = start + timedelta(seconds=index * 37 + rng.randrange(37))
+    row = {
+        'nome': nome,
+        'sobrenome': sobrenome,
+        'email': f"{nome.lower()}.{sobrenome.lower()}{index}@exemplo.com.br",
+        'telefone': f"{rng.randrange(11, 99)}9{rng.randrange(10000000, 99999999)}",
+        'cidade': cidade,
+        'uf': uf,
+        'movimento': rng.choice(MOVIMENTOS),
+        'sindicato': rng.choice(SINDICATOS),
+        'categoria': rng.choice(CATEGORIAS),
+        'empresa': rng.choice(EMPRESAS),
+        'estuda': estuda,
+        'curso': rng.choice(CURSOS) if estuda else '',
+        'instituicao': 'Universidade Federal' if estuda else '',
+        'mensagem': 'Quero participar das atividades do coletivo. ' * rng.randrange(0, 4),
+        'imagem': '',
+        'ip_address': f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    row['email_norm'] = row['email'].lower()
+    row['telefone_norm'] = row['telefone']
+    row['duplicata_de'] = None
+    return row
+
+
+def synthetic_png(rng, size=64):
+    """PNG válido (tons de cinza) com pixels aleatórios"""
+    raw = b''.join(b'\x00' + rng.randbytes(size) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def generate_dataset(db_path, rows, seed, batch_size=10000):
+    """Completa o banco até `rows` respostas (reaproveita o que já existir)"""
+    from respostas import insert_respostas
+    from ingest import FLUSH_COLUMNS
+
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+    rng = random.Random(seed + existing)
+    start = datetime(2024, 1, 1)
+    started = time.perf_counter()
+    for first in range(existing, rows, batch_size):
+        batch = [synthetic_row(rng, i, start) for i in range(first, min(first + batch_size, rows))]
+        with conn:
+            insert_respostas(conn, [tuple(row[c] for c in FLUSH_COLUMNS) for row in batch], FLUSH_COLUMNS)
+        print(f"  {first + len(batch)}/{rows} respostas", file=sys.stderr)
+    conn.close()
+    return {'existing': existing, 'generated': max(rows - existing, 0),
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def percentile(ordered, fraction):
+    """Percentil pelo método nearest-rank sobre uma lista ordenada"""
+    if not ordered:
+        return None
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(latencies, errors, wall):
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'seconds': round(wall, 3),
+        'rps': round(len(ordered) / wall, 2) if wall else None,
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+def build_requests(scenario, count, rows, rng):
+    """Lista de (método, caminho, campos, arquivos) do cenário"""
+    requests = []
+    for i in range(count):
+        if scenario in ('enviar', 'enviar_imagem'):
+            fields = synthetic_row(rng, rows + i, datetime.now())
+            fields = {k: ('sim' if v is True else '' if v is False else v)
+                      for k, v in fields.items() if k in RESPOSTA_SCHEMA.names}
+            files = {'imagem': ('foto.png', synthetic_png(rng))} if scenario == 'enviar_imagem' else {}
+            requests.append(('POST', '/enviar', fields, files))
+        elif scenario == 'dashboard':
+            last_page = max((rows + 19) // 20, 1)
+            page = rng.choice((1, 2, 3, rng.randrange(1, last_page + 1), last_page))
+            requests.append(('GET', f'/admin/dashboard?page={page}', None, None))
+        elif scenario == 'dashboard_busca':
+            term = rng.choice(NOMES + SOBRENOMES + tuple(c for c, _ in CIDADES))
+            requests.append(('GET', f'/admin/dashboard?search={urllib.parse.quote(term)}', None, None))
+        elif scenario == 'resposta':
+            requests.append(('GET', f'/admin/resposta/{rng.randrange(1, max(rows, 1) + 1)}', None, None))
+    return requests
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                     f'{value}\r\n'.encode('utf-8'))
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode('utf-8')
+                     + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class TestClientDriver:
+    """Executa as requisições no próprio processo, sem servidor HTTP"""
+
+    def __init__(self, app, username, password):
+        self.client = app.test_client()
+        response = self.client.post('/admin/login', data={'username': username, 'password': password})
+        if response.status_code != 302:
+            raise RuntimeError("Falha no login do admin para o benchmark")
+
+    def run(self, requests, concurrency):
+        import io
+
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for i, (method, path, fields, files) in enumerate(requests):
+            data = dict(fields or {})
+            for name, (filename, content) in (files or {}).items():
+                data[name] = (io.BytesIO(content), filename)
+            begin = time.perf_counter()
+            response = self.client.open(path, method=method, data=data or None,
+                                        environ_base={'REMOTE_ADDR': f'10.0.{i // 250 % 256}.{i % 250 + 1}'})
+            response.close()
+            latencies.append(time.perf_counter() - begin)
+            errors += response.status_code >= 400
+        return latencies, errors, time.perf_counter() - started
+
+    def close(self):
+        pass
+
+
+class GunicornDriver:
+    """Sobe um gunicorn local e dispara as requisições por HTTP com várias threads"""
+
+    def __init__(self, env, workdir, workers, threads, username, password):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        # Usa o gunicorn.conf.py do repositório; workers e threads vêm da linha de comando
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'),
+                   '--chdir', workdir, '--pythonpath', REPO_DIR,
+                   '-w', str(workers), '--threads', str(threads), '-b', f'127.0.0.1:{port}',
+                   '--log-level', 'warning', 'app:app']
+        self.process = subprocess.Popen(command, env=env)
+        self._wait_ready()
+        body = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+        opener = urllib.request.build_opener(_NoRedirect)
+        try:
+            response = opener.open(self.base_url + '/admin/login', body)
+        except urllib.error.HTTPError as e:
+            response = e
+        cookie = response.headers.get('Set-Cookie', '')
+        if response.getcode() != 302 or not cookie:
+            self.close()
+            raise RuntimeError("Falha no login do admin para o benchmark")
+        self.cookie = cookie.split(';', 1)[0]
+
+    def _wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("gunicorn encerrou durante a inicialização")
+            try:
+                urllib.request.urlopen(self.base_url + '/', timeout=1).close()
+                return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError("gunicorn não respondeu a tempo")
+
+    def _request(self, item):
+        method, path, fields, files = item
+        headers = {'Cookie': self.cookie}
+        body = None
+        if fields is not None:
+            body, headers['Content-Type'] = encode_multipart(fields, files or {})
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        begin = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 599
+        return time.perf_counter() - begin, status
+
+    def run(self, requests, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(self._request, requests))
+        wall = time.perf_counter() - started
+        return [r[0] for r in results], sum(1 for r in results if r[1] >= 400), wall
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def compare(baseline, current, tolerance):
+    """Lista de regressões de p95 ou vazão acima da tolerância (fração)"""
+    regressions = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not result['requests']:
+            continue
+        if before.get('p95_ms') and result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if before.get('rps') and result['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: vazão {before['rps']} -> {result['rps']} req/s")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do formulário e do admin")
+    parser.add_argument('--rows', type=int, default=10000, help="respostas no banco sintético")
+    parser.add_argument('--requests', type=int, default=200, help="requisições por cenário")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"lista separada por vírgula ({', '.join(SCENARIOS)})")
+    parser.add_argument('--mode', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--workers', type=int, default=4, help="workers do gunicorn")
+    parser.add_argument('--threads', type=int, default=1, help="threads por worker do gunicorn")
+    parser.add_argument('--concurrency', type=int, default=8, help="requisições simultâneas (gunicorn)")
+    parser.add_argument('--workdir', help="diretório do banco sintético (reaproveitado entre execuções)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--env', action='append', default=[], metavar='CHAVE=VALOR',
+                        help="variável de ambiente da aplicação (ex.: SQLITE_SYNCHRONOUS=FULL)")
+    parser.add_argument('--output', help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument('--compare', help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="folga aceita na comparação")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Cenários desconhecidos: {', '.join(sorted(unknown))}")
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='centrosul-bench-'))
+    os.makedirs(workdir, exist_ok=True)
+    env = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'INGEST_SPOOL_PATH': os.path.join(workdir, 'fila.db'),
+        'PAGE_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'METRICS_DIR': os.path.join(workdir, 'metrics'),
+        'SHARED_STATE_URL': f"sqlite:///{os.path.join(workdir, 'estado.db')}",
+        'LOG_FILE': os.path.join(workdir, 'app.log'),
+        'RATELIMIT_ENABLED': '0',
+        'BCRYPT_ROUNDS': '4',
+    }
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    os.environ.update(env)
+
+    # A aplicação grava uploads em caminhos relativos: roda dentro do diretório de trabalho
+    cwd = os.getcwd()
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+    print(f"Preparando banco sintético em {workdir}", file=sys.stderr)
+    from app import app  # a importação cria as tabelas, índices e o admin padrão
+    dataset = generate_dataset(os.path.join(workdir, 'bench.db'), args.rows, args.seed)
+
+    if args.mode == 'gunicorn':
+        driver = GunicornDriver(dict(os.environ), workdir, args.workers, args.threads, 'admin', 'admin123')
+    else:
+        driver = TestClientDriver(app, 'admin', 'admin123')
+
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        for scenario in scenarios:
+            requests = build_requests(scenario, args.requests, args.rows, rng)
+            driver.run(requests[:max(len(requests) // 10, 1)], args.concurrency)  # aquecimento
+            latencies, errors, wall = driver.run(requests, args.concurrency)
+            results[scenario] = summarize(latencies, errors, wall)
+            print(f"  {scenario}: {results[scenario]['rps']} req/s, "
+                  f"p95 {results[scenario]['p95_ms']}ms, erros {errors}", file=sys.stderr)
+    finally:
+        driver.close()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'mode': args.mode,
+            'rows': args.rows,
+            'requests_per_scenario': args.requests,
+            'workers': args.workers if args.mode == 'gunicorn' else None,
+            'threads': args.threads if args.mode == 'gunicorn' else None,
+            'concurrency': args.concurrency if args.mode == 'gunicorn' else 1,
+            'env': {k: v for k, v in env.items() if k not in ('DATABASE_URL', 'INGEST_SPOOL_PATH',
+                                                              'PAGE_CACHE_DIR', 'METRICS_DIR', 'LOG_FILE',
+                                                              'SHARED_STATE_URL')},
+            'dataset': dataset,
+        },
+        'scenarios': results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(os.path.join(cwd, args.output), 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(os.path.join(cwd, args.compare)) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSÃO {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
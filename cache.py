@@ -0,0 +1,160 @@
+"""
+Cache de respostas renderizadas (página pública)
+Cada entrada é imutável para uma versão de deploy, então uma cópia local em
+memória fica na frente do backend compartilhado (arquivo ou Redis).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+try:
+    import redis
+except ImportError:  # redis só é necessário com PAGE_CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CachedPage = namedtuple('CachedPage', 'body etag mimetype')
+
+
+class FileBackend:
+    """Arquivos em um diretório local, compartilhados entre os workers"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        fd, temp_path = tempfile.mkstemp(prefix='.cache-', dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.replace(temp_path, self._path(key))
+
+
+class RedisBackend:
+    """Redis apontado por REDIS_URL, compartilhado entre workers e instâncias"""
+
+    def __init__(self, url, ttl=7 * 24 * 3600):
+        if redis is None:
+            raise RuntimeError("Pacote redis não instalado")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value):
+        self.client.set(key, value, ex=self.ttl)
+
+
+class SharedStateBackend:
+    """Estado compartilhado da aplicação (shared_state.py): Redis ou SQLite local"""
+
+    def __init__(self, state, ttl=7 * 24 * 3600):
+        self.state = state
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.state.get(key)
+
+    def set(self, key, value):
+        self.state.set(key, value, ttl=self.ttl)
+
+
+def _serialize(page):
+    header = json.dumps({'etag': page.etag, 'mimetype': page.mimetype}).encode('utf-8')
+    return header + b'\n' + page.body
+
+
+def _deserialize(data):
+    header, _, body = data.partition(b'\n')
+    meta = json.loads(header)
+    return CachedPage(body, meta['etag'], meta['mimetype'])
+
+
+class ResponseCache:
+    """
+    Cache de páginas com ETag forte, chaveado por nome e versão do deploy.
+    Sem backend (modo 'memory') cada worker renderiza a página uma única vez.
+    """
+
+    def __init__(self, backend, version):
+        self.backend = backend
+        self.version = version
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def key(self, name):
+        return f"page:{name}:{self.version}"
+
+    def get_or_render(self, name, render, mimetype='text/html; charset=utf-8'):
+        key = self.key(name)
+        page = self._local.get(key)
+        if page is not None:
+            return page
+
+        data = None
+        if self.backend is not None:
+            try:
+                data = self.backend.get(key)
+            except Exception as e:
+                # Cache compartilhado indisponível não pode derrubar a página
+                logger.warning(f"Cache de páginas indisponível: {str(e)}")
+        if data is not None:
+            page = _deserialize(data)
+        else:
+            body = render().encode('utf-8')
+            page = CachedPage(body, hashlib.sha256(body).hexdigest()[:32], mimetype)
+            if self.backend is not None:
+                try:
+                    self.backend.set(key, _serialize(page))
+                except Exception as e:
+                    logger.warning(f"Cache de páginas indisponível: {str(e)}")
+
+        with self._lock:
+            self._local[key] = page
+        return page
+
+
+def deploy_version(template_folder, extra=''):
+    """Versão do deploy: DEPLOY_VERSION ou hash dos templates + versão dos assets"""
+    configured = os.environ.get('DEPLOY_VERSION')
+    if configured:
+        return configured
+    digest = hashlib.sha256(extra.encode('utf-8'))
+    for root, dirs, files in os.walk(template_folder):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, template_folder).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def create_backend(kind, redis_url=None, directory='db/cache', state=None):
+    """Backend compartilhado do cache; None significa só memória do processo"""
+    if kind == 'memory':
+        return None
+    if kind == 'shared':
+        return SharedStateBackend(state)
+    if kind == 'file':
+        return FileBackend(directory)
+    if kind == 'redis':
+        return RedisBackend(redis_url)
+    raise ValueError(f"Backend de cache inválido: {kind}")
@@ -0,0 +1,130 @@
+"""
+Camada de conexão com o banco de dados
+Mantém uma conexão reutilizável por thread/worker, configurada uma única vez
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+DEFAULT_DATABASE_URL = "sqlite:///db/database.db"
+
+
+def sqlite_path(url):
+    """Extrai o caminho do arquivo de uma URL sqlite:///caminho"""
+    parsed = urlparse(url)
+    # sqlite:///db/database.db -> db/database.db | sqlite:////abs/db -> /abs/db
+    return parsed.path[1:] if parsed.path.startswith('/') else parsed.path
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que informa a duração de cada consulta aos observadores da conexão"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.notify(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.notify(sql, time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Conexão cujos cursores são TimedCursor"""
+
+    observers = ()
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TimedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def notify(self, sql, seconds):
+        for observer in self.observers:
+            observer(sql, seconds)
+
+
+def connect_sqlite(url, options):
+    """Abre uma conexão SQLite com WAL e pragmas ajustados"""
+    conn = sqlite3.connect(
+        sqlite_path(url),
+        timeout=options['busy_timeout'] / 1000,
+        cached_statements=options['cached_statements'],
+        factory=TimedConnection,
+    )
+    # WAL permite leituras do dashboard enquanto /enviar escreve
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={int(options['busy_timeout'])}")
+    conn.execute(f"PRAGMA synchronous={options['synchronous']}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+# Backends suportados, indexados pelo esquema da DATABASE_URL.
+# Um banco servidor pode ser adicionado registrando uma nova função aqui.
+BACKENDS = {
+    'sqlite': connect_sqlite,
+}
+
+
+class Database:
+    """Gerencia as conexões de um worker (uma por thread, recriada após fork)"""
+
+    def __init__(self, url=DEFAULT_DATABASE_URL, busy_timeout=5000,
+                 synchronous='NORMAL', cached_statements=256):
+        scheme = urlparse(url).scheme
+        if scheme not in BACKENDS:
+            raise ValueError(f"Banco de dados não suportado: {scheme}")
+        if str(synchronous).upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError(f"Valor inválido para synchronous: {synchronous}")
+        self.url = url
+        self.scheme = scheme
+        self.options = {
+            'busy_timeout': int(busy_timeout),
+            'synchronous': str(synchronous).upper(),
+            'cached_statements': int(cached_statements),
+        }
+        self._local = threading.local()
+        # Funções (sql, segundos) chamadas após cada consulta, ex.: métricas
+        self.query_observers = []
+
+    @property
+    def path(self):
+        """Caminho do arquivo quando o backend é SQLite"""
+        return sqlite_path(self.url) if self.scheme == 'sqlite' else None
+
+    def connect(self):
+        """Abre uma conexão nova e dedicada (o chamador deve fechá-la)"""
+        conn = BACKENDS[self.scheme](self.url, self.options)
+        if isinstance(conn, TimedConnection):
+            conn.observers = self.query_observers
+        return conn
+
+    def get_connection(self):
+        """Retorna a conexão reutilizável da thread atual"""
+        conn = getattr(self._local, 'conn', None)
+        # Conexões não sobrevivem a um fork: reabre se o PID mudou
+        if conn is None or self._local.pid != os.getpid():
+            conn = self.connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        """Fecha a conexão da thread atual, se existir"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
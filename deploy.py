@@ -80,6 +80,17 @@ def git_push():
     log("Git push realizado com sucesso!")
     return True
 
+def check_migrations():
+    """Confere se as migrações carregam e mostra o que está pendente no banco local"""
+    log("Verificando migrações do banco...")
+    success, stdout, stderr = run_command(f"{sys.executable} migrations.py --dry-run")
+    if not success:
+        log(f"Erro nas migrações: {stderr.strip() or stdout.strip()}")
+        return False
+    for line in stdout.strip().splitlines():
+        log(f"  {line}")
+    return True
+
 def trigger_coolify_deploy():
     """Triggera deploy no Coolify via API"""
     if not COOLIFY_API_TOKEN:
@@ -175,6 +186,11 @@ def main():
         log("ERRO: Não é um repositório git. Execute o script na raiz do projeto.")
         sys.exit(1)
     
+    # 0. Migrações: o container aplica as de esquema ao iniciar (DB_MIGRATE_ON_STARTUP)
+    if not check_migrations():
+        log("ERRO: Corrija as migrações antes do deploy")
+        sys.exit(1)
+    
     # 1. Git push
     if not git_push():
         log("ERRO: Falha no git push")
@@ -192,6 +208,7 @@ def main():
     
     log("=== DEPLOY CONCLUÍDO ===")
     log("Aguarde alguns minutos para o deploy ser processado no Coolify")
+    log("Backfills de migrações (se houver) rodam no container: flask --app app db-migrate")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
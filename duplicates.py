@@ -0,0 +1,130 @@
+"""
+Detecção de respostas duplicadas
+Cada resposta guarda chaves normalizadas e indexadas (email em minúsculas e
+telefone só com dígitos), e a checagem no envio é uma busca por índice.
+Com a política 'flag', a repetição é gravada e aponta para a original em
+duplicata_de; 'merge' atualiza a original; 'reject' recusa o envio.
+"""
+
+from validation import NON_DIGITS_RE
+
+POLICIES = ('flag', 'merge', 'reject')
+
+
+def normalize_email(email):
+    return (email or '').strip().lower() or None
+
+
+def normalize_phone(telefone):
+    """Só dígitos, como o telefone_limpo do formulário; None se vazio"""
+    return NON_DIGITS_RE.sub('', telefone or '') or None
+
+
+def init_duplicates(conn):
+    """
+    Garante as colunas e índices de duplicidade (bancos antigos ganham as
+    colunas vazias). Retorna True se as colunas foram criadas agora.
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(respostas)")}
+    added = False
+    for column, kind in (('email_norm', 'TEXT'), ('telefone_norm', 'TEXT'), ('duplicata_de', 'INTEGER')):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE respostas ADD COLUMN {column} {kind}")
+            added = True
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_email_norm ON respostas (email_norm)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_telefone_norm ON respostas (telefone_norm)")
+    # Parcial: só as duplicatas entram no índice (agrupamento e contagem do admin)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_respostas_duplicata_de
+        ON respostas (duplicata_de) WHERE duplicata_de IS NOT NULL
+    """)
+    return added
+
+
+def find_duplicate(conn, email_norm, telefone_norm, before_id=None):
+    """
+    Id da resposta original com o mesmo email ou telefone (a mais antiga do
+    grupo), ou None. Cada lado da busca usa o seu índice.
+    """
+    limit = before_id if before_id is not None else -1
+    row = conn.execute("""
+        SELECT COALESCE(duplicata_de, id) FROM respostas
+        WHERE id = (
+            SELECT MIN(id) FROM (
+                SELECT id FROM respostas WHERE email_norm = ?1
+                UNION ALL
+                SELECT id FROM respostas WHERE telefone_norm = ?2
+            ) WHERE ?3 < 0 OR id < ?3
+        )
+    """, (email_norm, telefone_norm, limit)).fetchone()
+    return row[0] if row else None
+
+
+def count_duplicates(conn):
+    return conn.execute(
+        "SELECT COUNT(*) FROM respostas WHERE duplicata_de IS NOT NULL"
+    ).fetchone()[0]
+
+
+def backfill_chunk(conn, after_id=0, batch_size=5000):
+    """
+    Preenche as chaves normalizadas e duplicata_de de até `batch_size`
+    respostas antigas (email_norm vazio) com id > after_id, em ordem de id,
+    sem commit. Retorna (último id, processadas, duplicatas).
+    """
+    rows = conn.execute("""
+        SELECT id, email, telefone FROM respostas
+        WHERE email_norm IS NULL AND id > ? ORDER BY id LIMIT ?
+    """, (after_id, batch_size)).fetchall()
+    flagged = 0
+    for row_id, email, telefone in rows:
+        email_norm, telefone_norm = normalize_email(email), normalize_phone(telefone)
+        original = find_duplicate(conn, email_norm, telefone_norm, before_id=row_id)
+        conn.execute(
+            "UPDATE respostas SET email_norm = ?, telefone_norm = ?, duplicata_de = ? WHERE id = ?",
+            (email_norm, telefone_norm, original, row_id)
+        )
+        flagged += original is not None
+    return (rows[-1][0] if rows else after_id), len(rows), flagged
+
+
+def backfill_duplicates(conn, batch_size=5000, progress=None):
+    """
+    Executa backfill_chunk em lotes com commit até não restar resposta
+    sem chaves. Pode ser interrompido e executado de novo.
+    Retorna (processadas, duplicatas).
+    """
+    processed = flagged = 0
+    last_id = 0
+    while True:
+        with conn:
+            last_id, count, dups = backfill_chunk(conn, last_id, batch_size)
+        if not count:
+            return processed, flagged
+        processed += count
+        flagged += dups
+        if progress:
+            progress(processed, flagged)
+
+
+def duplicate_groups(conn, limit, offset=0):
+    """
+    Grupos de prováveis duplicatas, do mais recente para o mais antigo:
+    (id, nome, sobrenome, email, telefone, created_at, quantidade, ids, última)
+    """
+    return conn.execute("""
+        SELECT o.id, o.nome, o.sobrenome, o.email, o.telefone, o.created_at,
+               COUNT(d.id), GROUP_CONCAT(d.id), MAX(d.created_at)
+        FROM respostas d
+        JOIN respostas o ON o.id = d.duplicata_de
+        WHERE d.duplicata_de IS NOT NULL
+        GROUP BY d.duplicata_de
+        ORDER BY MAX(d.id) DESC
+        LIMIT ? OFFSET ?
+    """, (limit, offset)).fetchall()
+
+
+def count_groups(conn):
+    return conn.execute("""
+        SELECT COUNT(DISTINCT duplicata_de) FROM respostas WHERE duplicata_de IS NOT NULL
+    """).fetchone()[0]
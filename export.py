@@ -0,0 +1,194 @@
+"""
+Exportação em streaming das respostas (CSV, NDJSON e XLSX)
+Os geradores leem o cursor em lotes com fetchmany e emitem cada lote assim
+que fica pronto, então a memória não cresce com o tamanho da exportação.
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+EXPORT_COLUMNS = (
+    'id', 'nome', 'sobrenome', 'email', 'telefone', 'cidade', 'uf',
+    'movimento', 'sindicato', 'categoria', 'empresa',
+    'estuda', 'curso', 'instituicao', 'mensagem', 'imagem', 'ip_address', 'created_at',
+)
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+FETCH_SIZE = 1000
+
+# Caracteres que fazem planilhas interpretarem a célula como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Caracteres de controle proibidos em XML 1.0
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def build_export_query(conditions, params, columns=EXPORT_COLUMNS):
+    """Monta o SELECT da exportação a partir das condições já filtradas"""
+    sql = f"SELECT {', '.join(columns)} FROM respostas"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    # Ordem coberta pelo índice (created_at, id): sem ordenação em memória
+    return sql + " ORDER BY created_at, id", params
+
+
+def iter_batches(cursor, size=FETCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _safe_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(cursor, columns=EXPORT_COLUMNS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para o Excel reconhecer UTF-8 (acentos)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for rows in iter_batches(cursor):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_safe_cell(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(cursor, columns=EXPORT_COLUMNS):
+    for rows in iter_batches(cursor):
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+        ).encode('utf-8')
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Arquivo só de escrita e não posicionável: o zipfile grava em streaming"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="respostas" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(INVALID_XML_RE.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(v) for v in values) + '</row>'
+
+
+def xlsx_chunks(cursor, columns=EXPORT_COLUMNS):
+    """Gera um .xlsx mínimo (strings inline) sem bibliotecas externas"""
+    out = _ChunkWriter()
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        yield out.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(columns)
+            ).encode('utf-8'))
+            for rows in iter_batches(cursor):
+                sheet.write(''.join(_xlsx_row(row) for row in rows).encode('utf-8'))
+                yield out.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield out.drain()
+
+
+WRITERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+    'xlsx': xlsx_chunks,
+}
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime o fluxo em gzip, liberando cada bloco assim que é gerado"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(conn, fmt, sql, params):
+    """Executa a consulta e gera os bytes do formato pedido; fecha a conexão ao final"""
+    try:
+        cursor = conn.execute(sql, params)
+        yield from WRITERS[fmt](cursor)
+    finally:
+        conn.close()
@@ -0,0 +1,87 @@
+"""
+Configuração do Gunicorn (gunicorn -c gunicorn.conf.py app:app)
+Workers gthread por padrão: cada worker atende várias conexões em threads, então
+um cliente lento enviando uma imagem grande ocupa uma thread, não o worker todo.
+Com preload_app, a aplicação (e o init_db: DDL, admin padrão, hash do bcrypt) é
+criada uma única vez no master; os workers herdam tudo pelo fork.
+"""
+
+import multiprocessing
+import os
+import sys
+
+from metrics import DEFAULT_DIRECTORY as METRICS_DIRECTORY, clear_directory, mark_process_dead
+
+cpus = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5001')}")
+
+# 'gthread' (padrão) ou 'gevent' (exige o pacote gevent instalado)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    try:
+        from gevent import monkey
+    except ImportError:
+        print("gevent não instalado; usando workers gthread", file=sys.stderr)
+        worker_class = 'gthread'
+    else:
+        # Antes de importar a aplicação no master (preload), senão os locks não são cooperativos
+        monkey.patch_all()
+elif worker_class not in ('gthread', 'sync'):
+    raise ValueError(f"GUNICORN_WORKER_CLASS inválido: {worker_class}")
+
+# WEB_CONCURRENCY é a variável usual das plataformas de deploy
+workers = int(os.environ.get('WEB_CONCURRENCY', os.environ.get('GUNICORN_WORKERS', cpus * 2 + 1)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))  # só gevent
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Uploads de até 16MB em conexões lentas: o timeout conta o tempo sem resposta do worker
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recicla os workers de tempos em tempos (jitter evita reiniciar todos juntos)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+metrics_dir = os.environ.get('METRICS_DIR', METRICS_DIRECTORY)
+
+
+def on_starting(server):
+    """Descarta as métricas de execuções anteriores do serviço"""
+    if os.path.isdir(metrics_dir):
+        clear_directory(metrics_dir)
+
+
+def child_exit(server, worker):
+    """Incorpora as métricas do worker encerrado (reciclado ou morto) ao arquivo dos encerrados"""
+    try:
+        mark_process_dead(worker.pid, metrics_dir)
+    except OSError as e:
+        server.log.warning(f"Métricas do worker {worker.pid} não incorporadas: {e}")
+
+
+def when_ready(server):
+    """
+    Chamado no master antes de criar os workers. Com preload_app, libera o que
+    o create_app abriu no master e não pode ser herdado pelo fork.
+    """
+    if not server.cfg.preload_app:
+        return
+    app = server.app.wsgi()
+    ingest_queue = app.extensions.get('ingest_queue')
+    if ingest_queue is not None:
+        # Grava o que havia no spool; os workers iniciam as próprias threads
+        ingest_queue.stop()
+    # Uma conexão SQLite não pode ser usada dos dois lados de um fork (os workers
+    # abrem as suas no primeiro uso, assim como pools de threads, métricas e logs)
+    app.extensions['database'].close()
+    server.log.info(f"Aplicação carregada no master; {server.cfg.workers} workers "
+                    f"{server.cfg.worker_class_str} x {server.cfg.threads} threads")
+
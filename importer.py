@@ -0,0 +1,447 @@
+"""
+Importação em lote de respostas a partir de planilhas (CSV e XLSX)
+Lê o arquivo em streaming, valida cada linha com o mesmo esquema do /enviar e
+grava em lotes grandes (executemany) dentro de uma transação por lote.
+O progresso fica na tabela importacoes, junto com o lote: uma importação
+interrompida continua de onde parou quando o mesmo arquivo é enviado de novo.
+Linhas inválidas não interrompem a importação; vão para importacao_erros.
+"""
+
+import csv
+import hashlib
+import os
+import re
+import unicodedata
+import zipfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+from duplicates import find_duplicate, normalize_email, normalize_phone
+from export import FORMULA_PREFIXES
+from respostas import INSERT_COLUMNS, insert_respostas, merge_resposta
+from validation import RESPOSTA_SCHEMA, ValidationError
+
+IMPORT_COLUMNS = INSERT_COLUMNS + ('created_at',)
+
+EXTENSIONS = ('csv', 'xlsx')
+
+# retomada: continuou uma execução interrompida; anterior: arquivo já importado, nada foi feito
+ImportResult = namedtuple('ImportResult', 'id status linhas importadas erros retomada anterior')
+
+# Cabeçalhos alternativos comuns nas planilhas -> campo do formulário
+HEADER_ALIASES = {
+    'e_mail': 'email',
+    'whatsapp': 'telefone',
+    'celular': 'telefone',
+    'fone': 'telefone',
+    'estado': 'uf',
+    'area': 'categoria',
+    'area_de_trabalho': 'categoria',
+    'area_tecnologia': 'categoria',
+    'data': 'created_at',
+    'data_de_cadastro': 'created_at',
+}
+
+TRUE_VALUES = frozenset(('sim', 's', 'yes', 'y', 'true', 'verdadeiro', '1', 'x'))
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+EXCEL_EPOCH = datetime(1899, 12, 30)
+ISO_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?$')
+BR_DATE_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})(?: (\d{2}):(\d{2})(?::(\d{2}))?)?$')
+
+
+class ImportFileError(ValueError):
+    """Arquivo de importação ilegível ou sem as colunas obrigatórias"""
+
+
+def init_imports(conn):
+    """Cria as tabelas de controle das importações"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS importacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            arquivo TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'em_andamento',
+            linhas INTEGER NOT NULL DEFAULT 0,
+            importadas INTEGER NOT NULL DEFAULT 0,
+            erros INTEGER NOT NULL DEFAULT 0,
+            usuario TEXT,
+            iniciado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_importacoes_sha256 ON importacoes (sha256)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS importacao_erros (
+            importacao_id INTEGER NOT NULL REFERENCES importacoes (id),
+            linha INTEGER NOT NULL,
+            campo TEXT,
+            erro TEXT NOT NULL,
+            PRIMARY KEY (importacao_id, linha)
+        ) WITHOUT ROWID;
+    """)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_header(name):
+    """'E-mail ' -> 'e_mail', 'Área de Trabalho' -> 'area_de_trabalho', com aliases"""
+    text = unicodedata.normalize('NFKD', str(name or '')).encode('ascii', 'ignore').decode('ascii')
+    key = '_'.join(''.join(c if c.isalnum() else ' ' for c in text.lower()).split())
+    return HEADER_ALIASES.get(key, key)
+
+
+def _clean_cell(value):
+    if value is None:
+        return ''
+    value = str(value).strip()
+    # Desfaz o escape de fórmulas da exportação ('=... -> =...)
+    if value.startswith("'") and value[1:2] and value[1] in FORMULA_PREFIXES:
+        return value[1:]
+    return value
+
+
+# --- Leitores -------------------------------------------------------------
+
+def _csv_encoding(path):
+    """UTF-8, ou Windows-1252 (CSV salvo pelo Excel em português) se o início não for UTF-8"""
+    with open(path, 'rb') as f:
+        sample = f.read(64 * 1024)
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Erro só nos últimos bytes pode ser um caractere cortado pela amostra
+        if e.start < len(sample) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def iter_csv(path):
+    """Linhas do CSV como listas (separador ',' ou ';' detectado no início do arquivo)"""
+    with open(path, newline='', encoding=_csv_encoding(path)) as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _column_index(ref):
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+
+def _xlsx_first_sheet(archive):
+    """Caminho da primeira planilha segundo o workbook.xml (padrão: sheet1.xml)"""
+    try:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        sheet = workbook.find(f'{XLSX_NS}sheets/{XLSX_NS}sheet')
+        rel_id = sheet.get(f'{XLSX_REL_NS}id')
+        rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels.iter(f'{PACKAGE_REL_NS}Relationship'):
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target').lstrip('/')
+                return target if target.startswith('xl/') else 'xl/' + target
+    except (KeyError, AttributeError, ElementTree.ParseError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _xlsx_shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, elem in ElementTree.iterparse(f):
+            if elem.tag == f'{XLSX_NS}si':
+                # Texto simples (<t>) ou formatado (<r><t>); ignora a leitura fonética (<rPh>)
+                text = elem.find(f'{XLSX_NS}t')
+                if text is not None:
+                    strings.append(text.text or '')
+                else:
+                    strings.append(''.join(t.text or '' for t in elem.findall(f'{XLSX_NS}r/{XLSX_NS}t')))
+                elem.clear()
+    return strings
+
+
+def iter_xlsx(path):
+    """Linhas da primeira planilha, lidas com iterparse (uma linha por vez na memória)"""
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ImportFileError(f"Arquivo XLSX inválido: {e}")
+    with archive:
+        strings = _xlsx_shared_strings(archive)
+        sheet = _xlsx_first_sheet(archive)
+        if sheet not in archive.namelist():
+            raise ImportFileError("Arquivo XLSX sem planilha")
+        with archive.open(sheet) as f:
+            for _, elem in ElementTree.iterparse(f):
+                if elem.tag != f'{XLSX_NS}row':
+                    continue
+                cells = {}
+                for cell in elem.iter(f'{XLSX_NS}c'):
+                    ref = cell.get('r')
+                    column = _column_index(ref) if ref else len(cells)
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{XLSX_NS}t'))
+                    else:
+                        node = cell.find(f'{XLSX_NS}v')
+                        value = node.text if node is not None and node.text is not None else ''
+                        if kind == 's' and value:
+                            value = strings[int(value)]
+                        elif kind in (None, 'n') and value.endswith('.0'):
+                            value = value[:-2]  # telefones e números inteiros
+                    cells[column] = value
+                elem.clear()
+                yield [cells.get(i, '') for i in range(max(cells) + 1)] if cells else []
+
+
+READERS = {
+    'csv': iter_csv,
+    'xlsx': iter_xlsx,
+}
+
+
+def iter_records(path, kind=None):
+    """Dicionários campo -> valor, a partir do primeiro cabeçalho não vazio"""
+    kind = kind or os.path.splitext(path)[1].lstrip('.').lower()
+    if kind not in READERS:
+        raise ImportFileError(f"Formato não suportado: {kind or '?'} (use CSV ou XLSX)")
+    header = None
+    for row in READERS[kind](path):
+        if header is None:
+            if any(_clean_cell(cell) for cell in row):
+                header = [normalize_header(cell) for cell in row]
+                missing = [f.name for f in RESPOSTA_SCHEMA.fields if f.required and f.name not in header]
+                if missing:
+                    raise ImportFileError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+            continue
+        values = [_clean_cell(cell) for cell in row]
+        if not any(values):
+            yield None  # linha em branco: conta a posição, mas não é importada
+            continue
+        yield dict(zip(header, values))
+    if header is None:
+        raise ImportFileError("Arquivo vazio ou sem cabeçalho")
+
+
+def parse_created_at(value):
+    """Aceita AAAA-MM-DD[ HH:MM:SS], DD/MM/AAAA[ HH:MM] ou data serial do Excel"""
+    if not value:
+        return None
+    try:
+        serial = float(value)
+    except ValueError:
+        pass
+    else:
+        if 1 <= serial < 2958466:
+            return (EXCEL_EPOCH + timedelta(days=serial)).strftime('%Y-%m-%d %H:%M:%S')
+        raise ValueError(value)
+    value = value.strip()[:19]  # descarta frações de segundo
+    match = ISO_DATE_RE.match(value)
+    if match:
+        year, month, day, hour, minute, second = match.groups()
+    else:
+        match = BR_DATE_RE.match(value)
+        if not match:
+            raise ValueError(value)
+        day, month, year, hour, minute, second = match.groups()
+    # datetime() valida o dia/mês (strptime por formato é lento em 100 mil linhas)
+    return datetime(
+        int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0)
+    ).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# --- Importação -----------------------------------------------------------
+
+class Importer:
+    """
+    Importa um arquivo para respostas. policy segue DUPLICATE_POLICY:
+    'flag' grava e marca, 'reject' registra a linha como erro, 'merge'
+    atualiza a resposta já existente no banco. Repetições dentro do
+    próprio arquivo são marcadas como duplicatas da primeira ocorrência
+    ('reject' as registra como erro).
+    """
+
+    def __init__(self, db, batch_size=5000, policy='flag'):
+        self.db = db
+        self.batch_size = batch_size
+        self.policy = policy
+
+    def start(self, path, arquivo=None, usuario=None, restart=False):
+        """
+        Retorna (id, status, linhas já processadas) da importação deste arquivo:
+        retoma uma em andamento ou cria uma nova. Com restart=False, um
+        arquivo já importado por completo não é importado de novo.
+        """
+        sha256 = file_sha256(path)
+        conn = self.db.get_connection()
+        with conn:
+            row = conn.execute("""
+                SELECT id, status, linhas FROM importacoes
+                WHERE sha256 = ? ORDER BY id DESC LIMIT 1
+            """, (sha256,)).fetchone()
+            if row and not restart and row[1] in ('em_andamento', 'concluida'):
+                return row[0], row[1], row[2]
+            cursor = conn.execute(
+                "INSERT INTO importacoes (arquivo, sha256, usuario) VALUES (?, ?, ?)",
+                (arquivo or os.path.basename(path), sha256, usuario)
+            )
+        return cursor.lastrowid, 'em_andamento', 0
+
+    def run(self, path, arquivo=None, usuario=None, restart=False, kind=None, progress=None):
+        import_id, status, done = self.start(path, arquivo, usuario, restart)
+        if status == 'concluida':
+            return self.result(import_id, previous=True)
+
+        batch = []
+        line = 0
+        try:
+            for line, record in enumerate(iter_records(path, kind), start=1):
+                if line <= done:
+                    continue  # já gravada em uma execução anterior
+                batch.append((line, record))
+                if len(batch) >= self.batch_size:
+                    self._write_batch(import_id, batch, line)
+                    batch = []
+                    if progress:
+                        progress(self.result(import_id, resumed=done > 0))
+            self._write_batch(import_id, batch, max(line, done), final=True)
+        except ImportFileError as e:
+            self._fail(import_id, str(e))
+            raise
+        return self.result(import_id, resumed=done > 0)
+
+    def _prepare(self, import_id, record, created_default):
+        """Valida uma linha; retorna (dados, None) ou (None, ValidationError)"""
+        if 'estuda' in record:
+            record['estuda'] = 'sim' if record['estuda'].strip().lower() in TRUE_VALUES else ''
+        try:
+            dados = RESPOSTA_SCHEMA.validate(record)
+            dados['created_at'] = parse_created_at(record.get('created_at')) or created_default
+        except ValidationError as e:
+            return None, e
+        except ValueError:
+            return None, ValidationError("Data inválida", 'created_at')
+        dados['imagem'] = ''
+        dados['ip_address'] = f'importacao:{import_id}'
+        dados['email_norm'] = normalize_email(dados['email'])
+        dados['telefone_norm'] = normalize_phone(dados.get('telefone_limpo'))
+        return dados, None
+
+    def _write_batch(self, import_id, batch, last_line, final=False):
+        conn = self.db.get_connection()
+        created_default = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        rows, errors, merges = [], [], []
+        # Primeira ocorrência de cada chave no lote -> posição em rows
+        first_seen = {}
+        originals = []  # duplicata_de já conhecido de cada linha de rows
+        repeats = []
+
+        # O lock de escrita é tomado antes de ler: os ids do lote ficam contíguos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for line, record in batch:
+                if record is None:
+                    continue
+                dados, error = self._prepare(import_id, record, created_default)
+                if error is not None:
+                    errors.append((import_id, line, error.field, error.log_message))
+                    continue
+                keys = [k for k in (('email', dados['email_norm']), ('telefone', dados['telefone_norm'])) if k[1]]
+                original = find_duplicate(conn, dados['email_norm'], dados['telefone_norm'])
+                in_file = next((first_seen[k] for k in keys if k in first_seen), None)
+                if (original is not None or in_file is not None) and self.policy == 'reject':
+                    errors.append((import_id, line, 'email', "Email ou telefone já cadastrado"))
+                    continue
+                if original is not None and self.policy == 'merge':
+                    merges.append((original, RESPOSTA_SCHEMA.values(dict(dados, duplicata_de=None), INSERT_COLUMNS)))
+                    continue
+                if original is None and in_file is not None:
+                    # A primeira ocorrência pode já ser duplicata de uma resposta do banco
+                    original = originals[in_file]
+                    if original is None:
+                        repeats.append((len(rows), in_file))
+                dados['duplicata_de'] = original
+                for key in keys:
+                    first_seen.setdefault(key, len(rows))
+                originals.append(original)
+                rows.append(RESPOSTA_SCHEMA.values(dados, IMPORT_COLUMNS))
+
+            if rows:
+                last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM respostas").fetchone()[0]
+                insert_respostas(conn, rows, IMPORT_COLUMNS)
+                if repeats:
+                    ids = [r[0] for r in conn.execute(
+                        "SELECT id FROM respostas WHERE id > ? ORDER BY id", (last_id,))]
+                    conn.executemany(
+                        "UPDATE respostas SET duplicata_de = ? WHERE id = ?",
+                        [(ids[first], ids[position]) for position, first in repeats]
+                    )
+            for original, values in merges:
+                merge_resposta(conn, original, values)
+            if errors:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO importacao_erros (importacao_id, linha, campo, erro) VALUES (?, ?, ?, ?)",
+                    errors
+                )
+            conn.execute("""
+                UPDATE importacoes
+                SET linhas = ?, importadas = importadas + ?, erros = erros + ?,
+                    status = ?, atualizado_em = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (last_line, len(rows) + len(merges), len(errors),
+                  'concluida' if final else 'em_andamento', import_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _fail(self, import_id, message):
+        conn = self.db.get_connection()
+        with conn:
+            conn.execute("""
+                UPDATE importacoes SET status = 'falhou', atualizado_em = CURRENT_TIMESTAMP WHERE id = ?
+            """, (import_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO importacao_erros (importacao_id, linha, campo, erro) VALUES (?, 0, NULL, ?)",
+                (import_id, message)
+            )
+
+    def result(self, import_id, resumed=False, previous=False):
+        row = self.db.get_connection().execute(
+            "SELECT status, linhas, importadas, erros FROM importacoes WHERE id = ?", (import_id,)
+        ).fetchone()
+        return ImportResult(import_id, *row, resumed, previous)
+
+
+def import_errors(conn, import_id, limit=100):
+    """[(linha, campo, erro)] de uma importação, em ordem de linha"""
+    return conn.execute("""
+        SELECT linha, campo, erro FROM importacao_erros
+        WHERE importacao_id = ? ORDER BY linha LIMIT ?
+    """, (import_id, limit)).fetchall()
+
+
+def recent_imports(conn, limit=20):
+    return conn.execute("""
+        SELECT id, arquivo, status, linhas, importadas, erros, usuario, iniciado_em, atualizado_em
+        FROM importacoes ORDER BY id DESC LIMIT ?
+    """, (limit,)).fetchall()
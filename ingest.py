@@ -0,0 +1,195 @@
+"""
+Fila de ingestão com escrita posterior (write-behind) para o /enviar
+As respostas validadas vão para um arquivo de spool SQLite local e uma thread
+em segundo plano as grava em lotes na tabela respostas.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from respostas import INSERT_COLUMNS, insert_respostas
+
+logger = logging.getLogger(__name__)
+
+FLUSH_COLUMNS = INSERT_COLUMNS + ('created_at',)
+
+
+def _pad(values):
+    return tuple(values) + (None,) * (len(INSERT_COLUMNS) - len(values))
+
+
+def init_ingest_state(conn):
+    """Cria no banco principal a marca d'água do último item do spool já gravado"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingestao_estado (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_id INTEGER NOT NULL
+        );
+    """)
+    conn.execute("INSERT OR IGNORE INTO ingestao_estado (id, ultimo_id) VALUES (1, 0)")
+
+
+class IngestQueue:
+    """
+    Spool durável + gravação em lote.
+
+    O enqueue só faz um INSERT no spool (WAL, sem fsync com synchronous=NORMAL),
+    que sobrevive à queda do worker. O flush move um lote para respostas e avança
+    a marca d'água na mesma transação do banco principal, então um item nunca é
+    gravado duas vezes, mesmo que o processo caia antes de limpar o spool.
+    """
+
+    def __init__(self, db, spool_path, batch_size=500, flush_interval=0.5,
+                 synchronous='NORMAL'):
+        self.db = db
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        atexit.register(self.stop)
+
+    def _spool(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.spool_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fila (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dados TEXT NOT NULL,
+                    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            # Itens que o banco principal recusou (ex.: constraint), guardados para análise
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fila_rejeitada (
+                    id INTEGER PRIMARY KEY,
+                    dados TEXT NOT NULL,
+                    criado_em TIMESTAMP,
+                    erro TEXT
+                );
+            """)
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, values):
+        """Grava uma resposta (tupla na ordem de INSERT_COLUMNS) no spool"""
+        conn = self._spool()
+        with conn:
+            cursor = conn.execute("INSERT INTO fila (dados) VALUES (?)",
+                                  (json.dumps(values, ensure_ascii=False),))
+        self.start()
+        return cursor.lastrowid
+
+    def pending(self):
+        return self._spool().execute("SELECT COUNT(*) FROM fila").fetchone()[0]
+
+    def flush(self):
+        """Move um lote do spool para respostas. Retorna a quantidade movida."""
+        spool = self._spool()
+        main = self.db.get_connection()
+
+        # O lock de escrita do banco principal serializa os flushers de todos os workers
+        main.execute("BEGIN IMMEDIATE")
+        try:
+            last_id = main.execute("SELECT ultimo_id FROM ingestao_estado WHERE id = 1").fetchone()[0]
+            items = spool.execute(
+                "SELECT id, dados, criado_em FROM fila WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, self.batch_size)
+            ).fetchall()
+            rejected = []
+            if items:
+                # Itens gravados antes de novas colunas existirem ficam com NULL nelas
+                rows = [_pad(json.loads(dados)) + (criado_em,) for _, dados, criado_em in items]
+                try:
+                    main.execute("SAVEPOINT lote")
+                    insert_respostas(main, rows, FLUSH_COLUMNS)
+                    main.execute("RELEASE lote")
+                except sqlite3.IntegrityError:
+                    # Um item inválido não pode travar a fila: grava um a um
+                    main.execute("ROLLBACK TO lote")
+                    main.execute("RELEASE lote")
+                    for item, row in zip(items, rows):
+                        try:
+                            insert_respostas(main, [row], FLUSH_COLUMNS)
+                        except sqlite3.IntegrityError as e:
+                            rejected.append(item + (str(e),))
+                main.execute("UPDATE ingestao_estado SET ultimo_id = ? WHERE id = 1", (items[-1][0],))
+                last_id = items[-1][0]
+            main.commit()
+        except Exception:
+            main.rollback()
+            raise
+
+        with spool:
+            if rejected:
+                spool.executemany(
+                    "INSERT OR IGNORE INTO fila_rejeitada (id, dados, criado_em, erro) VALUES (?, ?, ?, ?)",
+                    rejected
+                )
+                logger.error(f"Fila de ingestão: {len(rejected)} resposta(s) recusada(s) pelo banco")
+            spool.execute("DELETE FROM fila WHERE id <= ?", (last_id,))
+        return len(items)
+
+    def flush_all(self):
+        total = 0
+        while True:
+            moved = self.flush()
+            total += moved
+            if moved < self.batch_size:
+                return total
+
+    def start(self):
+        """Inicia a thread de gravação deste processo (idempotente, seguro após fork)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='ingest-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Para a thread e grava o que restou no spool"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        try:
+            self.flush_all()
+        except Exception as e:
+            logger.error(f"Erro ao esvaziar a fila de ingestão: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                moved = self.flush()
+            except sqlite3.OperationalError as e:
+                # Banco ocupado: tenta novamente no próximo ciclo
+                logger.warning(f"Fila de ingestão aguardando banco: {str(e)}")
+                moved = 0
+            except Exception as e:
+                logger.error(f"Erro na gravação da fila de ingestão: {str(e)}")
+                moved = 0
+            if moved < self.batch_size:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+        self.db.close()
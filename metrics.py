@@ -0,0 +1,260 @@
+"""
+Métricas no formato texto do Prometheus, agregadas entre processos
+Cada processo (worker do gunicorn) grava seus valores em um arquivo próprio
+mapeado em memória (mmap); o /metrics de qualquer worker soma todos os
+arquivos do diretório. Mesmo esquema do modo multiprocess do prometheus_client.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2)
+
+HEADER_SIZE = 8
+INITIAL_SIZE = 64 * 1024
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'centrosul-metrics')
+
+# Valores acumulados dos workers que já terminaram (somados como os demais)
+DEAD_FILE = 'metrics_encerrados.db'
+
+
+class MmapedDict:
+    """
+    Dicionário chave -> float persistido em um arquivo mmap.
+    Layout: [u32 bytes usados][4 bytes livres] e entradas
+    [u32 tamanho da chave][chave + espaços até múltiplo de 8][f64 valor].
+    Só o processo dono escreve; outros processos apenas leem.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._positions = {}
+        self._used = struct.unpack_from('<I', self._map, 0)[0]
+        if self._used == 0:
+            self._used = HEADER_SIZE
+            struct.pack_into('<I', self._map, 0, self._used)
+        else:
+            for key, _, position in _iter_entries(self._map, self._used):
+                self._positions[key] = position
+
+    def _add_key(self, key):
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (-(len(encoded) + 4) % 8)
+        size = 4 + len(padded) + 8
+        while self._used + size > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        struct.pack_into(f'<I{len(padded)}sd', self._map, self._used, len(encoded), padded, 0.0)
+        self._positions[key] = self._used + 4 + len(padded)
+        self._used += size
+        # Atualiza o tamanho usado só depois da entrada completa estar gravada
+        struct.pack_into('<I', self._map, 0, self._used)
+
+    def add(self, key, amount):
+        if key not in self._positions:
+            self._add_key(key)
+        position = self._positions[key]
+        value = struct.unpack_from('<d', self._map, position)[0]
+        struct.pack_into('<d', self._map, position, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _iter_entries(data, used):
+    position = HEADER_SIZE
+    while position < used:
+        length = struct.unpack_from('<I', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+        position += 4 + length + (-(length + 4) % 8)
+        value = struct.unpack_from('<d', data, position)[0]
+        yield key, value, position
+        position += 8
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        return []
+    used = struct.unpack_from('<I', data, 0)[0]
+    return [(key, value) for key, value, _ in _iter_entries(data, min(used, len(data)))]
+
+
+def clear_directory(directory):
+    """
+    Remove os arquivos de métricas de execuções anteriores (início do master).
+    Mantém o do processo atual: com preload_app o master já pode ter gravado o seu.
+    """
+    own = f'metrics_{os.getpid()}.db'
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        if os.path.basename(path) != own:
+            os.remove(path)
+
+
+def mark_process_dead(pid, directory):
+    """
+    Soma os valores de um worker encerrado no arquivo dos encerrados e remove
+    o arquivo dele: os contadores continuam crescendo sem um arquivo por PID
+    que já passou pelo serviço. Chamado só pelo master, o único que grava ali.
+    """
+    path = os.path.join(directory, f'metrics_{pid}.db')
+    if not os.path.exists(path):
+        return
+    merged = MmapedDict(os.path.join(directory, DEAD_FILE))
+    try:
+        for key, value in read_file(path):
+            merged.add(key, value)
+    finally:
+        merged.close()
+    os.remove(path)
+
+
+def _sample_key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self, registry, name, documentation):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(_sample_key(self.name + '_total', labels), amount)
+
+
+class Histogram:
+    def __init__(self, registry, name, documentation, buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # Guarda a contagem por faixa; os acumulados são calculados na leitura
+        bound = next((b for b in self.buckets if value <= b), '+Inf')
+        samples = (
+            (_sample_key(self.name + '_bucket', dict(labels, le=str(bound))), 1),
+            (_sample_key(self.name + '_sum', labels), value),
+            (_sample_key(self.name + '_count', labels), 1),
+        )
+        self.registry.add_many(samples)
+
+
+class MetricsRegistry:
+    """Registro de métricas do processo, gravado em <directory>/metrics_<pid>.db"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.metrics = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = None
+        self._store_pid = None
+
+    def counter(self, name, documentation):
+        return self.metrics.setdefault(name, Counter(self, name, documentation))
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(self, name, documentation, buckets))
+
+    def _get_store(self):
+        # Cada processo tem o seu arquivo: reabre após um fork
+        if self._store is None or self._store_pid != os.getpid():
+            self._store = MmapedDict(os.path.join(self.directory, f'metrics_{os.getpid()}.db'))
+            self._store_pid = os.getpid()
+        return self._store
+
+    def add(self, key, amount):
+        with self._lock:
+            self._get_store().add(key, amount)
+
+    def add_many(self, samples):
+        with self._lock:
+            store = self._get_store()
+            for key, amount in samples:
+                store.add(key, amount)
+
+    def collect(self):
+        """Soma os valores de todos os processos: {nome da amostra: {labels: valor}}"""
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            try:
+                entries = read_file(path)
+            except OSError:
+                continue  # arquivo removido durante a leitura
+            for key, value in entries:
+                name, labels = json.loads(key)
+                labels = tuple(tuple(item) for item in labels)
+                samples = totals.setdefault(name, {})
+                samples[labels] = samples.get(labels, 0.0) + value
+        return totals
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)"""
+        totals = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            if isinstance(metric, Counter):
+                lines.append(f'# HELP {name}_total {metric.documentation}')
+                lines.append(f'# TYPE {name}_total counter')
+                for labels, value in sorted(totals.get(name + '_total', {}).items()):
+                    lines.append(f'{name}_total{_format_labels(labels)} {_format_value(value)}')
+                continue
+
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} histogram')
+            buckets = {}
+            for labels, value in totals.get(name + '_bucket', {}).items():
+                le = dict(labels)['le']
+                base = tuple(item for item in labels if item[0] != 'le')
+                buckets.setdefault(base, {})[le] = value
+            for base, counts in sorted(buckets.items()):
+                cumulative = 0.0
+                for bound in [str(b) for b in metric.buckets] + ['+Inf']:
+                    cumulative += counts.get(bound, 0.0)
+                    labels = base + (('le', bound),)
+                    lines.append(f'{name}_bucket{_format_labels(labels)} {_format_value(cumulative)}')
+                lines.append(f'{name}_sum{_format_labels(base)} '
+                             f'{_format_value(totals.get(name + "_sum", {}).get(base, 0.0))}')
+                lines.append(f'{name}_count{_format_labels(base)} '
+                             f'{_format_value(totals.get(name + "_count", {}).get(base, 0.0))}')
+        return '\n'.join(lines) + '\n'
+
+
+def sql_operation(sql):
+    """Primeira palavra do SQL (SELECT, INSERT...), usada como label"""
+    return sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'VAZIO'
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Migrações versionadas do banco
+Cada migração tem um número, uma etapa de esquema (DDL rápido, em uma transação)
+e, opcionalmente, um backfill de dados feito em lotes curtos com commit, para
+não segurar o lock de escrita durante o tráfego. O estado fica na tabela
+schema_version: 'aplicada' ou 'backfill' (esquema pronto, dados pendentes), com
+o cursor do backfill, que continua de onde parou se for interrompido.
+Na inicialização da aplicação só as etapas de esquema rodam; os backfills ficam
+para o 'flask db-migrate'.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+from aggregates import init_aggregates
+from database import DEFAULT_DATABASE_URL, Database
+from duplicates import backfill_chunk, init_duplicates
+from importer import init_imports
+from ingest import init_ingest_state
+from pagination import fill_created_at_chunk, init_change_time, init_pagination
+from search import (check_search_index, fts5_available, index_chunk, init_search_index, mark_pending,
+                    search_index_exists)
+
+logger = logging.getLogger(__name__)
+
+# schema(conn) -> estado inicial do backfill (dict) ou None se não houver dados a migrar
+# backfill(conn, estado, batch_size) -> linhas processadas no lote (0 encerra); atualiza o estado
+Migration = namedtuple('Migration', 'version name schema backfill')
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Registra a função decorada como etapa de esquema da migração `version`"""
+    def decorator(schema):
+        MIGRATIONS.append(Migration(version, name, schema, None))
+        return schema
+    return decorator
+
+
+def backfill(version):
+    """Registra a função decorada como backfill da migração `version`"""
+    def decorator(function):
+        index = next(i for i, m in enumerate(MIGRATIONS) if m.version == version)
+        MIGRATIONS[index] = MIGRATIONS[index]._replace(backfill=function)
+        return function
+    return decorator
+
+
+# --- Migrações ------------------------------------------------------------
+
+# Colunas do formulário, para completar tabelas respostas criadas por versões antigas
+RESPOSTAS_COLUMNS = (
+    ('sobrenome', 'TEXT'), ('telefone', 'TEXT'), ('cidade', 'TEXT'), ('uf', 'TEXT'),
+    ('movimento', 'TEXT'), ('sindicato', 'TEXT'), ('categoria', 'TEXT'), ('empresa', 'TEXT'),
+    ('estuda', 'BOOLEAN'), ('curso', 'TEXT'), ('instituicao', 'TEXT'), ('mensagem', 'TEXT'),
+    ('imagem', 'TEXT'), ('ip_address', 'TEXT'), ('created_at', 'TIMESTAMP'),
+)
+
+
+@migration(1, 'respostas e admin_users')
+def _respostas(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS respostas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            sobrenome TEXT NOT NULL,
+            email TEXT NOT NULL,
+            telefone TEXT,
+            cidade TEXT,
+            uf TEXT,
+            movimento TEXT,
+            sindicato TEXT,
+            categoria TEXT,
+            empresa TEXT,
+            estuda BOOLEAN,
+            curso TEXT,
+            instituicao TEXT,
+            mensagem TEXT,
+            imagem TEXT,
+            ip_address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT email_format CHECK (email LIKE '%_@__%.__%')
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS admin_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        );
+    """)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(respostas)")}
+    for column, kind in RESPOSTAS_COLUMNS:
+        if column not in existing:
+            # Só altera o esquema; as linhas antigas ficam com NULL
+            conn.execute(f"ALTER TABLE respostas ADD COLUMN {column} {kind}")
+    if 'created_at' not in existing:
+        # ADD COLUMN não aceita DEFAULT CURRENT_TIMESTAMP: o trigger faz esse papel
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS respostas_created_at_padrao AFTER INSERT ON respostas
+            WHEN NEW.created_at IS NULL BEGIN
+                UPDATE respostas SET created_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END;
+        """)
+
+
+@migration(2, 'índice de ordenação e contadores')
+def _paginacao(conn):
+    init_pagination(conn)
+
+
+@migration(3, 'chaves normalizadas de email/telefone')
+def _duplicatas(conn):
+    # ADD COLUMN no SQLite só altera o esquema, não reescreve a tabela
+    init_duplicates(conn)
+    if not conn.execute("SELECT 1 FROM respostas LIMIT 1").fetchone():
+        return None
+    return {'cursor': 0, 'duplicatas': 0}
+
+
+@backfill(3)
+def _duplicatas_backfill(conn, state, batch_size):
+    state['cursor'], count, flagged = backfill_chunk(conn, state['cursor'], batch_size)
+    state['duplicatas'] += flagged
+    return count
+
+
+@migration(4, 'estatísticas agregadas')
+def _agregados(conn):
+    init_aggregates(conn)
+
+
+@migration(5, 'marca d\'água da fila de ingestão')
+def _ingestao(conn):
+    init_ingest_state(conn)
+
+
+@migration(6, 'controle das importações')
+def _importacoes(conn):
+    init_imports(conn)
+
+
+@migration(7, 'índice de busca FTS5')
+def _busca(conn):
+    if not fts5_available(conn):
+        logger.warning("SQLite sem suporte a FTS5; migração da busca registrada sem o índice.")
+        return None
+    if not init_search_index(conn):
+        return None  # índice já existia e foi indexado antes
+    # As respostas que já existem são indexadas no backfill; as novas, pelos triggers
+    up_to = conn.execute("SELECT COALESCE(MAX(id), 0) FROM respostas").fetchone()[0]
+    mark_pending(conn, 0, up_to)
+    return {'cursor': 0, 'ate': up_to} if up_to else None
+
+
+@backfill(7)
+def _busca_backfill(conn, state, batch_size):
+    state['cursor'], count = index_chunk(conn, state['cursor'], state['ate'], batch_size)
+    if not count and not check_search_index(conn):
+        logger.error("Índice de busca inconsistente ao fim do backfill; reconstruindo")
+        conn.execute("INSERT INTO respostas_fts(respostas_fts) VALUES ('rebuild')")
+    return count
+
+
+@migration(8, 'triggers da busca protegidos durante o backfill')
+def _busca_triggers(conn):
+    if not search_index_exists(conn):
+        return None
+    init_search_index(conn)
+    # Backfill da 7 interrompido por uma versão anterior: os triggers passam a respeitar o cursor
+    row = conn.execute("SELECT estado, backfill FROM schema_version WHERE version = 7").fetchone()
+    if row and row[0] == 'backfill':
+        state = json.loads(row[1])
+        mark_pending(conn, state['cursor'], state['ate'])
+    return None
+
+
+@migration(9, 'índice das imagens das respostas')
+def _imagens(conn):
+    # O arquivamento confere, a cada lote, quais imagens ainda estão em uso
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_imagem ON respostas (imagem) WHERE imagem IS NOT NULL")
+
+
+@migration(10, 'data das respostas anteriores à coluna created_at')
+def _datas_antigas(conn):
+    if not conn.execute("SELECT 1 FROM respostas WHERE created_at IS NULL LIMIT 1").fetchone():
+        return None
+    # A data real se perdeu; a mais antiga conhecida mantém essas linhas no fim
+    # da ordem (created_at, id), atrás das que têm data, pelos ids menores
+    value = conn.execute(
+        "SELECT COALESCE(MIN(created_at), datetime('now')) FROM respostas WHERE created_at IS NOT NULL"
+    ).fetchone()[0]
+    return {'cursor': 0, 'data': value}
+
+
+@backfill(10)
+def _datas_antigas_backfill(conn, state, batch_size):
+    state['cursor'], count = fill_created_at_chunk(conn, state['cursor'], state['data'], batch_size)
+    return count
+
+
+@migration(11, 'instante da última alteração em respostas')
+def _alterada_em(conn):
+    init_change_time(conn)
+
+
+# --- Execução -------------------------------------------------------------
+
+MigrationStatus = namedtuple('MigrationStatus', 'version name status processed state')
+
+
+def _check_registry():
+    versions = [m.version for m in MIGRATIONS]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Migrações fora de sequência: {versions}")
+
+
+def init_schema_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            backfill TEXT,
+            processadas INTEGER NOT NULL DEFAULT 0,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def _applied(conn):
+    """{versão: (estado, processadas, backfill)}; vazio se schema_version ainda não existe"""
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone():
+        return {}
+    return {
+        row[0]: row[1:] for row in
+        conn.execute("SELECT version, estado, processadas, backfill FROM schema_version")
+    }
+
+
+def status(conn):
+    """[MigrationStatus] de todas as migrações; status 'pendente', 'backfill' ou 'aplicada'"""
+    _check_registry()
+    applied = _applied(conn)
+    result = []
+    for m in MIGRATIONS:
+        estado, processed, state = applied.get(m.version, ('pendente', 0, None))
+        result.append(MigrationStatus(m.version, m.name, estado, processed,
+                                      json.loads(state) if state else None))
+    return result
+
+
+def apply_schema(conn, target=None):
+    """
+    Aplica as etapas de esquema pendentes até `target`, uma transação por
+    migração. Seguro com vários processos iniciando juntos: a versão é
+    conferida de novo depois de obter o lock de escrita. Retorna as versões aplicadas.
+    """
+    _check_registry()
+    init_schema_version(conn)
+    conn.commit()
+    already = _applied(conn)
+    applied = []
+    for m in MIGRATIONS:
+        if target is not None and m.version > target:
+            break
+        if m.version in already:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (m.version,)).fetchone():
+                conn.rollback()
+                continue
+            state = m.schema(conn)
+            pending = m.backfill is not None and state is not None
+            conn.execute(
+                "INSERT INTO schema_version (version, nome, estado, backfill) VALUES (?, ?, ?, ?)",
+                (m.version, m.name, 'backfill' if pending else 'aplicada',
+                 json.dumps(state) if pending else None)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(m.version)
+        logger.info(f"Migração {m.version} aplicada: {m.name}{' (backfill pendente)' if pending else ''}")
+    return applied
+
+
+def run_backfills(conn, batch_size=2000, pause=0.05, target=None, progress=None):
+    """
+    Executa os backfills pendentes em lotes: cada lote e o cursor são gravados
+    na mesma transação, então uma interrupção perde no máximo o lote em curso.
+    `pause` (segundos) entre lotes deixa as gravações da aplicação passarem.
+    Retorna {versão: linhas processadas nesta execução}.
+    """
+    by_version = {m.version: m for m in MIGRATIONS}
+    done = {}
+    for item in status(conn):
+        if item.status != 'backfill' or (target is not None and item.version > target):
+            continue
+        m = by_version[item.version]
+        state, processed = item.state, item.processed
+        done[m.version] = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = m.backfill(conn, state, batch_size)
+                processed += count
+                conn.execute("""
+                    UPDATE schema_version
+                    SET estado = ?, backfill = ?, processadas = ?, atualizada_em = CURRENT_TIMESTAMP
+                    WHERE version = ?
+                """, ('backfill' if count else 'aplicada', json.dumps(state), processed, m.version))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            done[m.version] += count
+            if not count:
+                logger.info(f"Backfill da migração {m.version} concluído: {processed} linhas")
+                break
+            if progress:
+                progress(m, processed)
+            if pause:
+                time.sleep(pause)
+    return done
+
+
+def describe(conn, target=None):
+    """Linhas de texto com o estado de cada migração (usado no --dry-run)"""
+    lines = []
+    for m in status(conn):
+        detail = f" ({m.processed} linhas processadas)" if m.status == 'backfill' else ''
+        if target is not None and m.version > target and m.status == 'pendente':
+            detail = ' (fora do --ate)'
+        lines.append(f"{' ' if m.status == 'aplicada' else '*'} {m.version:3d} {m.status:<9} {m.name}{detail}")
+    try:
+        respostas = conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+    except sqlite3.OperationalError:
+        respostas = 0  # banco novo
+    lines.append(f"Respostas no banco: {respostas}")
+    return lines
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Migrações do banco (sem carregar a aplicação)")
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--dry-run', action='store_true', help="só mostra o estado, sem alterar o banco")
+    parser.add_argument('--ate', type=int, help="versão máxima a aplicar")
+    parser.add_argument('--sem-backfill', action='store_true', help="aplica só as etapas de esquema")
+    parser.add_argument('--batch-size', type=int, default=2000, help="linhas por lote do backfill")
+    parser.add_argument('--pausa', type=float, default=0.05, help="segundos entre os lotes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    conn = Database(args.database_url).connect()
+    try:
+        if args.dry_run:
+            print('\n'.join(describe(conn, args.ate)))
+            return
+        applied = apply_schema(conn, args.ate)
+        print(f"Esquema: {len(applied)} migrações aplicadas.")
+        if not args.sem_backfill:
+            run_backfills(conn, args.batch_size, args.pausa, args.ate,
+                          progress=lambda m, processed: print(f"  {m.version} {m.name}: {processed} linhas"))
+    except RuntimeError as e:
+        sys.exit(f"Erro: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
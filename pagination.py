@@ -0,0 +1,228 @@
+"""
+Paginação por cursor (keyset) e totais em cache para a tabela respostas
+A ordem é sempre (created_at DESC, id DESC), coberta por um índice composto
+"""
+
+import threading
+from collections import namedtuple, OrderedDict
+
+from search import RANK_EXPRESSION, build_match_query, search_filter
+
+Page = namedtuple('Page', 'rows prev_cursor next_cursor')
+ResultPage = namedtuple('ResultPage', 'rows total prev_cursor next_cursor')
+
+# Colunas sempre lidas: o cursor da próxima página é montado com elas
+CURSOR_COLUMNS = ('id', 'created_at')
+
+CURSOR_SEPARATOR = '|'
+
+
+def init_pagination(conn):
+    """Cria o índice de ordenação e a tabela de contadores mantida por triggers"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_respostas_created_at_id
+        ON respostas (created_at, id);
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS contadores (
+            nome TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        );
+    """)
+    # Inicializa apenas na primeira vez; depois os triggers mantêm os valores
+    conn.execute("""
+        INSERT OR IGNORE INTO contadores (nome, valor)
+        SELECT 'respostas', COUNT(*) FROM respostas;
+    """)
+    conn.execute("INSERT OR IGNORE INTO contadores (nome, valor) VALUES ('respostas_geracao', 0)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS contadores_respostas_ai AFTER INSERT ON respostas BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nome IN ('respostas', 'respostas_geracao');
+        END;
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS contadores_respostas_ad AFTER DELETE ON respostas BEGIN
+            UPDATE contadores SET valor = valor - 1 WHERE nome = 'respostas';
+            UPDATE contadores SET valor = valor + 1 WHERE nome = 'respostas_geracao';
+        END;
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS contadores_respostas_au AFTER UPDATE ON respostas BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nome = 'respostas_geracao';
+        END;
+    """)
+
+
+def init_change_time(conn):
+    """
+    Instante (epoch, em segundos) da última escrita em respostas, na tabela
+    contadores: inserções, alterações e remoções. Base do Last-Modified da API.
+    """
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    conn.execute(f"INSERT OR IGNORE INTO contadores (nome, valor) VALUES ('respostas_alterada_em', {now})")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS contadores_alterada_em_a{event[0].lower()}
+            AFTER {event} ON respostas BEGIN
+                UPDATE contadores SET valor = {now} WHERE nome = 'respostas_alterada_em';
+            END;
+        """)
+
+
+def fill_created_at_chunk(conn, after_id, value, batch_size=5000):
+    """
+    Preenche created_at de até `batch_size` respostas antigas (coluna criada
+    depois delas, NULL) com `value`. Sem data, a linha não casa com o cursor
+    (created_at, id) e a paginação pula ou repete linhas. Sem commit.
+    Retorna (último id, atualizadas).
+    """
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM respostas WHERE created_at IS NULL AND id > ? ORDER BY id LIMIT ?",
+        (after_id, batch_size)
+    )]
+    if not ids:
+        return after_id, 0
+    conn.execute(
+        "UPDATE respostas SET created_at = ? WHERE created_at IS NULL AND id >= ? AND id <= ?",
+        (value, ids[0], ids[-1])
+    )
+    return ids[-1], len(ids)
+
+
+def read_counters(conn):
+    """Retorna (total de respostas, geração) lidos da tabela de contadores"""
+    values = dict(conn.execute(
+        "SELECT nome, valor FROM contadores WHERE nome IN ('respostas', 'respostas_geracao')"
+    ).fetchall())
+    return values.get('respostas', 0), values.get('respostas_geracao', 0)
+
+
+class CountCache:
+    """Cache LRU de contagens, invalidado quando a geração de respostas muda"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, generation, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+def encode_cursor(created_at, row_id):
+    return f"{created_at}{CURSOR_SEPARATOR}{row_id}"
+
+
+def decode_cursor(value):
+    """Converte 'created_at|id' em tupla; retorna None se o cursor for inválido"""
+    if not value or CURSOR_SEPARATOR not in value:
+        return None
+    created_at, _, row_id = value.rpartition(CURSOR_SEPARATOR)
+    try:
+        return created_at, int(row_id)
+    except ValueError:
+        return None
+
+
+def fetch_page(conn, columns, per_page, page=1, total=0, after=None, before=None):
+    """
+    Busca uma página de respostas em ordem decrescente de (created_at, id).
+
+    - after/before: cursores decodificados da página anterior/seguinte (keyset)
+    - sem cursor, a primeira e a última página também são buscadas pelo índice;
+      páginas intermediárias acessadas diretamente usam OFFSET sobre o índice
+    """
+    select = f"SELECT {', '.join(columns)} FROM respostas"
+    id_index = columns.index('id')
+    created_index = columns.index('created_at')
+    total_pages = max(1, (total + per_page - 1) // per_page)
+
+    if after:
+        rows = conn.execute(select + """
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (after[0], after[1], per_page)).fetchall()
+    elif before:
+        rows = conn.execute(select + """
+            WHERE (created_at, id) > (?, ?)
+            ORDER BY created_at ASC, id ASC LIMIT ?
+        """, (before[0], before[1], per_page)).fetchall()
+        rows.reverse()
+    elif page > 1 and page >= total_pages:
+        # Última página: lida a partir do fim do índice, sem OFFSET
+        last_size = total - (total_pages - 1) * per_page
+        rows = conn.execute(select + " ORDER BY created_at ASC, id ASC LIMIT ?",
+                            (last_size,)).fetchall()
+        rows.reverse()
+    else:
+        rows = conn.execute(select + " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                            (per_page, (page - 1) * per_page)).fetchall()
+
+    prev_cursor = next_cursor = None
+    if rows:
+        if page > 1:
+            prev_cursor = encode_cursor(rows[0][created_index], rows[0][id_index])
+        if page < total_pages:
+            next_cursor = encode_cursor(rows[-1][created_index], rows[-1][id_index])
+    return Page(rows, prev_cursor, next_cursor)
+
+
+def list_respostas(conn, columns, per_page, page=1, search='', fts_enabled=True,
+                   after=None, before=None, counts=None):
+    """
+    Página de respostas com só as colunas pedidas, como dicionários. Usada pelo
+    dashboard e pela API JSON, com a mesma busca e a mesma paginação:
+
+    - com busca: FTS5 ordenado por relevância (ou LIKE sem FTS5), por OFFSET
+    - sem busca: fetch_page, por cursor sobre (created_at, id)
+    - counts: CountCache dos totais das buscas, invalidado a cada escrita
+    """
+    selected = tuple(columns) + tuple(c for c in CURSOR_COLUMNS if c not in columns)
+    total_respostas, generation = read_counters(conn)
+    offset = (page - 1) * per_page
+    match_query = build_match_query(search) if search else None
+    prev_cursor = next_cursor = None
+
+    def count(key, sql, params):
+        compute = lambda: conn.execute(sql, params).fetchone()[0]
+        return counts.get_or_compute(key, generation, compute) if counts is not None else compute()
+
+    if match_query and fts_enabled:
+        rows = conn.execute(f"""
+            SELECT {', '.join('r.' + c for c in selected)}
+            FROM respostas_fts
+            JOIN respostas r ON r.id = respostas_fts.rowid
+            WHERE respostas_fts MATCH ?
+            ORDER BY {RANK_EXPRESSION}, r.created_at DESC
+            LIMIT ? OFFSET ?
+        """, (match_query, per_page, offset)).fetchall()
+        total = count(('fts', match_query),
+                      "SELECT COUNT(*) FROM respostas_fts WHERE respostas_fts MATCH ?", (match_query,))
+    elif search:
+        # Sem FTS5 (ou termo sem palavras): o mesmo LIKE do export
+        condition, params = search_filter(search, fts_enabled=False)
+        rows = conn.execute(f"""
+            SELECT {', '.join(selected)} FROM respostas
+            WHERE {condition}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        """, params + [per_page, offset]).fetchall()
+        total = count(('like', search), f"SELECT COUNT(*) FROM respostas WHERE {condition}", params)
+    else:
+        total = total_respostas
+        result = fetch_page(conn, selected, per_page, page=page, total=total, after=after, before=before)
+        rows, prev_cursor, next_cursor = result.rows, result.prev_cursor, result.next_cursor
+
+    rows = [dict(zip(columns, row)) for row in rows]
+    return ResultPage(rows, total, prev_cursor, next_cursor)
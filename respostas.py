@@ -0,0 +1,41 @@
+"""
+Escrita na tabela respostas, compartilhada pelo /enviar e pela fila de ingestão
+"""
+
+# Colunas gravadas a partir do formulário (ordem das tuplas de valores)
+INSERT_COLUMNS = (
+    'nome', 'sobrenome', 'email', 'telefone', 'cidade', 'uf',
+    'movimento', 'sindicato', 'categoria', 'empresa',
+    'estuda', 'curso', 'instituicao', 'mensagem', 'imagem', 'ip_address',
+    'email_norm', 'telefone_norm', 'duplicata_de',
+)
+
+# Colunas que um reenvio pode atualizar na política 'merge' (vazios não apagam o valor antigo)
+MERGE_COLUMNS = INSERT_COLUMNS[:-1]
+
+
+def insert_sql(columns=INSERT_COLUMNS):
+    placeholders = ', '.join('?' for _ in columns)
+    return f"INSERT INTO respostas ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+def insert_resposta(conn, values):
+    """Insere uma resposta (tupla na ordem de INSERT_COLUMNS) e retorna o id"""
+    cursor = conn.execute(insert_sql(), values)
+    return cursor.lastrowid
+
+
+def insert_respostas(conn, rows, columns=INSERT_COLUMNS):
+    """Insere várias respostas em um único executemany (sem commit)"""
+    conn.executemany(insert_sql(columns), rows)
+
+
+def merge_resposta(conn, resposta_id, values):
+    """Atualiza a resposta existente com os valores preenchidos de um reenvio"""
+    data = dict(zip(INSERT_COLUMNS, values))
+    assignments = ', '.join(
+        f"{column} = ?" if column == 'estuda' else f"{column} = COALESCE(NULLIF(?, ''), {column})"
+        for column in MERGE_COLUMNS
+    )
+    conn.execute(f"UPDATE respostas SET {assignments} WHERE id = ?",
+                 tuple(data[column] for column in MERGE_COLUMNS) + (resposta_id,))
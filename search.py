@@ -0,0 +1,169 @@
+"""
+Índice de busca textual (SQLite FTS5) sobre a tabela respostas
+O índice é uma tabela de conteúdo externo mantida por triggers
+"""
+
+import re
+import sqlite3
+
+# Colunas indexadas e seus pesos no ranking bm25 (mesma ordem)
+FTS_COLUMNS = ('nome', 'sobrenome', 'email', 'cidade', 'empresa')
+FTS_WEIGHTS = (10.0, 10.0, 5.0, 2.0, 2.0)
+
+# remove_diacritics 2: "Conceição" e "conceicao" geram o mesmo token
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+RANK_EXPRESSION = "bm25(respostas_fts, {})".format(', '.join(str(w) for w in FTS_WEIGHTS))
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts5_available(conn):
+    """Verifica se o SQLite foi compilado com FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def search_index_exists(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'respostas_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def init_search_index(conn):
+    """Cria o índice FTS5 e os triggers de sincronização. Retorna True se foi criado agora."""
+    created = not search_index_exists(conn)
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS respostas_fts USING fts5(
+            {columns},
+            content='respostas',
+            content_rowid='id',
+            tokenize='{FTS_TOKENIZER}'
+        );
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS respostas_fts_ai AFTER INSERT ON respostas BEGIN
+            INSERT INTO respostas_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END;
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS respostas_fts_pendente (
+            cursor INTEGER NOT NULL,
+            ate INTEGER NOT NULL
+        );
+    """)
+    create_search_triggers(conn)
+    return created
+
+
+def create_search_triggers(conn):
+    """
+    (Re)cria os triggers de alteração e remoção. Enquanto o backfill não
+    chegou a uma linha (faixa em respostas_fts_pendente), ela não está no
+    índice: um 'delete' do FTS5 para conteúdo nunca inserido corromperia o
+    índice, então os triggers ignoram essas linhas e o backfill indexa os
+    valores atuais quando passar por elas.
+    """
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{c}' for c in FTS_COLUMNS)
+    indexed = "NOT EXISTS (SELECT 1 FROM respostas_fts_pendente WHERE old.id > cursor AND old.id <= ate)"
+
+    conn.execute("DROP TRIGGER IF EXISTS respostas_fts_ad")
+    conn.execute(f"""
+        CREATE TRIGGER respostas_fts_ad AFTER DELETE ON respostas WHEN {indexed} BEGIN
+            INSERT INTO respostas_fts(respostas_fts, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+        END;
+    """)
+    # Só reindexa quando uma coluna indexada muda (backfills de outras colunas não tocam o FTS)
+    conn.execute("DROP TRIGGER IF EXISTS respostas_fts_au")
+    conn.execute(f"""
+        CREATE TRIGGER respostas_fts_au AFTER UPDATE OF {columns} ON respostas WHEN {indexed} BEGIN
+            INSERT INTO respostas_fts(respostas_fts, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+            INSERT INTO respostas_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END;
+    """)
+
+
+def mark_pending(conn, after_id, up_to):
+    """Registra a faixa de ids que o backfill ainda vai indexar"""
+    conn.execute("DELETE FROM respostas_fts_pendente")
+    if up_to > after_id:
+        conn.execute("INSERT INTO respostas_fts_pendente (cursor, ate) VALUES (?, ?)", (after_id, up_to))
+
+
+def check_search_index(conn):
+    """integrity-check do FTS5 contra a tabela respostas; True se o índice está consistente"""
+    try:
+        conn.execute("INSERT INTO respostas_fts(respostas_fts, rank) VALUES ('integrity-check', 1)")
+        return True
+    except sqlite3.DatabaseError:
+        return False
+
+
+def rebuild_search_index(conn):
+    """Reconstrói o índice a partir das linhas existentes em respostas"""
+    conn.execute("INSERT INTO respostas_fts(respostas_fts) VALUES ('rebuild')")
+    conn.execute("DELETE FROM respostas_fts_pendente")
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+
+
+def index_chunk(conn, after_id, up_to, batch_size=5000):
+    """
+    Indexa até `batch_size` respostas com after_id < id <= up_to (as que já
+    existiam quando o índice foi criado; as novas entram pelos triggers) e
+    avança o cursor lido pelos triggers, na mesma transação.
+    Sem commit. Retorna (último id, indexadas).
+    """
+    columns = ', '.join(FTS_COLUMNS)
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM respostas WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+        (after_id, up_to, batch_size)
+    )]
+    if not ids:
+        mark_pending(conn, up_to, up_to)
+        return after_id, 0
+    conn.execute(f"""
+        INSERT INTO respostas_fts(rowid, {columns})
+        SELECT id, {columns} FROM respostas WHERE id >= ? AND id <= ?
+    """, (ids[0], ids[-1]))
+    mark_pending(conn, ids[-1], up_to)
+    return ids[-1], len(ids)
+
+
+def build_match_query(term):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura.
+    Cada palavra vira um prefixo entre aspas ("joa"*), combinadas com AND.
+    Retorna None se o texto não contém nenhuma palavra pesquisável.
+    """
+    tokens = TOKEN_RE.findall(term)
+    if not tokens:
+        return None
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def search_filter(term, fts_enabled=True):
+    """
+    Retorna (condição SQL, parâmetros) para filtrar respostas pelo texto buscado,
+    com a mesma semântica do dashboard: FTS5 quando disponível, senão LIKE.
+    """
+    match_query = build_match_query(term) if term else None
+    if match_query and fts_enabled:
+        return "id IN (SELECT rowid FROM respostas_fts WHERE respostas_fts MATCH ?)", [match_query]
+    if term:
+        like = f"%{term}%"
+        return ("(nome LIKE ? OR sobrenome LIKE ? OR email LIKE ? "
+                "OR cidade LIKE ? OR empresa LIKE ?)"), [like] * 5
+    return '', []
@@ -0,0 +1,174 @@
+"""
+Sessões do lado do servidor
+O cookie guarda só um identificador aleatório; os dados da sessão ficam no
+estado compartilhado (shared_state.py) com expiração, visíveis a todos os
+workers. A chave de uma sessão de admin leva o id do usuário
+(sessao:<id>:<token>), então desativar o admin ou trocar a senha apaga todas as
+sessões dele de uma vez.
+O @admin_required confere o admin (ativo e com a mesma senha do login) em um
+cache LRU + TTL por processo: uma consulta a admin_users por admin a cada
+ADMIN_CACHE_TTL segundos, não uma por página.
+"""
+
+import hashlib
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SESSION_PREFIX = 'sessao'
+
+# Sessões anônimas (mensagens flash antes do login) ficam sob o id 0
+ANONYMOUS = 0
+
+_SID_RE = re.compile(r'^\d{1,12}\.[A-Za-z0-9_-]{43}$')
+
+AdminState = namedtuple('AdminState', 'active credential')
+
+
+def credential(password_hash):
+    """
+    Impressão do hash da senha guardada na sessão: muda quando a senha muda.
+    Um rehash no login (BCRYPT_ROUNDS alterado) também muda o hash e encerra
+    as outras sessões daquele admin, uma única vez.
+    """
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    return hashlib.sha256(password_hash).hexdigest()[:16]
+
+
+def session_key(sid):
+    user_id, _, token = sid.partition('.')
+    return f"{SESSION_PREFIX}:{user_id}:{token}"
+
+
+def user_prefix(user_id):
+    return f"{SESSION_PREFIX}:{int(user_id)}:"
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Dados da sessão; `sid` é None até a primeira gravação"""
+
+    def __init__(self, initial=None, sid=None, written_at=0):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.written_at = written_at
+        self.owner = int(sid.partition('.')[0]) if sid else ANONYMOUS
+        self.discarded = None
+        self.modified = False
+
+    def regenerate(self, user_id=ANONYMOUS):
+        """
+        Troca o identificador (no login e no logout): o id antigo deixa de
+        valer e a nova chave fica sob o usuário, para a revogação achá-la.
+        """
+        if self.sid:
+            self.discarded = self.sid
+        self.sid = None
+        self.owner = int(user_id)
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Sessões no estado compartilhado. Só grava quando a sessão muda ou, para
+    renovar a expiração, depois de `refresh` segundos; uma requisição comum
+    custa uma leitura do estado.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, state, lifetime=43200, refresh=300):
+        self.state = state
+        self.lifetime = lifetime
+        self.refresh = refresh
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_RE.match(sid):
+            data = self.state.get(session_key(sid))
+            if data is not None:
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+                record = self.serializer.loads(data)
+                return ServerSession(record['d'], sid=sid, written_at=record['t'])
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.discarded:
+            self.state.delete(session_key(session.discarded))
+        if not session:
+            if session.sid:
+                self.state.delete(session_key(session.sid))
+            if session.sid or session.discarded:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        response.vary.add('Cookie')
+        now = time.time()
+        new = session.sid is None
+        if not (new or session.modified or now - session.written_at > self.refresh):
+            return
+        if new:
+            session.sid = f"{session.owner}.{secrets.token_urlsafe(32)}"
+        record = self.serializer.dumps({'d': dict(session), 't': now})
+        self.state.set(session_key(session.sid), record.encode('utf-8'), ttl=self.lifetime)
+        if new or session.permanent:
+            response.set_cookie(name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+    def revoke_user(self, user_id):
+        """Apaga todas as sessões do admin (em todos os workers)"""
+        return self.state.delete_prefix(user_prefix(user_id))
+
+
+class AdminStateCache:
+    """Cache LRU + TTL de id do admin -> AdminState (ativo, credencial)"""
+
+    def __init__(self, load, max_entries=256, ttl=30):
+        self.load = load
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """AdminState do admin, ou None se ele não existe mais"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        value = self.load(user_id)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
@@ -0,0 +1,317 @@
+"""
+Estado compartilhado entre os workers: rate limiting, caches e sessões
+Com Redis (REDIS_URL), um pool de conexões por processo serve o limiter e os
+caches. Sem Redis, um arquivo SQLite local (db/estado.db, em WAL) faz o mesmo
+papel entre os processos da máquina: contadores atômicos por UPSERT e janelas
+deslizantes gravadas em uma transação IMMEDIATE. Assim o "5 per minute" vale
+para todos os workers juntos e não zera a cada deploy.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import MovingWindowSupport, Storage
+
+from database import Database, sqlite_path
+
+try:
+    import redis
+except ImportError:  # redis só é necessário com SHARED_STATE_URL redis://
+    redis = None
+
+DEFAULT_SHARED_STATE_URL = "sqlite:///db/estado.db"
+
+# Intervalo entre as limpezas das chaves expiradas (por processo)
+PURGE_INTERVAL = 60
+
+
+class SQLiteState:
+    """Chave/valor com TTL, contadores e janelas deslizantes em um arquivo SQLite"""
+
+    def __init__(self, path, busy_timeout=5000):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Uma conexão por thread, reaberta após fork (o pool de conexões do processo)
+        self.db = Database(f"sqlite:///{path}", busy_timeout=busy_timeout)
+        self._last_purge = time.monotonic()
+        conn = self.db.connect()
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS estado (
+                        chave TEXT PRIMARY KEY,
+                        valor BLOB,
+                        expira REAL
+                    ) WITHOUT ROWID;
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS contadores (
+                        chave TEXT PRIMARY KEY,
+                        valor INTEGER NOT NULL,
+                        expira REAL NOT NULL
+                    ) WITHOUT ROWID;
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS janelas (
+                        chave TEXT NOT NULL,
+                        instante REAL NOT NULL,
+                        expira REAL NOT NULL
+                    );
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_janelas_chave ON janelas (chave, instante)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_janelas_expira ON janelas (expira)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_estado_expira ON estado (expira) WHERE expira IS NOT NULL")
+        finally:
+            conn.close()
+
+    def _conn(self):
+        conn = self.db.get_connection()
+        if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            self.purge(conn)
+        return conn
+
+    def purge(self, conn=None):
+        """Remove o que já expirou (chaves esquecidas não crescem o arquivo)"""
+        conn = conn or self.db.get_connection()
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM estado WHERE expira <= ?", (now,))
+            conn.execute("DELETE FROM contadores WHERE expira <= ?", (now,))
+            conn.execute("DELETE FROM janelas WHERE expira <= ?", (now,))
+
+    # --- Chave/valor (caches e sessões) -------------------------------------
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT valor FROM estado WHERE chave = ? AND (expira IS NULL OR expira > ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                INSERT INTO estado (chave, valor, expira) VALUES (?, ?, ?)
+                ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira
+            """, (key, value, expira))
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM estado WHERE chave = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        """Remove as chaves que começam com `prefix` (faixa da chave primária)"""
+        conn = self._conn()
+        with conn:
+            return conn.execute(
+                "DELETE FROM estado WHERE chave >= ? AND chave < ?", (prefix, _prefix_end(prefix))
+            ).rowcount
+
+    # --- Contadores (janela fixa) -------------------------------------------
+
+    def incr(self, key, expiry, amount=1):
+        """Soma `amount` ao contador; um contador expirado recomeça do zero"""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            return conn.execute("""
+                INSERT INTO contadores (chave, valor, expira) VALUES (?, ?, ?)
+                ON CONFLICT (chave) DO UPDATE SET
+                    valor = CASE WHEN expira <= ? THEN excluded.valor ELSE valor + excluded.valor END,
+                    expira = CASE WHEN expira <= ? THEN excluded.expira ELSE expira END
+                RETURNING valor
+            """, (key, amount, now + expiry, now, now)).fetchone()[0]
+
+    def counter(self, key):
+        """(valor, expira) do contador, ou (0, agora) se não existir"""
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT valor, expira FROM contadores WHERE chave = ? AND expira > ?", (key, now)
+        ).fetchone()
+        return tuple(row) if row else (0, now)
+
+    def clear(self, key):
+        conn = self._conn()
+        with conn:
+            for table in ('estado', 'contadores', 'janelas'):
+                conn.execute(f"DELETE FROM {table} WHERE chave = ?", (key,))
+
+    def reset(self):
+        conn = self._conn()
+        with conn:
+            total = sum(conn.execute(f"DELETE FROM {table}").rowcount
+                        for table in ('estado', 'contadores', 'janelas'))
+        return total
+
+    # --- Janela deslizante (moving window) ----------------------------------
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        """Registra `amount` eventos se a janela dos últimos `expiry` segundos comportar"""
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._conn()
+        # IMMEDIATE: contar e inserir sem outro worker no meio
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = conn.execute(
+                "SELECT COUNT(*) FROM janelas WHERE chave = ? AND instante > ?", (key, now - expiry)
+            ).fetchone()[0]
+            if count + amount > limit:
+                conn.rollback()
+                return False
+            conn.executemany(
+                "INSERT INTO janelas (chave, instante, expira) VALUES (?, ?, ?)",
+                [(key, now, now + expiry)] * amount
+            )
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+
+    def moving_window(self, key, expiry):
+        """(início da janela, eventos na janela): o evento mais antigo ainda contado"""
+        now = time.time()
+        oldest, count = self._conn().execute(
+            "SELECT MIN(instante), COUNT(*) FROM janelas WHERE chave = ? AND instante > ?",
+            (key, now - expiry)
+        ).fetchone()
+        return (oldest, count) if count else (now, 0)
+
+
+class MemoryState:
+    """Chave/valor com TTL na memória do processo (desenvolvimento e testes)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+
+class RedisState:
+    """Chave/valor no Redis, com um pool de conexões por processo"""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("Pacote redis não instalado")
+        # O pool do redis-py descarta as conexões herdadas quando detecta um fork
+        self.pool = redis.ConnectionPool.from_url(url)
+        self.client = redis.Redis(connection_pool=self.pool)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=f"{prefix}*", count=500))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
+
+
+def _prefix_end(prefix):
+    """Menor chave maior que todas as que começam com `prefix`"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def create_state(url):
+    """Estado compartilhado a partir da URL: sqlite:///caminho, redis://... ou memory://"""
+    if url.startswith('sqlite:'):
+        return SQLiteState(sqlite_path(url))
+    if url.startswith(('redis:', 'rediss:', 'unix:')):
+        return RedisState(url)
+    if url.startswith('memory:'):
+        return MemoryState()
+    raise ValueError(f"SHARED_STATE_URL inválida: {url}")
+
+
+def limiter_options(state):
+    """storage_options do Limiter: o limiter usa as mesmas conexões do estado compartilhado"""
+    if isinstance(state, RedisState):
+        return {'connection_pool': state.pool}
+    if isinstance(state, SQLiteState):
+        return {'state': state}
+    return {}
+
+
+class SQLiteLimiterStorage(Storage, MovingWindowSupport):
+    """
+    Storage do flask-limiter (biblioteca limits) sobre o SQLiteState.
+    Registrado pelo esquema: Limiter(storage_uri='sqlite:///db/estado.db').
+    Suporta as estratégias fixed-window e moving-window.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, state=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.state = state or SQLiteState(sqlite_path(uri))
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key, expiry, amount=1):
+        return self.state.incr(key, expiry, amount)
+
+    def get(self, key):
+        return self.state.counter(key)[0]
+
+    def get_expiry(self, key):
+        return self.state.counter(key)[1]
+
+    def check(self):
+        try:
+            self.state.db.get_connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self.state.reset()
+
+    def clear(self, key):
+        self.state.clear(key)
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        return self.state.acquire_entry(key, limit, expiry, amount)
+
+    def get_moving_window(self, key, limit, expiry):
+        return self.state.moving_window(key, expiry)
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+
+import pytest
+
+from aggregates import rebuild_aggregates
+from archive import ArchiveStore
+from duplicates import duplicate_groups
+from migrations import apply_schema, run_backfills
+from search import check_search_index, fts5_available, search_filter
+
+requires_fts5 = pytest.mark.skipif(
+    not fts5_available(sqlite3.connect(':memory:')), reason="SQLite sem FTS5"
+)
+
+OLD = '2020-03-01 12:00:00'
+RECENT = '2099-01-01 12:00:00'
+
+
+@pytest.fixture
+def setup(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'database.db'))
+    apply_schema(conn)
+    run_backfills(conn, pause=0)
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    images = {}
+    for name in ('so-antiga.png', 'compartilhada.png'):
+        path = uploads / name
+        path.write_bytes(b'png')
+        images[name] = str(path)
+
+    rows = [
+        # (nome, email, created_at, imagem, duplicata_de)
+        ('Anastácia', 'ana@exemplo.com', OLD, images['so-antiga.png'], None),
+        ('Bento', 'bento@exemplo.com', OLD, images['compartilhada.png'], None),
+        ('Bento', 'bento@exemplo.com', RECENT, images['compartilhada.png'], 2),
+        ('Cecília', 'cecilia@exemplo.com', OLD, None, None),
+        ('Davi', 'davi@exemplo.com', RECENT, None, None),
+    ]
+    conn.executemany(
+        "INSERT INTO respostas (nome, sobrenome, email, cidade, created_at, imagem, duplicata_de) "
+        "VALUES (?, 'Lima', ?, 'Pelotas', ?, ?, ?)", rows
+    )
+    conn.commit()
+    archive = ArchiveStore(str(tmp_path / 'arquivo.db'), str(tmp_path / 'arquivo_uploads'))
+    return conn, archive, images
+
+
+def aggregates(conn):
+    return sorted(conn.execute("SELECT dimensao, valor, total FROM agregados").fetchall())
+
+
+def main_ids(conn):
+    return [row[0] for row in conn.execute("SELECT id FROM respostas ORDER BY id")]
+
+
+def test_archive_moves_old_rows_and_keeps_stats(setup):
+    conn, archive, _ = setup
+    before = aggregates(conn)
+
+    assert archive.eligible(conn, 30) == 2
+    assert archive.run(conn, 30, batch_size=1) == 2
+
+    # A original de um grupo com duplicata ativa fica no banco principal
+    assert main_ids(conn) == [2, 3, 5]
+    assert len(duplicate_groups(conn, 10)) == 1
+    assert archive.count() == 2
+    assert aggregates(conn) == before
+
+    table = archive.load_dimensions(conn)
+    rebuild_aggregates(conn, extra_sources=(table,))
+    assert aggregates(conn) == before
+
+
+def test_archive_images(setup):
+    conn, archive, images = setup
+    archive.run(conn, 30)
+
+    moved = os.path.join(archive.upload_folder, 'so-antiga.png')
+    assert not os.path.exists(images['so-antiga.png'])
+    assert os.path.exists(moved)
+    assert archive.image_path(images['so-antiga.png']) == moved
+    # Ainda usada por uma resposta ativa
+    assert os.path.exists(images['compartilhada.png'])
+
+
+def test_interrupted_batch_is_not_copied_twice(setup):
+    conn, archive, _ = setup
+    # Cópia feita, remoção do banco principal não: como uma execução interrompida
+    row = conn.execute("SELECT * FROM respostas WHERE id = 1")
+    data = dict(zip([d[0] for d in row.description], row.fetchone()))
+    archive._store([data], [1], '?')
+
+    assert archive.run(conn, 30) == 2
+    assert archive.count() == 2
+
+
+@requires_fts5
+def test_archive_and_search_stay_consistent(setup):
+    conn, archive, _ = setup
+    archive.run(conn, 30)
+
+    assert check_search_index(conn)
+    condition, params = search_filter('anastacia')
+    assert conn.execute(f"SELECT COUNT(*) FROM respostas WHERE {condition}", params).fetchone()[0] == 0
+
+    rows, total = archive.search('anastacia', ('id', 'nome', 'email'))
+    assert total == 1
+    assert rows[0]['nome'] == 'Anastácia'
+    assert archive.get(4, ('id', 'nome'))['nome'] == 'Cecília'
+    assert archive.search('davi', ('id',)) == ([], 0)
+    archive.get_connection().execute("INSERT INTO arquivo_fts(arquivo_fts) VALUES ('integrity-check')")
@@ -0,0 +1,63 @@
+import os
+import sqlite3
+
+import pytest
+
+from backup import BackupError, BackupManager
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS respostas (id INTEGER PRIMARY KEY, nome TEXT)")
+    conn.executemany("INSERT INTO respostas (nome) VALUES (?)", [(f"nome {i}",) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    db_path = str(tmp_path / 'database.db')
+    make_db(db_path, 3)
+    # keep=1: a cópia pre-restore não pode remover o snapshot restaurado
+    return BackupManager(db_path, str(tmp_path / 'backups'), keep=1, sleep=0)
+
+
+def test_create_restore_round_trip(manager):
+    snapshot = manager.create()
+    make_db(manager.db_path, 5)
+    assert count(manager.db_path) == 8
+
+    assert manager.restore(os.path.basename(snapshot.path)) == 3
+    assert count(manager.db_path) == 3
+    labels = sorted(s.label or '' for s in manager.list())
+    assert labels == ['', 'pre-restore']
+    assert not [n for n in os.listdir(manager.directory) if n.startswith('.parcial-')]
+
+
+def test_restore_latest_keeps_safety_copy(manager):
+    manager.create()
+    make_db(manager.db_path, 2)
+    assert manager.restore('latest') == 3
+
+    pre_restore = [s for s in manager.list() if s.label == 'pre-restore']
+    assert len(pre_restore) == 1
+    raw, rows = manager.verify(pre_restore[0].path)
+    os.remove(raw)
+    assert rows == 5
+
+
+def test_restore_rejects_bad_checksum(manager):
+    snapshot = manager.create()
+    with open(snapshot.path + '.sha256', 'w') as f:
+        f.write('0' * 64 + '  x\n')
+    with pytest.raises(BackupError):
+        manager.restore(snapshot.path, safety_copy=False)
+    assert count(manager.db_path) == 3
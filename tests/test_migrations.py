@@ -0,0 +1,123 @@
+import json
+import sqlite3
+
+import pytest
+
+from migrations import MIGRATIONS, apply_schema, run_backfills, status
+from pagination import read_counters
+from search import check_search_index, fts5_available
+
+# Esquema do app antes das migrações versionadas (init_db original)
+BASELINE_SCHEMA = """
+    CREATE TABLE respostas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        sobrenome TEXT NOT NULL,
+        email TEXT NOT NULL,
+        telefone TEXT,
+        cidade TEXT,
+        uf TEXT,
+        movimento TEXT,
+        sindicato TEXT,
+        categoria TEXT,
+        empresa TEXT,
+        estuda BOOLEAN,
+        curso TEXT,
+        instituicao TEXT,
+        mensagem TEXT,
+        imagem TEXT,
+        ip_address TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT email_format CHECK (email LIKE '%_@__%.__%')
+    );
+    CREATE TABLE admin_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1
+    );
+"""
+
+requires_fts5 = pytest.mark.skipif(
+    not fts5_available(sqlite3.connect(':memory:')), reason="SQLite sem FTS5"
+)
+
+
+def open_db(tmp_path, schema):
+    conn = sqlite3.connect(str(tmp_path / 'database.db'))
+    conn.executescript(schema)
+    return conn
+
+
+def seed_baseline(conn, rows=60):
+    conn.executemany(
+        "INSERT INTO respostas (nome, sobrenome, email, telefone, cidade, uf, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(f"Nome{i}", "Silva", f"pessoa{i % 50}@exemplo.com", f"(11) 9000-{i % 50:04d}",
+          'Porto Alegre' if i % 2 else 'Pelotas', 'RS', f"2024-01-{1 + i % 28:02d} 10:00:{i % 60:02d}")
+         for i in range(rows)]
+    )
+    conn.commit()
+
+
+def migrate(conn, batch_size=7):
+    apply_schema(conn)
+    run_backfills(conn, batch_size=batch_size, pause=0)
+
+
+def test_upgrade_from_baseline_schema(tmp_path):
+    conn = open_db(tmp_path, BASELINE_SCHEMA)
+    seed_baseline(conn)
+
+    migrate(conn)
+
+    assert {m.status for m in status(conn)} == {'aplicada'}
+    assert read_counters(conn)[0] == 60
+    # 10 envios repetem email/telefone de respostas anteriores
+    assert conn.execute("SELECT COUNT(*) FROM respostas WHERE duplicata_de IS NOT NULL").fetchone()[0] == 10
+    assert dict(conn.execute(
+        "SELECT valor, total FROM agregados WHERE dimensao = 'cidade'"
+    ).fetchall()) == {'Porto Alegre': 30, 'Pelotas': 30}
+
+
+def test_apply_schema_is_idempotent(tmp_path):
+    conn = open_db(tmp_path, BASELINE_SCHEMA)
+    apply_schema(conn)
+    # Banco vazio: nenhum backfill fica pendente
+    assert {m.status for m in status(conn)} == {'aplicada'}
+    run_backfills(conn, pause=0)
+    assert apply_schema(conn) == []
+    assert [m.version for m in status(conn)] == [m.version for m in MIGRATIONS]
+
+
+@requires_fts5
+def test_search_backfill_survives_writes_to_unindexed_rows(tmp_path):
+    conn = open_db(tmp_path, BASELINE_SCHEMA)
+    seed_baseline(conn, rows=40)
+    apply_schema(conn)
+    run_backfills(conn, batch_size=100, pause=0, target=6)
+
+    # Indexa só o primeiro lote da busca, como uma execução interrompida
+    search = next(m for m in MIGRATIONS if m.version == 7)
+    state = json.loads(conn.execute("SELECT backfill FROM schema_version WHERE version = 7").fetchone()[0])
+    conn.execute("BEGIN IMMEDIATE")
+    search.backfill(conn, state, 10)
+    conn.execute("UPDATE schema_version SET backfill = ? WHERE version = 7", (json.dumps(state),))
+    conn.commit()
+
+    # Alterações e remoções antes e depois do cursor do backfill
+    conn.execute("UPDATE respostas SET nome = 'Zulmira' WHERE id = 30")
+    conn.execute("UPDATE respostas SET nome = 'Bartolomeu' WHERE id = 5")
+    conn.execute("DELETE FROM respostas WHERE id IN (6, 35)")
+    conn.commit()
+
+    run_backfills(conn, batch_size=10, pause=0)
+
+    assert check_search_index(conn)
+    match = "SELECT rowid FROM respostas_fts WHERE respostas_fts MATCH ?"
+    assert conn.execute(match, ('zulmira',)).fetchall() == [(30,)]
+    assert conn.execute(match, ('bartolomeu',)).fetchall() == [(5,)]
+    assert conn.execute(match, ('nome5',)).fetchall() == []
+    assert conn.execute("SELECT COUNT(*) FROM respostas_fts WHERE respostas_fts MATCH 'silva'").fetchone()[0] == 38
@@ -0,0 +1,48 @@
+import sqlite3
+
+from migrations import apply_schema, run_backfills
+from pagination import decode_cursor, fetch_page
+
+# Banco mais antigo ainda em uso: sem sobrenome, cidade etc. e sem created_at
+LEGACY_SCHEMA = """
+    CREATE TABLE respostas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT,
+        email TEXT,
+        telefone TEXT,
+        mensagem TEXT,
+        imagem TEXT
+    );
+"""
+
+
+def open_db(tmp_path, schema):
+    conn = sqlite3.connect(str(tmp_path / 'database.db'))
+    conn.executescript(schema)
+    return conn
+
+
+def test_upgrade_from_legacy_schema_fills_created_at(tmp_path):
+    conn = open_db(tmp_path, LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO respostas (nome, email) VALUES (?, ?)",
+                     [(f"Antigo{i}", f"antigo{i}@exemplo.com") for i in range(23)])
+    conn.commit()
+
+    apply_schema(conn)
+    # Respostas novas chegam entre a etapa de esquema e o backfill
+    conn.executemany("INSERT INTO respostas (nome, sobrenome, email) VALUES (?, ?, ?)",
+                     [(f"Novo{i}", "Souza", f"novo{i}@exemplo.com") for i in range(4)])
+    conn.commit()
+    run_backfills(conn, batch_size=5, pause=0)
+
+    assert conn.execute("SELECT COUNT(*) FROM respostas WHERE created_at IS NULL").fetchone()[0] == 0
+
+    # A paginação por cursor passa por todas as linhas, uma vez cada, em ordem
+    seen, after, page = [], None, 1
+    while True:
+        result = fetch_page(conn, ('id', 'created_at'), 10, page, 27, after=after)
+        seen += [row[0] for row in result.rows]
+        if not result.next_cursor:
+            break
+        after, page = decode_cursor(result.next_cursor), page + 1
+    assert seen == list(range(27, 0, -1))
@@ -0,0 +1,198 @@
+"""
+Armazenamento das imagens enviadas pelo formulário
+Grava em streaming calculando o SHA-256, guarda por conteúdo (arquivos iguais
+são gravados uma única vez), valida a assinatura do arquivo e gera miniaturas
+fora do caminho da requisição.
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow é opcional: sem ele não há miniaturas
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+StoredImage = namedtuple('StoredImage', 'path sha256 kind width height size created')
+
+# Assinaturas (magic bytes) dos formatos aceitos -> extensão gravada
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+# Marcadores JPEG "Start Of Frame" que carregam as dimensões
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+THUMBNAIL_DIR = 'thumbs'
+THUMBNAIL_EXTENSION = 'webp'
+
+
+class UploadError(ValueError):
+    """Arquivo recusado (conteúdo não é uma imagem aceita)"""
+
+
+def detect_kind(header):
+    for signature, kind in SIGNATURES:
+        if header.startswith(signature):
+            return kind
+    return None
+
+
+def _jpeg_dimensions(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # marcadores sem segmento
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_dimensions(path, kind):
+    """Lê largura e altura do cabeçalho, sem decodificar a imagem"""
+    with open(path, 'rb') as f:
+        if kind == 'png':
+            header = f.read(24)
+            if header[12:16] != b'IHDR':
+                return None
+            return struct.unpack('>II', header[16:24])
+        if kind == 'gif':
+            header = f.read(10)
+            return struct.unpack('<HH', header[6:10])
+        if kind == 'jpg':
+            return _jpeg_dimensions(f)
+    return None
+
+
+class UploadStore:
+    """Armazena imagens pelo hash do conteúdo em UPLOAD_FOLDER"""
+
+    def __init__(self, folder, chunk_size=64 * 1024, max_pixels=40_000_000,
+                 thumbnail_size=(480, 480)):
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.max_pixels = max_pixels
+        self.thumbnail_size = thumbnail_size
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(folder, THUMBNAIL_DIR), exist_ok=True)
+
+    @property
+    def thumbnails_enabled(self):
+        return Image is not None
+
+    def save(self, file_storage):
+        """Grava o upload em streaming e retorna um StoredImage"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                first = file_storage.stream.read(self.chunk_size)
+                kind = detect_kind(first)
+                if kind is None:
+                    raise UploadError("Conteúdo do arquivo não é PNG, JPEG ou GIF")
+                chunk = first
+                while chunk:
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+                    chunk = file_storage.stream.read(self.chunk_size)
+
+            dimensions = read_dimensions(temp_path, kind)
+            if not dimensions or not all(dimensions):
+                raise UploadError("Não foi possível ler as dimensões da imagem")
+            width, height = dimensions
+            if width * height > self.max_pixels:
+                raise UploadError("Imagem com dimensões acima do permitido")
+
+            sha256 = digest.hexdigest()
+            path = os.path.join(self.folder, f"{sha256}.{kind}")
+            created = not os.path.exists(path)
+            if created:
+                os.replace(temp_path, path)
+            else:
+                os.remove(temp_path)  # mesmo conteúdo já armazenado
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if created:
+            self.schedule_thumbnail(path)
+        return StoredImage(path, sha256, kind, width, height, size, created)
+
+    def thumbnail_path(self, image_path):
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        return os.path.join(self.folder, THUMBNAIL_DIR, f"{stem}.{THUMBNAIL_EXTENSION}")
+
+    def _get_executor(self):
+        # Threads não sobrevivem a um fork: recria o executor por processo
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def schedule_thumbnail(self, image_path):
+        """Agenda a geração da miniatura em segundo plano"""
+        if not self.thumbnails_enabled:
+            return None
+        return self._get_executor().submit(self._make_thumbnail, image_path)
+
+    def _save_thumbnail(self, img, target):
+        # Grava em um temporário e renomeia: quem lê nunca vê uma miniatura pela metade
+        fd, temp_path = tempfile.mkstemp(prefix='.thumb-', dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                img.save(out, 'WEBP', quality=80)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _make_thumbnail(self, image_path):
+        target = self.thumbnail_path(image_path)
+        if os.path.exists(target):
+            return target
+        try:
+            with Image.open(image_path) as img:
+                img.draft('RGB', self.thumbnail_size)  # JPEG: decodifica já reduzido
+                img.thumbnail(self.thumbnail_size)
+                if img.mode in ('RGB', 'RGBA'):
+                    self._save_thumbnail(img, target)
+                else:
+                    with img.convert('RGBA') as converted:
+                        self._save_thumbnail(converted, target)
+            return target
+        except Exception as e:
+            logger.error(f"Erro ao gerar miniatura de {image_path}: {str(e)}")
+            return None
@@ -0,0 +1,135 @@
+"""
+Validação e sanitização do formulário de respostas
+O esquema é declarado e compilado uma única vez; validate() percorre o
+formulário inteiro em uma passada. Usado pelo /enviar e pela importação em lote.
+"""
+
+import re
+
+# Unidades federativas aceitas no campo uf
+UFS = frozenset((
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO',
+))
+
+# Remove < e > (mesmo efeito do antigo re.sub(r'[<>]', '', texto), sem regex)
+STRIP_TABLE = str.maketrans('', '', '<>')
+
+EMAIL_RE = re.compile(r'[^@]+@[^@]+\.[^@]+')
+# Mesma regra da constraint email_format do banco (email LIKE '%_@__%.__%')
+EMAIL_DB_RE = re.compile(r'.+@.{2,}\..{2,}', re.DOTALL)
+NON_DIGITS_RE = re.compile(r'\D')
+
+REQUIRED_MESSAGE = "Preencha todos os campos obrigatórios: nome, sobrenome, email e telefone."
+
+
+class ValidationError(ValueError):
+    """Formulário inválido: message vai para o cliente, log_message para o log"""
+
+    def __init__(self, message, field=None, log_message=None):
+        super().__init__(message)
+        self.message = message
+        self.field = field
+        self.log_message = log_message or message
+
+
+class Field:
+    """Declaração de um campo: tamanho máximo, obrigatoriedade e tipo"""
+
+    KINDS = ('text', 'email', 'phone', 'uf', 'bool')
+
+    def __init__(self, name, kind='text', max_length=500, required=False, true_value='sim'):
+        if kind not in self.KINDS:
+            raise ValueError(f"Tipo de campo inválido: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_length = max_length
+        self.required = required
+        self.true_value = true_value
+
+
+class FormSchema:
+    """Esquema compilado: a ordem dos campos é a ordem das colunas gravadas"""
+
+    def __init__(self, fields, required_message=REQUIRED_MESSAGE):
+        self.fields = tuple(fields)
+        self.names = tuple(field.name for field in self.fields)
+        self.required_message = required_message
+        # Pré-compila a lista de operações para não decidir por tipo a cada campo
+        self._plan = tuple(
+            (field.name, field.kind, field.max_length, field.required, field.true_value)
+            for field in self.fields
+        )
+
+    def validate(self, form):
+        """
+        Valida e sanitiza um mapeamento (request.form, dict, linha de CSV).
+        Retorna um dict com os valores limpos; telefones ganham também
+        '<campo>_limpo' só com dígitos. Levanta ValidationError.
+        """
+        cleaned = {}
+        missing = []
+        error = None
+        for name, kind, max_length, required, true_value in self._plan:
+            raw = form.get(name) or ''
+            if kind == 'bool':
+                cleaned[name] = raw == true_value
+                continue
+
+            value = raw.translate(STRIP_TABLE)[:max_length]
+            cleaned[name] = value
+            if not value:
+                if required:
+                    missing.append(name)
+                continue
+            if error is not None:
+                continue
+
+            if kind == 'email':
+                if not EMAIL_RE.match(value) or not EMAIL_DB_RE.fullmatch(value):
+                    error = ValidationError("Email inválido", name, f"Email inválido: {value}")
+            elif kind == 'phone':
+                digits = NON_DIGITS_RE.sub('', value)
+                cleaned[name + '_limpo'] = digits
+                if len(digits) < 10 or len(digits) > 11:
+                    error = ValidationError(
+                        "Telefone deve conter DDD + número (10 ou 11 dígitos)", name,
+                        f"Telefone inválido: {value}"
+                    )
+            elif kind == 'uf':
+                value = value.strip().upper()
+                cleaned[name] = value
+                if value not in UFS:
+                    error = ValidationError("UF inválida", name, f"UF inválida: {value}")
+
+        if missing:
+            raise ValidationError(
+                self.required_message, missing[0],
+                f"Campos obrigatórios ausentes: {', '.join(missing)}"
+            )
+        if error is not None:
+            raise error
+        return cleaned
+
+    def values(self, cleaned, names=None):
+        """Tupla dos valores limpos na ordem dos campos (ou de names)"""
+        return tuple(cleaned.get(name, '') for name in (names or self.names))
+
+
+# Esquema do formulário público (tabela respostas)
+RESPOSTA_SCHEMA = FormSchema([
+    Field('nome', required=True),
+    Field('sobrenome', required=True),
+    Field('email', kind='email', required=True),
+    Field('telefone', kind='phone', required=True),
+    Field('cidade'),
+    Field('uf', kind='uf'),
+    Field('movimento'),
+    Field('sindicato'),
+    Field('categoria'),
+    Field('empresa'),
+    Field('estuda', kind='bool'),
+    Field('curso'),
+    Field('instituicao'),
+    Field('mensagem'),
+])